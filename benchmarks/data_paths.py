@@ -0,0 +1,238 @@
+"""
+Micro-benchmarks of the byte-handling paths: image hashing and base64 in the app and in
+E2BTools, and the notebook export. Each path runs on synthetic sessions of several sizes
+and is measured on its own (median time, throughput, peak Python heap).
+
+    python benchmarks/data_paths.py                           # print results
+    python benchmarks/data_paths.py --save-baseline           # store them in baselines/data_paths.json
+    python benchmarks/data_paths.py --compare                 # compare with the stored baseline
+
+`--compare` exits with status 1 if a path got slower than `--tolerance` times its baseline
+(fastest run against fastest run, ignoring differences below `--noise-ms`), or if its peak
+memory grew by the same factor. Baselines are machine specific: regenerate them on the
+machine that runs the comparison.
+
+Paths:
+    markdown_images      app.get_images_from_markdown: read the artifact copies, MD5, cl.Image
+    display_images       app.cell_images: base64 decode (string data) + MD5 dedup of notebook-cell images
+    process_results      E2BTools._process_results: MD5 dedup of the kernel's base64 image results
+    notebook_base64      base64 encoding of the image outputs (the part of the export done by hand)
+    notebook_export      save_session_to_ipynb end to end (cell building, nbformat validation and write)
+"""
+import argparse
+import asyncio
+import base64
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import tracemalloc
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List
+
+from fakes import InMemorySandbox, Timer, fake_png, run_metadata, write_results
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "data_paths.json")
+
+# name -> (cells, images, image bytes)
+SCENARIOS = {
+    "small": (20, 5, 50_000),
+    "medium": (200, 40, 200_000),
+    "large": (1000, 150, 1_000_000),
+}
+
+def synthetic_session(cells: int, images: int, image_size: int) -> Dict[str, Any]:
+    """Notebook cells with `images` plot outputs spread evenly, as `run_python` records them."""
+    every = max(1, cells // images) if images else 0
+    notebook_cells = []
+    pngs = []
+    for i in range(cells):
+        outputs = [{"type": "stdout", "text": f"step {i}\n" + "0.123 " * 40 + "\n"}]
+        if every and i % every == 0 and len(pngs) < images:
+            png = fake_png(image_size)
+            pngs.append((f"plot_{i}.png", png))
+            outputs.append({"type": "image", "data": png, "mime_type": "image/png", "filename": f"plot_{i}.png"})
+        notebook_cells.append({"cell_type": "code", "source": f"df_{i} = df.describe()\nprint(df_{i})",
+                               "execution_count": i + 1, "outputs": outputs})
+        if i % 10 == 0:
+            notebook_cells.append({"cell_type": "markdown", "source": f"## Step {i}\nNotes on the step."})
+    return {"notebook_cells": notebook_cells, "pngs": pngs}
+
+# --- Paths ---
+
+def setup_markdown_images(session: Dict[str, Any], workdir: str) -> Callable[[], Any]:
+    import chainlit as cl
+    from chainlit.context import ChainlitContext, context_var
+    from chainlit.emitter import BaseChainlitEmitter
+    from chainlit.session import HTTPSession
+
+    import app
+    from ds_agent.utils.artifacts import ArtifactStore
+
+    artifacts = ArtifactStore(os.path.join(workdir, "artifacts"))
+    for name, png in session["pngs"]:
+        artifacts.save(name, png)
+    content = "\n\n".join(f"Figure {i}:\n![plot]({name})" for i, (name, _) in enumerate(session["pngs"]))
+
+    chat = HTTPSession(id="bench", thread_id="bench", client_type="webapp")
+    loop = asyncio.new_event_loop()
+
+    async def images() -> Any:
+        # The Chainlit context needs a running loop
+        context_var.set(ChainlitContext(chat, BaseChainlitEmitter(chat)))
+        cl.user_session.set("displayed_image_hashes", set())
+        cl.user_session.set("displayed_image_filenames", set())
+        return await app.get_images_from_markdown(content, InMemorySandbox(), artifacts)
+    return lambda: loop.run_until_complete(images())
+
+def setup_display_images(session: Dict[str, Any], workdir: str) -> Callable[[], Any]:
+    import app
+
+    # Kernel results carry base64 strings; file-based outputs carry bytes. Half of each.
+    cells = [{"cell_type": "code", "outputs": [{
+        "type": "image",
+        "data": base64.b64encode(png).decode("ascii") if i % 2 else png,
+        "mime_type": "image/png",
+    }]} for i, (_, png) in enumerate(session["pngs"])]
+    return lambda: app.cell_images(cells, set(), set())
+
+def setup_process_results(session: Dict[str, Any], workdir: str) -> Callable[[], Any]:
+    from ds_agent.tools.e2b import E2BTools
+    from ds_agent.utils.artifacts import ArtifactStore
+
+    tools = E2BTools(InMemorySandbox(), artifacts=ArtifactStore(os.path.join(workdir, "artifacts")))
+    results = [
+        SimpleNamespace(png=base64.b64encode(png).decode("ascii"), jpeg=None, svg=None, text=None)
+        for _, png in session["pngs"]
+    ] + [SimpleNamespace(png=None, jpeg=None, svg=None, text="<Figure size 640x480>")] * len(session["pngs"])
+    return lambda: tools._process_results(results)
+
+def setup_notebook_base64(session: Dict[str, Any], workdir: str) -> Callable[[], Any]:
+    pngs = [png for _, png in session["pngs"]]
+    return lambda: [base64.b64encode(png).decode("ascii") for png in pngs]
+
+def setup_notebook_export(session: Dict[str, Any], workdir: str) -> Callable[[], Any]:
+    from ds_agent.utils.notebook import save_session_to_ipynb
+
+    path = os.path.join(workdir, "export.ipynb")
+    return lambda: save_session_to_ipynb({"notebook_cells": session["notebook_cells"]}, path)
+
+PATHS = {
+    "markdown_images": setup_markdown_images,
+    "display_images": setup_display_images,
+    "process_results": setup_process_results,
+    "notebook_base64": setup_notebook_base64,
+    "notebook_export": setup_notebook_export,
+}
+
+# --- Measurement ---
+
+def measure(run: Callable[[], Any], repeat: int, image_bytes: int) -> Dict[str, Any]:
+    run()  # warm-up: imports, caches, first file writes
+    samples = []
+    for _ in range(repeat):
+        gc.collect()
+        with Timer() as t:
+            run()
+        samples.append(t.seconds)
+
+    # Peak heap in a separate run: tracemalloc slows allocation-heavy code down
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    run()
+    peak = tracemalloc.get_traced_memory()[1] - start
+    tracemalloc.stop()
+
+    median = statistics.median(samples)
+    return {
+        "median_ms": round(median * 1000, 3),
+        "min_ms": round(min(samples) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+        "mb_per_s": round(image_bytes / 2**20 / median, 1) if median else None,
+        "peak_mb": round(peak / 2**20, 2),
+    }
+
+def run_all(scenarios: Dict[str, tuple], paths: List[str], repeat: int) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="ds-agent-paths-")
+    os.environ.setdefault("LOG_FILE_PATH", os.path.join(workdir, "app.log"))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    results: Dict[str, Any] = {"meta": {**run_metadata(), "repeat": repeat}, "scenarios": {}, "paths": {}}
+    for scenario, (cells, images, image_size) in scenarios.items():
+        results["scenarios"][scenario] = {"cells": cells, "images": images, "image_bytes": image_size}
+        session = synthetic_session(cells, images, image_size)
+        image_bytes = images * image_size
+        for path in paths:
+            stats = measure(PATHS[path](session, workdir), repeat, image_bytes)
+            results["paths"].setdefault(path, {})[scenario] = stats
+            print(f"  {path:<17} {scenario:<8} {stats['median_ms']:>10.2f} ms {stats['mb_per_s'] or 0:>9.1f} MB/s "
+                  f"{stats['peak_mb']:>8.2f} MB peak", file=sys.stderr)
+        del session
+    return results
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, noise_ms: float) -> List[str]:
+    """Prints current vs. baseline for every path and scenario and returns the regressions."""
+    regressions = []
+    print(f"\n{'path':<17} {'scenario':<8} {'baseline ms':>12} {'now ms':>10} {'ratio':>7} {'peak ratio':>11}")
+    for path, scenarios in results["paths"].items():
+        for scenario, now in scenarios.items():
+            before = baseline.get("paths", {}).get(path, {}).get(scenario)
+            if not before:
+                print(f"{path:<17} {scenario:<8} {'-':>12} {now['min_ms']:>10.2f}")
+                continue
+            # The fastest run is the least disturbed by the rest of the machine
+            ratio = now["min_ms"] / before["min_ms"] if before["min_ms"] else 1.0
+            slower = now["min_ms"] - before["min_ms"] > noise_ms
+            peak_ratio = now["peak_mb"] / before["peak_mb"] if before["peak_mb"] else 1.0
+            flag = ""
+            if (ratio > tolerance and slower) or peak_ratio > tolerance:
+                flag = "  REGRESSION"
+                regressions.append(f"{path}/{scenario}: {ratio:.2f}x time, {peak_ratio:.2f}x peak memory")
+            print(f"{path:<17} {scenario:<8} {before['min_ms']:>12.2f} {now['min_ms']:>10.2f} {ratio:>6.2f}x {peak_ratio:>10.2f}x{flag}")
+    return regressions
+
+def parse_scenario(value: str) -> tuple:
+    """`name=cells:images:bytes`"""
+    name, spec = value.split("=", 1)
+    cells, images, size = (int(x) for x in spec.split(":"))
+    return name, (cells, images, size)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the image and notebook data paths.")
+    parser.add_argument("--paths", type=lambda s: s.split(","), default=list(PATHS), help=f"Comma-separated subset of: {', '.join(PATHS)}.")
+    parser.add_argument("--scenario", type=parse_scenario, action="append", default=None,
+                        help="Custom session as name=cells:images:image_bytes (repeatable); replaces the defaults.")
+    parser.add_argument("--repeat", type=int, default=7, help="Timed runs per path and scenario; the median is reported.")
+    parser.add_argument("--output", default=None, help="Write the JSON here instead of stdout.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file for --save-baseline and --compare.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline.")
+    parser.add_argument("--compare", action="store_true", help="Compare with the baseline and fail on regressions.")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Allowed slowdown (and peak memory growth) factor for --compare.")
+    parser.add_argument("--noise-ms", type=float, default=2.0, help="Slowdowns smaller than this are never regressions.")
+    args = parser.parse_args()
+
+    unknown = set(args.paths) - set(PATHS)
+    if unknown:
+        parser.error(f"unknown paths: {', '.join(sorted(unknown))}")
+    scenarios = dict(args.scenario) if args.scenario else SCENARIOS
+    results = run_all(scenarios, args.paths, args.repeat)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        write_results(results, args.baseline)
+    elif not args.compare or args.output:
+        write_results(results, args.output)
+
+    if args.compare:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.noise_ms)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions), file=sys.stderr)
+            sys.exit(1)
+        print("\nNo regressions.", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
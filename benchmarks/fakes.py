@@ -0,0 +1,238 @@
+"""
+Local stand-ins for the LLM and the E2B sandbox, shared by the benchmark scripts.
+Everything runs in-process, so the benchmarks measure the application's own overhead.
+
+Import this module before anything from `ds_agent`: it puts `src/` on the path and
+provides dummy credentials so the settings can load.
+"""
+import contextlib
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+os.environ.setdefault("MODEL_API_KEY", "benchmark")
+os.environ.setdefault("E2B_API_KEY", "benchmark")
+
+from langchain_core.messages import AIMessage
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+def fake_png(size: int) -> bytes:
+    """Incompressible PNG-like bytes, so hashing and base64 see realistic input."""
+    return PNG_HEADER + os.urandom(max(0, size - len(PNG_HEADER)))
+
+# --- LLM ---
+
+class ScriptedChatModel:
+    """
+    Chat model that returns a fixed script of responses in order, cycling when it runs out.
+    Entries are messages, structured-output objects, or callables taking the prompt messages.
+    """
+    def __init__(self, script: Sequence[Any], latency: float = 0.0):
+        self.script = list(script)
+        self.latency = latency
+        self.calls = 0
+        self._cycle = itertools.cycle(self.script)
+
+    def bind_tools(self, tools: List[Any], **kwargs) -> "ScriptedChatModel":
+        return self
+
+    def with_retry(self, **kwargs) -> "ScriptedChatModel":
+        return self
+
+    def with_structured_output(self, schema: Any, **kwargs) -> "ScriptedChatModel":
+        return self
+
+    async def ainvoke(self, input: Any, config: Optional[Dict[str, Any]] = None, **kwargs) -> Any:
+        self.calls += 1
+        if self.latency:
+            import asyncio
+            await asyncio.sleep(self.latency)
+        item = next(self._cycle)
+        return item(input) if callable(item) else item
+
+def analysis_turn(tool_calls: int = 2, image_every: int = 2) -> List[Any]:
+    """
+    The LLM script of one standard turn: supervisor -> cleaner (with `tool_calls` cells) ->
+    cleaner summary -> supervisor FINISH (the graph then runs the reporter).
+    Every `image_every`-th cell saves a plot.
+    """
+    from ds_agent.core.nodes.supervisor import SupervisorDecision
+
+    ids = itertools.count()
+    def cell_calls(_messages: Any) -> AIMessage:
+        calls = []
+        for i in range(tool_calls):
+            n = next(ids)
+            code = f"df_{n} = df.describe()\nprint(df_{n})"
+            if image_every and i % image_every == 0:
+                code += f"\nplt.savefig('plot_{n}.png')"
+            calls.append({"name": "run_python", "args": {"code": code}, "id": f"call_{n}"})
+        return AIMessage(content="", tool_calls=calls, usage_metadata={"input_tokens": 1000, "output_tokens": 100, "total_tokens": 1100})
+
+    return [
+        SupervisorDecision(reasoning="The data must be cleaned first.", instructions="Load and clean the dataset.", next_agent="cleaner"),
+        cell_calls,
+        AIMessage(content="Cleaning done: no missing values remain.", usage_metadata={"input_tokens": 1200, "output_tokens": 50, "total_tokens": 1250}),
+        SupervisorDecision(reasoning="The request is satisfied.", instructions="Wrap up.", next_agent="FINISH"),
+    ]
+
+@contextlib.contextmanager
+def patched_llm(model: ScriptedChatModel) -> Iterator[ScriptedChatModel]:
+    """Routes every `get_llm()` call of the nodes to `model`."""
+    import ds_agent.utils.helpers as helpers
+    import ds_agent.core.nodes.supervisor as supervisor
+
+    originals = helpers.get_llm, supervisor.get_llm
+    helpers.get_llm = supervisor.get_llm = lambda model_name=None: model
+    try:
+        yield model
+    finally:
+        helpers.get_llm, supervisor.get_llm = originals
+
+# --- Sandbox ---
+
+class _Files:
+    def __init__(self):
+        self.store: Dict[str, tuple] = {}
+
+    @staticmethod
+    def _name(path: str) -> str:
+        return path.rsplit("/", 1)[-1]
+
+    async def list(self, path: str = ".", *args, **kwargs) -> List[SimpleNamespace]:
+        return [
+            SimpleNamespace(name=name, path=f"/home/user/{name}", is_dir=False, size=len(data), modified_time=modified)
+            for name, (data, modified) in self.store.items()
+        ]
+
+    async def read(self, path: str, format: str = "text", **kwargs) -> Any:
+        data = self.store[self._name(path)][0]
+        return data if format == "bytes" else data.decode("utf-8", errors="replace")
+
+    async def write(self, path: str, data: Any, **kwargs) -> SimpleNamespace:
+        if hasattr(data, "read"):
+            data = data.read()
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.store[self._name(path)] = (bytes(data), datetime.now())
+        return SimpleNamespace(name=self._name(path), path=path)
+
+class _Commands:
+    def __init__(self, files: _Files):
+        self.files = files
+
+    async def run(self, cmd: str, **kwargs) -> SimpleNamespace:
+        stdout = ""
+        if "ds_ingest.py" in cmd:
+            # The conversion summary the ingestion helper prints, for a small table
+            source = cmd.split()[2].strip("'").rsplit("/", 1)[-1]
+            parquet = source.rsplit(".", 1)[0] + ".parquet"
+            await self.files.write(parquet, b"PAR1" + bytes(30_000) + b"PAR1")
+            stdout = json.dumps({"source": source, "parquet": parquet, "rows": 1000, "columns": 8, "source_mb": 0.1,
+                                 "parquet_mb": 0.03, "memory_mb": 0.06, "dtypes": {"float32": 8},
+                                 "schema": {f"x{i}": "float32" for i in range(8)}, "seconds": 0.05,
+                                 "peak_rss_mb": 120.0, "sample": None, "pandas": "fake"})
+        return SimpleNamespace(stdout=stdout, stderr="", exit_code=0, error=None)
+
+class InMemorySandbox:
+    """
+    Implements the AsyncSandbox surface used by E2BTools, the nodes and the app:
+    `run_code` (stdout, `savefig` creating an image file, the telemetry probe),
+    `files.list/read/write`, `commands.run`, `pause` and `kill`.
+    """
+    _ids = itertools.count()
+    SAVEFIG = re.compile(r"savefig\(['\"]([^'\"]+)['\"]")
+
+    def __init__(self, image_size: int = 50_000, latency: float = 0.0):
+        self.sandbox_id = f"bench-{next(self._ids)}"
+        self.image_size = image_size
+        self.latency = latency
+        self.files = _Files()
+        self.commands = _Commands(self.files)
+        self.executions = 0
+
+    async def run_code(self, code: str, on_stdout: Optional[Callable] = None, on_stderr: Optional[Callable] = None, **kwargs) -> SimpleNamespace:
+        if self.latency:
+            import asyncio
+            await asyncio.sleep(self.latency)
+        self.executions += 1
+        if "__ds_probe" in code:
+            stdout = [json.dumps({"cpu_seconds": 0.01, "peak_rss_mb": 100.0, "rss_mb": 90.0})]
+        else:
+            for name in self.SAVEFIG.findall(code):
+                await self.files.write(name, fake_png(self.image_size))
+            stdout = [f"executed {len(code)} chars\n"]
+        for line in stdout:
+            if on_stdout:
+                on_stdout(SimpleNamespace(line=line))
+        return SimpleNamespace(logs=SimpleNamespace(stdout=stdout, stderr=[]), results=[], error=None)
+
+    async def pause(self) -> None:
+        pass
+
+    async def kill(self) -> None:
+        pass
+
+# --- Measurement helpers ---
+
+def rss_mb() -> float:
+    """Current resident set size of this process (Linux), in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+def percentiles(samples: Sequence[float], points: Sequence[int] = (50, 90, 95, 99)) -> Dict[str, float]:
+    """Nearest-rank percentiles plus mean/min/max, in the samples' unit."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    stats = {f"p{p}": ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))] for p in points}
+    stats.update(mean=sum(ordered) / len(ordered), min=ordered[0], max=ordered[-1], count=len(ordered))
+    return {k: round(v, 4) if isinstance(v, float) else v for k, v in stats.items()}
+
+def run_metadata() -> Dict[str, Any]:
+    import platform
+    import subprocess
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10).stdout.strip()
+    except Exception:
+        commit = ""
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "commit": commit or None,
+    }
+
+def write_results(results: Dict[str, Any], path: Optional[str]) -> None:
+    """Prints the results as JSON, or writes them to `path`."""
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Results written to {path}", file=sys.stderr)
+    else:
+        print(text)
+
+class Timer:
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.seconds = time.perf_counter() - self.start
@@ -0,0 +1,124 @@
+"""
+Measures the cold import time of the application's modules and entry points.
+
+Each import runs in a fresh interpreter, so nothing is cached between samples.
+Run from the repository root:
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 10 --json import_times.json
+    python benchmarks/import_time.py ds_agent.core.graph --profile
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+
+DEFAULT_MODULES = [
+    "ds_agent.config",
+    "ds_agent.utils.logger",
+    "ds_agent.core.jobs",
+    "ds_agent.core.runner",
+    "ds_agent.core.graph",
+    "server",
+    "batch",
+    "main",
+    "app",
+]
+
+def child_env(workdir: str) -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [SRC, env.get("PYTHONPATH")]))
+    # Settings are read lazily, but some entry points touch them at import time
+    env.setdefault("MODEL_API_KEY", "benchmark")
+    env.setdefault("E2B_API_KEY", "benchmark")
+    # Importing the entry points sets up the log file, and Chainlit creates its files directory
+    # (and missing config) under its app root; keep all of that out of the repository
+    env["LOG_FILE_PATH"] = os.path.join(workdir, "app.log")
+    env["LOCAL_ARTIFACTS_DIR"] = os.path.join(workdir, "artifacts")
+    env["CHECKPOINT_DB_PATH"] = os.path.join(workdir, "checkpoints.sqlite")
+    env["CHAINLIT_APP_ROOT"] = workdir
+    return env
+
+def time_import(module: str, env: dict) -> float:
+    """
+    Wall time of `python -c "import <module>"`, minus the bare interpreter startup.
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", f"import {module}"], env=env, cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.strip()}")
+    return elapsed
+
+def baseline(env: dict, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], env=env, cwd=ROOT, check=True)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+def profile(module: str, env: dict, top: int) -> None:
+    """
+    Prints the slowest imports (cumulative) from `python -X importtime`.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], env=env, cwd=ROOT, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        # Format: "import time: <self us> | <cumulative us> | <module>"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), name))
+    print(f"\nSlowest imports under {module}:")
+    for cumulative_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative_us / 1e6:7.3f}s  {name.strip()}")
+
+def run(args: argparse.Namespace, workdir: str) -> None:
+    # The app's Chainlit config, so that importing `app` does not generate a default one
+    if os.path.isdir(os.path.join(ROOT, ".chainlit")):
+        shutil.copytree(os.path.join(ROOT, ".chainlit"), os.path.join(workdir, ".chainlit"))
+    env = child_env(workdir)
+    startup = baseline(env, args.runs)
+    print(f"Interpreter startup: {startup:.3f}s (subtracted below)\n")
+    print(f"{'module':<28}{'median':>9}{'min':>9}{'max':>9}")
+
+    results = {"python": sys.version.split()[0], "runs": args.runs, "startup_seconds": round(startup, 4), "modules": {}}
+    for module in args.modules:
+        samples = [max(0.0, time_import(module, env) - startup) for _ in range(args.runs)]
+        median = statistics.median(samples)
+        results["modules"][module] = {"median": round(median, 4), "min": round(min(samples), 4), "max": round(max(samples), 4)}
+        print(f"{module:<28}{median:>8.3f}s{min(samples):>8.3f}s{max(samples):>8.3f}s")
+        if args.profile:
+            profile(module, env, args.top)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cold import time of the agent's modules.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="Modules to time (default: the main modules and entry points).")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module; the median is reported.")
+    parser.add_argument("--json", metavar="PATH", default=None, help="Also write the results as JSON.")
+    parser.add_argument("--profile", action="store_true", help="Show the slowest transitive imports of each module.")
+    parser.add_argument("--top", type=int, default=15, help="Rows shown by --profile.")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ds-agent-imports-")
+    try:
+        run(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
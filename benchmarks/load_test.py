@@ -0,0 +1,239 @@
+"""
+Load test of the Chainlit app: N concurrent chat sessions (start, upload, messages, end) call the
+real `app.py` handlers in one process, with the scripted LLM and the in-memory sandbox from fakes.py.
+Each sandbox call and LLM call can be given a latency, so sessions overlap the way real ones do.
+
+    python benchmarks/load_test.py                                  # N = 1, 5, 10, 25, 50
+    python benchmarks/load_test.py --sessions 10,50,100 --llm-latency 0.5 --output load.json
+
+Reported for every N:
+    loop_lag_ms        how late a 10 ms timer fires while the sessions run (event-loop responsiveness)
+    message_ms         latency of one `on_message` call (upload + graph run + UI updates)
+    throughput         messages handled per second over the whole run
+    rss_mb             resident memory before and after, and its growth per session
+    ui_events          steps and elements sent to the (counting) emitter
+"""
+import argparse
+import asyncio
+import contextvars
+import csv
+import gc
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from fakes import InMemorySandbox, ScriptedChatModel, Timer, analysis_turn, patched_llm, percentiles, rss_mb, run_metadata, write_results
+
+def configure(workdir: str, max_live: int) -> None:
+    """Points the app's state at `workdir`; must run before `app` (and Chainlit) is imported."""
+    # Chainlit stores uploaded files under <app root>/.files/<session>
+    os.environ["CHAINLIT_APP_ROOT"] = workdir
+    os.environ["CHECKPOINT_DB_PATH"] = os.path.join(workdir, "checkpoints.sqlite")
+    os.environ["LOCAL_ARTIFACTS_DIR"] = os.path.join(workdir, "artifacts")
+    os.environ["DATASET_CACHE_DIR"] = os.path.join(workdir, "datasets")
+    os.environ["SNIPPET_INDEX_PATH"] = os.path.join(workdir, "snippets.sqlite")
+    os.environ["LOG_FILE_PATH"] = os.path.join(workdir, "app.log")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["SANDBOX_MAX_LIVE"] = str(max_live)
+
+def write_dataset(path: str, rows: int) -> str:
+    rng = random.Random(0)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "age", "income", "segment", "target"])
+        for i in range(rows):
+            writer.writerow([i, rng.randint(18, 90), round(rng.gauss(50_000, 15_000), 2), rng.choice("ABCD"), rng.randint(0, 1)])
+    return path
+
+class LagMonitor:
+    """Measures how late a periodic timer fires; the overshoot is time the loop was busy elsewhere."""
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - start - self.interval) * 1000)
+
+    def __enter__(self) -> "LagMonitor":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._task.cancel()
+
+class SessionModels:
+    """
+    Routes LLM calls to a scripted model of the calling session, so that concurrent
+    sessions each walk through their own script instead of interleaving one.
+    """
+    def __init__(self, tool_calls: int, latency: float):
+        self.tool_calls = tool_calls
+        self.latency = latency
+        self.models: List[ScriptedChatModel] = []
+        self._current: contextvars.ContextVar[Optional[ScriptedChatModel]] = contextvars.ContextVar("session_model", default=None)
+
+    def open_session(self) -> None:
+        model = ScriptedChatModel(analysis_turn(tool_calls=self.tool_calls), latency=self.latency)
+        self.models.append(model)
+        self._current.set(model)
+
+    @property
+    def calls(self) -> int:
+        return sum(model.calls for model in self.models)
+
+    def bind_tools(self, tools: List[Any], **kwargs) -> "SessionModels":
+        return self
+
+    def with_retry(self, **kwargs) -> "SessionModels":
+        return self
+
+    def with_structured_output(self, schema: Any, **kwargs) -> "SessionModels":
+        return self
+
+    async def ainvoke(self, input: Any, config: Optional[Dict[str, Any]] = None, **kwargs) -> Any:
+        return await self._current.get().ainvoke(input, config, **kwargs)
+
+def counting_emitter(counter: Counter):
+    from chainlit.emitter import BaseChainlitEmitter
+
+    class CountingEmitter(BaseChainlitEmitter):
+        """The no-op emitter of HTTP sessions, counting what would go over the socket."""
+        async def send_step(self, step_dict):
+            counter["send_step"] += 1
+
+        async def update_step(self, step_dict):
+            counter["update_step"] += 1
+
+        async def stream_start(self, step_dict):
+            counter["stream_start"] += 1
+
+        async def send_token(self, id, token, is_sequence=False, is_input=False):
+            counter["send_token"] += 1
+
+        async def send_element(self, element_dict):
+            counter["send_element"] += 1
+
+    return CountingEmitter
+
+async def run_session(app: Any, models: SessionModels, args: argparse.Namespace, dataset: str, latencies: List[float], ui: Counter, errors: Counter) -> None:
+    """One user: opens a chat, uploads the dataset with the first message, sends the rest, closes the chat."""
+    import chainlit as cl
+    from chainlit.context import ChainlitContext, context_var
+    from chainlit.session import HTTPSession
+
+    session = HTTPSession(id=str(uuid.uuid4()), thread_id=str(uuid.uuid4()), client_type="webapp")
+    context_var.set(ChainlitContext(session, counting_emitter(ui)(session)))
+    models.open_session()
+    # Users do not all arrive at the same instant
+    await asyncio.sleep(random.uniform(0, args.ramp))
+    await app.start()
+    for i in range(args.messages):
+        elements = [cl.File(name="data.csv", path=dataset)] if i == 0 and args.upload else []
+        message = cl.Message(content=f"Step {i}: analyze the data.", elements=elements)
+        try:
+            with Timer() as t:
+                await app.main(message)
+            latencies.append(t.seconds * 1000)
+        except Exception as e:
+            errors[type(e).__name__] += 1
+        if args.think:
+            await asyncio.sleep(random.uniform(0, 2 * args.think))
+    await app.end()
+
+async def run_level(app: Any, models: SessionModels, args: argparse.Namespace, dataset: str, sessions: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    ui, errors = Counter(), Counter()
+    gc.collect()
+    rss_start = rss_mb()
+    with LagMonitor() as lag, Timer() as t:
+        await asyncio.gather(*(run_session(app, models, args, dataset, latencies, ui, errors) for _ in range(sessions)))
+    gc.collect()
+    rss_end = rss_mb()
+    return {
+        "sessions": sessions,
+        "messages": len(latencies),
+        "errors": dict(errors),
+        "seconds": round(t.seconds, 2),
+        "throughput_msgs_per_s": round(len(latencies) / t.seconds, 2) if t.seconds else None,
+        "message_ms": percentiles(latencies),
+        "loop_lag_ms": percentiles(lag.samples),
+        "rss_mb": {"start": round(rss_start, 1), "end": round(rss_end, 1), "growth": round(rss_end - rss_start, 1),
+                   "growth_per_session": round((rss_end - rss_start) / sessions, 2)},
+        "ui_events": dict(ui),
+    }
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="ds-agent-load-")
+    configure(workdir, args.max_live)
+    dataset = write_dataset(os.path.join(workdir, "data.csv"), args.rows)
+
+    try:
+        import ds_agent.core.sandboxes as sandboxes
+        from ds_agent.core.checkpoint import close_checkpointer
+        import app
+
+        sandboxes_by_id: Dict[str, InMemorySandbox] = {}
+
+        async def create_sandbox() -> InMemorySandbox:
+            sandbox = InMemorySandbox(image_size=args.image_size, latency=args.sandbox_latency)
+            sandboxes_by_id[sandbox.sandbox_id] = sandbox
+            return sandbox
+
+        async def reattach_sandbox(sandbox_id):
+            if sandbox_id in sandboxes_by_id:
+                return sandboxes_by_id[sandbox_id], True
+            return await create_sandbox(), False
+
+        async def kill_sandbox(lease) -> None:
+            # Paused sandboxes are otherwise killed through the E2B API
+            sandboxes_by_id.pop(lease.sandbox_id, None)
+            lease.sandbox, lease.sandbox_id = None, None
+
+        sandboxes.create_sandbox, sandboxes.reattach_sandbox = create_sandbox, reattach_sandbox
+        app.sandbox_manager._kill = kill_sandbox
+
+        models = SessionModels(args.tool_calls, args.llm_latency)
+        results: Dict[str, Any] = {"meta": {**run_metadata(), "config": {k: v for k, v in vars(args).items() if k != "output"}}, "levels": {}}
+        with patched_llm(models):
+            # Warm-up: compiles the graph and opens the checkpointer outside the measured runs
+            await run_level(app, models, argparse.Namespace(**{**vars(args), "messages": 1, "ramp": 0, "think": 0}), dataset, 1)
+            for sessions in args.sessions:
+                print(f"{sessions} concurrent sessions...", file=sys.stderr)
+                level = await run_level(app, models, args, dataset, sessions)
+                results["levels"][str(sessions)] = level
+                print(f"  {level['throughput_msgs_per_s']} msg/s, message p95 {level['message_ms'].get('p95')} ms, "
+                      f"loop lag p99 {level['loop_lag_ms'].get('p99')} ms, RSS +{level['rss_mb']['growth']} MB", file=sys.stderr)
+        await close_checkpointer()
+        results["meta"]["llm_calls"] = models.calls
+        results["meta"]["sandboxes_created"] = next(InMemorySandbox._ids)
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent-session load test of the Chainlit handlers.")
+    parser.add_argument("--sessions", type=lambda s: [int(x) for x in s.split(",")], default=[1, 5, 10, 25, 50],
+                        help="Concurrent session counts to run, one level after another.")
+    parser.add_argument("--messages", type=int, default=3, help="Messages per session; the first one uploads the dataset.")
+    parser.add_argument("--no-upload", dest="upload", action="store_false", help="Send messages without a file.")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows of the uploaded CSV.")
+    parser.add_argument("--tool-calls", type=int, default=4, help="run_python calls per scripted turn.")
+    parser.add_argument("--image-size", type=int, default=50_000, help="Bytes of every saved plot.")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per LLM call.")
+    parser.add_argument("--sandbox-latency", type=float, default=0.05, help="Seconds per cell execution.")
+    parser.add_argument("--think", type=float, default=0.5, help="Mean pause between a user's messages, in seconds.")
+    parser.add_argument("--ramp", type=float, default=1.0, help="Sessions start at random within this many seconds.")
+    parser.add_argument("--max-live", type=int, default=20, help="SANDBOX_MAX_LIVE of the simulated app.")
+    parser.add_argument("--output", default=None, help="Write the JSON here instead of stdout.")
+    args = parser.parse_args()
+    write_results(asyncio.run(main(args)), args.output)
@@ -0,0 +1,201 @@
+"""
+Orchestration benchmarks: drives the real graph (`create_graph()`) end to end with a scripted
+chat model and an in-memory sandbox, so all measured time is the application's own overhead.
+
+    python benchmarks/orchestration.py                      # JSON to stdout
+    python benchmarks/orchestration.py --output orchestration.json --sqlite
+
+Sections:
+    node_overhead       per-node wall time over repeated turns (from the node spans)
+    state_growth        turn latency as `messages` / `notebook_cells` grow
+    tool_dispatch       tool_node cost per tool call, by tool
+    notebook_export     save_session_to_ipynb time and size by cell count
+    memory_per_session  Python heap and RSS growth per completed session
+"""
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+import uuid
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List
+
+from fakes import InMemorySandbox, ScriptedChatModel, Timer, analysis_turn, patched_llm, percentiles, rss_mb, run_metadata, write_results
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from ds_agent.config import Nodes
+from ds_agent.core.checkpoint import build_run_config
+from ds_agent.core.graph import create_graph
+from ds_agent.core.nodes.tools import tool_node
+from ds_agent.utils.artifacts import ArtifactStore
+from ds_agent.utils.notebook import save_session_to_ipynb
+from ds_agent.utils.tracing import SpanRecorder, active_spans
+
+def turn_input(sandbox: InMemorySandbox, text: str = "Clean the dataset.", **extra: Any) -> Dict[str, Any]:
+    return {
+        "messages": [HumanMessage(content=text)] + extra.pop("messages", []),
+        "cwd": "/home/user",
+        "next": Nodes.SUPERVISOR,
+        "node_visits": {},
+        "sandbox_id": sandbox.sandbox_id,
+        **extra,
+    }
+
+async def run_turn(graph: Any, config: Dict[str, Any], graph_input: Dict[str, Any]) -> float:
+    with Timer() as t:
+        async for _ in graph.astream(graph_input, config=config):
+            pass
+    return t.seconds
+
+def filler_history(size: int) -> Dict[str, List[Any]]:
+    """`size` past messages and notebook cells, as a long session would have accumulated."""
+    messages = [
+        HumanMessage(content=f"question {i} " + "x" * 200) if i % 2 else AIMessage(content=f"answer {i} " + "y" * 400)
+        for i in range(size)
+    ]
+    cells = [
+        {"cell_type": "code", "source": f"df_{i} = df.describe()\nprint(df_{i})", "execution_count": None,
+         "outputs": [{"type": "stdout", "text": "count  mean  std\n" * 10}],
+         "telemetry": {"wall_seconds": 0.1, "cpu_seconds": 0.1, "peak_rss_mb": 100.0, "rss_mb": 90.0}}
+        for i in range(size)
+    ]
+    return {"messages": messages, "notebook_cells": cells}
+
+@asynccontextmanager
+async def open_graph(use_sqlite: bool, workdir: str) -> AsyncIterator[Any]:
+    """The graph with an in-memory or SQLite checkpointer; the SQLite connection is closed on exit."""
+    if use_sqlite:
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+        async with AsyncSqliteSaver.from_conn_string(os.path.join(workdir, "checkpoints.sqlite")) as saver:
+            await saver.setup()
+            yield create_graph(checkpointer=saver)
+    else:
+        yield create_graph(checkpointer=InMemorySaver())
+
+async def bench_node_overhead(graph: Any, workdir: str, turns: int, tool_calls: int) -> Dict[str, Any]:
+    sandbox = InMemorySandbox()
+    config = build_run_config(f"bench-{uuid.uuid4().hex[:8]}", sandbox, ArtifactStore(workdir))
+    recorder = SpanRecorder("bench")
+    token = active_spans.set(recorder)
+    try:
+        turn_seconds = [await run_turn(graph, config, turn_input(sandbox)) for _ in range(turns)]
+    finally:
+        active_spans.reset(token)
+
+    by_node: Dict[str, List[float]] = defaultdict(list)
+    for event in recorder.events:
+        if event["cat"] == "node":
+            by_node[event["name"]].append(event["dur"] / 1000)
+    return {
+        "turns": turns,
+        "tool_calls_per_turn": tool_calls,
+        "turn_ms": percentiles([s * 1000 for s in turn_seconds]),
+        "node_ms": {node: percentiles(samples) for node, samples in sorted(by_node.items())},
+    }
+
+async def bench_state_growth(graph: Any, workdir: str, sizes: List[int], turns: int) -> Dict[str, Any]:
+    results = {}
+    for size in sizes:
+        sandbox = InMemorySandbox()
+        config = build_run_config(f"growth-{size}-{uuid.uuid4().hex[:8]}", sandbox, ArtifactStore(workdir))
+        seed_seconds = await run_turn(graph, config, turn_input(sandbox, **filler_history(size)))
+        samples = [await run_turn(graph, config, turn_input(sandbox)) for _ in range(turns)]
+        results[str(size)] = {"seed_turn_ms": round(seed_seconds * 1000, 2), "turn_ms": percentiles([s * 1000 for s in samples])}
+        print(f"  state_growth size={size}: {results[str(size)]['turn_ms']['mean']:.1f} ms/turn", file=sys.stderr)
+    return results
+
+async def bench_tool_dispatch(workdir: str, calls: int, rounds: int) -> Dict[str, Any]:
+    specs = {
+        "create_markdown": lambda i: {"content": f"## Step {i}\nSome notes."},
+        "run_python": lambda i: {"code": f"x_{i} = {i} * 2\nprint(x_{i})"},
+        "run_python_with_image": lambda i: {"code": f"plt.savefig('dispatch_{i}.png')"},
+    }
+    results = {}
+    for label, make_args in specs.items():
+        tool_name = "run_python" if label.startswith("run_python") else label
+        samples = []
+        for _ in range(rounds):
+            sandbox = InMemorySandbox()
+            config = build_run_config(f"dispatch-{uuid.uuid4().hex[:8]}", sandbox, ArtifactStore(workdir))
+            message = AIMessage(content="", tool_calls=[{"name": tool_name, "args": make_args(i), "id": f"c{i}"} for i in range(calls)])
+            state = {"messages": [message], "next": Nodes.CLEANER, "node_visits": {}, "notebook_cells": []}
+            with Timer() as t:
+                await tool_node(state, config)
+            samples.append(t.seconds / calls * 1e6)
+        results[label] = {"calls_per_round": calls, "us_per_call": percentiles(samples)}
+    return results
+
+def bench_notebook_export(workdir: str, sizes: List[int], image_every: int, image_size: int) -> Dict[str, Any]:
+    from fakes import fake_png
+
+    results = {}
+    for size in sizes:
+        cells = filler_history(size)["notebook_cells"]
+        for i in range(0, size, image_every):
+            cells[i]["outputs"].append({"type": "image", "data": fake_png(image_size), "mime_type": "image/png"})
+        path = os.path.join(workdir, f"export_{size}.ipynb")
+        with Timer() as t:
+            save_session_to_ipynb({"notebook_cells": cells}, path)
+        results[str(size)] = {"ms": round(t.seconds * 1000, 2), "mb": round(os.path.getsize(path) / 2**20, 2), "images": len(range(0, size, image_every))}
+    return results
+
+async def bench_memory(graph: Any, workdir: str, sessions: int) -> Dict[str, Any]:
+    gc.collect()
+    tracemalloc.start()
+    heap_start, rss_start = tracemalloc.get_traced_memory()[0], rss_mb()
+    heap = []
+    for _ in range(sessions):
+        sandbox = InMemorySandbox()
+        config = build_run_config(f"mem-{uuid.uuid4().hex[:8]}", sandbox, ArtifactStore(workdir))
+        await run_turn(graph, config, turn_input(sandbox))
+        gc.collect()
+        heap.append(tracemalloc.get_traced_memory()[0])
+    tracemalloc.stop()
+    return {
+        "sessions": sessions,
+        "heap_kb_per_session": round((heap[-1] - heap_start) / sessions / 1024, 1),
+        "heap_mb_total": round((heap[-1] - heap_start) / 2**20, 2),
+        "rss_mb_growth": round(rss_mb() - rss_start, 1),
+        "note": "Growth is retained checkpoints plus caches; with an in-memory saver every session's checkpoints stay in the heap.",
+    }
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="ds-agent-bench-")
+    model = ScriptedChatModel(analysis_turn(tool_calls=args.tool_calls))
+    results: Dict[str, Any] = {"meta": {**run_metadata(), "checkpointer": "sqlite" if args.sqlite else "memory"}}
+    with patched_llm(model):
+        async with open_graph(args.sqlite, workdir) as graph:
+            print("node_overhead...", file=sys.stderr)
+            results["node_overhead"] = await bench_node_overhead(graph, workdir, args.turns, args.tool_calls)
+            print("state_growth...", file=sys.stderr)
+            results["state_growth"] = await bench_state_growth(graph, workdir, args.sizes, args.growth_turns)
+            print("tool_dispatch...", file=sys.stderr)
+            results["tool_dispatch"] = await bench_tool_dispatch(workdir, args.dispatch_calls, args.rounds)
+            print("notebook_export...", file=sys.stderr)
+            results["notebook_export"] = bench_notebook_export(workdir, args.sizes, image_every=10, image_size=50_000)
+            print("memory_per_session...", file=sys.stderr)
+            results["memory_per_session"] = await bench_memory(graph, workdir, args.sessions)
+    results["meta"]["llm_calls"] = model.calls
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the agent graph's orchestration overhead.")
+    parser.add_argument("--turns", type=int, default=20, help="Turns for the per-node overhead section.")
+    parser.add_argument("--tool-calls", type=int, default=4, help="run_python calls per scripted turn.")
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=[0, 100, 1000, 5000],
+                        help="History sizes (messages and cells) for state growth and notebook export.")
+    parser.add_argument("--growth-turns", type=int, default=3, help="Measured turns per history size.")
+    parser.add_argument("--dispatch-calls", type=int, default=50, help="Tool calls per tool_node invocation.")
+    parser.add_argument("--rounds", type=int, default=5, help="tool_node invocations per tool.")
+    parser.add_argument("--sessions", type=int, default=20, help="Sessions for the memory section.")
+    parser.add_argument("--sqlite", action="store_true", help="Use the SQLite checkpointer (as in production) instead of the in-memory one.")
+    parser.add_argument("--output", default=None, help="Write the JSON here instead of stdout.")
+    args = parser.parse_args()
+    write_results(asyncio.run(main(args)), args.output)
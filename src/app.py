@@ -1,23 +1,69 @@
 import os
 import chainlit as cl
+from chainlit.types import ThreadDict
 from langchain_core.messages import HumanMessage
-from e2b_code_interpreter import AsyncSandbox
 import base64
 import hashlib
+import re
+from typing import Any, Dict, List, Set, Tuple
 
-from ds_agent.core.graph import create_graph
+from ds_agent.core.checkpoint import get_checkpointer, build_run_config, load_thread
+from ds_agent.core.budget import RunBudget, attach_budget
 from ds_agent.config import settings, Nodes
-from ds_agent.utils.logger import logger
+from ds_agent.core.sandboxes import SandboxManager
+from ds_agent.utils.logger import logger, set_log_session, setup_logger
+from ds_agent.utils.replay import active_trace, open_trace, record_turn, TraceRecorder
+from ds_agent.utils.tracing import active_spans, open_span_recorder
 from ds_agent.utils.notebook import save_session_to_ipynb
+from ds_agent.utils.ui_buffer import UIUpdateBuffer
+from ds_agent.utils.artifacts import ArtifactStore, ArtifactCollector
+from ds_agent.tools.e2b import E2BTools
+from ds_agent.tools.ingest import upload_dataset, upload_notice, sampling_policy
 
-# Initialize the graph once
-graph = create_graph()
+setup_logger()
+
+# The graph is compiled once, lazily: the SQLite checkpointer needs the running event loop.
+graph = None
+
+# Sandboxes of all sessions: idle ones are paused and resumed on the next message
+sandbox_manager = SandboxManager()
+
+# Background retention for the artifacts directory; live sessions are protected from eviction
+artifact_gc = ArtifactCollector()
+
+async def get_graph():
+    global graph
+    if graph is None:
+        from ds_agent.core.graph import create_graph
+        graph = create_graph(checkpointer=await get_checkpointer())
+    return graph
+
+def session_user() -> str:
+    """
+    Identifier of the logged-in user of the current Chainlit session, or "" without authentication.
+    """
+    try:
+        return getattr(cl.context.session.user, "identifier", None) or ""
+    except Exception:
+        return ""
+
+def bind_log_session():
+    """
+    Tags the log records of the current Chainlit task with "<user>:<session>".
+    """
+    try:
+        session = cl.context.session
+        user = getattr(session.user, "identifier", None) or "anon"
+        set_log_session(f"{user}:{session.id[:8] if session.id else 'no-id'}")
+    except Exception:
+        pass
 
 @cl.on_chat_start
 async def start():
     """
     Initialize the E2B sandbox and setup the initial agent state.
     """
+    bind_log_session()
     try:
         session_id = cl.context.session.id
         logger.info(f"New chat session started. Session ID: {session_id}")
@@ -28,23 +74,26 @@ async def start():
         # Initialize hash tracking for images
         cl.user_session.set("displayed_image_hashes", set())
 
-        # 1. Initialize E2B Sandbox
-        sandbox = await AsyncSandbox.create(
-            api_key=settings.e2b_api_key.get_secret_value(),
-            timeout=settings.sandbox_timeout
-        )
+        # Optional record/replay of LLM and sandbox traffic for this session
+        trace = open_trace(cl.context.session.thread_id)
+        cl.user_session.set("trace", trace)
+        active_trace.set(trace)
+        spans = open_span_recorder(cl.context.session.thread_id)
+        cl.user_session.set("spans", spans)
+        active_spans.set(spans)
+
+        # 1. Initialize E2B Sandbox (owned by the lifecycle manager, which pauses it when idle)
+        sandbox, _ = await sandbox_manager.open(cl.context.session.thread_id)
+        sandbox_manager.start()
         cl.user_session.set("sandbox", sandbox)
         logger.info(f"E2B AsyncSandbox initialized (Timeout: {settings.sandbox_timeout}s).")
 
-        # 2. Initial State
-        state = {
-            "messages": [],
-            "notebook_cells": [],
-            "cwd": "/home/user",
-            "next": Nodes.SUPERVISOR,
-            "node_visits": {}
-        }
-        cl.user_session.set("state", state)
+        # 2. Checkpoint thread: the graph state lives in the checkpointer, keyed by the Chainlit thread
+        await get_graph()
+        config = build_run_config(cl.context.session.thread_id, sandbox, user=session_user())
+        cl.user_session.set("config", config)
+        artifact_gc.protect(config["configurable"]["artifacts"])
+        artifact_gc.start()
 
         await cl.Message(content="سلام! من دستیار علم داده شما هستم. یک محیط مجازی E2B پایدار برای شما آماده است. چطور می‌توانم امروز کمکتان کنم؟ می‌توانید با استفاده از دکمه پیوست، مجموعه داده‌های خود را آپلود کنید.").send()
 
@@ -52,65 +101,159 @@ async def start():
         logger.error(f"Failed to initialize sandbox: {e}")
         await cl.ErrorMessage(content=f"خطا در راه‌اندازی محیط مجازی E2B: {str(e)}").send()
 
-async def get_images_from_markdown(content: str, sandbox):
+@cl.on_chat_resume
+async def resume(thread: ThreadDict):
+    """
+    Restore a session from its last checkpoint, reattach its sandbox and
+    continue an interrupted run from the last completed node.
     """
-    Scans markdown for local image references, downloads them from the sandbox,
-    and returns a list of cl.Image elements.
-    Uses a session-based cache to avoid redundant downloads.
+    bind_log_session()
+    thread_id = thread["id"]
+    logger.info(f"Resuming chat thread: {thread_id}")
+    cl.user_session.set("displayed_image_hashes", set())
+
+    try:
+        trace = open_trace(thread_id)
+        cl.user_session.set("trace", trace)
+        active_trace.set(trace)
+        spans = open_span_recorder(thread_id)
+        cl.user_session.set("spans", spans)
+        active_spans.set(spans)
+
+        values, pending = await load_thread(await get_graph(), thread_id)
+        sandbox, reattached = await sandbox_manager.open(thread_id, values.get("sandbox_id"))
+        sandbox_manager.start()
+        cl.user_session.set("sandbox", sandbox)
+        config = build_run_config(thread_id, sandbox, user=session_user())
+        cl.user_session.set("config", config)
+        artifact_gc.protect(config["configurable"]["artifacts"])
+        artifact_gc.start()
+
+        if values and not reattached:
+            # Kernel variables and sandbox files are gone; tell the agents on the next turn.
+            cl.user_session.set("pending_notices", [HumanMessage(content="[System: The sandbox was restarted. Kernel variables and sandbox files from earlier steps are lost; reload the data before continuing.]")])
+            await cl.Message(content="محیط مجازی قبلی منقضی شده بود و یک محیط جدید ایجاد شد. لطفاً در صورت نیاز فایل‌های خود را دوباره آپلود کنید.").send()
+        elif pending:
+            logger.info(f"Continuing interrupted run at: {', '.join(pending)}")
+            await cl.Message(content="در حال ادامه اجرای ناتمام از آخرین مرحله تکمیل‌شده...").send()
+            sandbox = await acquire_sandbox(config)
+            try:
+                await stream_graph(None, config, sandbox)
+            finally:
+                await sandbox_manager.release(thread_id)
+    except Exception as e:
+        logger.error(f"Failed to resume thread {thread_id}: {e}", exc_info=True)
+        await cl.ErrorMessage(content=f"خطا در بازیابی نشست: {str(e)}").send()
+
+IMAGE_PATTERN = re.compile(r"!\[.*?\]\(\s*<?(.*?)\s*>?\)")
+
+async def load_image_bytes(img_path: str, sandbox, artifacts: ArtifactStore) -> bytes:
+    """
+    Returns the bytes of an image referenced in markdown. Files at the sandbox root were
+    already copied to the session's artifact directory by `run_python`, so the local copy is
+    used first; the sandbox is only read (and cached for the turn) on a miss.
+    """
+    # Strip local artifacts prefix if present, as files are at root in sandbox
+    sandbox_path = img_path
+    prefix = settings.local_artifacts_dir.strip("/")
+    if sandbox_path.startswith(f"{prefix}/"):
+        sandbox_path = sandbox_path.replace(f"{prefix}/", "")
+    elif sandbox_path.startswith(f"/{prefix}/"):
+        sandbox_path = sandbox_path.replace(f"/{prefix}/", "")
+
+    if os.path.dirname(sandbox_path).rstrip("/") in ("", ".", "/home/user"):
+        local_path = os.path.join(artifacts.dir, os.path.basename(sandbox_path))
+        if os.path.isfile(local_path):
+            with open(local_path, "rb") as f:
+                return f.read()
+
+    cache = cl.user_session.get("image_cache", {})
+    if img_path not in cache:
+        logger.info(f"Loading image from sandbox for markdown: {sandbox_path}")
+        cache[img_path] = await sandbox.files.read(sandbox_path, format="bytes")
+        cl.user_session.set("image_cache", cache)
+    return cache[img_path]
+
+def cell_images(cells: List[Dict[str, Any]], displayed_hashes: Set[str], displayed_filenames: Set[str]) -> List[Tuple[str, bytes]]:
+    """
+    Returns (name, bytes) of the image outputs of notebook cells not displayed yet, and adds
+    them to the displayed sets. Images already shown via markdown are skipped by filename
+    first, then by the MD5 of their bytes (kernel results carry base64 strings).
+    """
+    images = []
+    for cell in cells:
+        if cell.get("cell_type") != "code":
+            continue
+        for output in cell.get("outputs", []):
+            if output.get("type") != "image":
+                continue
+            filename = output.get("filename")  # set by e2b.py for file-based outputs
+
+            # Filename-based dedup (primary): skip if already shown via markdown
+            if filename and filename in displayed_filenames:
+                logger.info(f"Skipping duplicate notebook-cell image (already shown via markdown): {filename}")
+                continue
+
+            try:
+                img_data = output.get("data")
+                if isinstance(img_data, str):
+                    # Handle possible base64 padding or prefixes
+                    if "," in img_data:
+                        img_data = img_data.split(",")[1]
+                    img_bytes = base64.b64decode(img_data)
+                else:
+                    img_bytes = img_data
+
+                # Hash-based dedup (secondary guard)
+                img_hash = hashlib.md5(img_bytes).hexdigest()
+            except Exception as img_err:
+                logger.error(f"Failed to decode image: {img_err}")
+                continue
+            if img_hash in displayed_hashes:
+                logger.info("Skipping duplicate image (Jupyter output, hash match)")
+                continue
+
+            displayed_hashes.add(img_hash)
+            if filename:
+                displayed_filenames.add(filename)
+            images.append((filename or "plot.png", img_bytes))
+    return images
+
+async def get_images_from_markdown(content: str, sandbox, artifacts: ArtifactStore):
+    """
+    Scans markdown for local image references and returns cl.Image elements for the
+    ones not displayed yet. Callers pass only newly appended text and extend the
+    message's existing elements, so each update costs O(new text).
     Deduplicates by both MD5 hash (content) and filename to prevent double-display
     with notebook-cell images that share the same file bytes.
     """
-    import re
-    # Matches ![alt](path), ![alt]( <path> ), etc.
-    pattern = r"!\[.*?\]\(\s*<?(.*?)\s*>?\)"
-    image_matches = re.findall(pattern, content)
-    
-    # Use session cache to avoid redundant downloads from sandbox
-    cache = cl.user_session.get("image_cache", {})
-    
     elements = []
     seen_paths = set()
     displayed_hashes = cl.user_session.get("displayed_image_hashes", set())
     displayed_filenames = cl.user_session.get("displayed_image_filenames", set())
 
-    for img_path in image_matches:
+    for img_path in IMAGE_PATTERN.findall(content):
         img_path = img_path.strip()
         if not img_path or img_path.startswith("http") or img_path in seen_paths:
             continue
+        seen_paths.add(img_path)
 
         img_basename = os.path.basename(img_path)
 
-        # Filename-based dedup: skip if the same file was already shown via notebook-cells
+        # Filename-based dedup: skip if the same file was already shown (notebook cell or earlier text)
         if img_basename in displayed_filenames:
-            logger.info(f"Skipping markdown image (already shown via notebook cell): {img_basename}")
-            seen_paths.add(img_path)
+            logger.info(f"Skipping markdown image (already shown): {img_basename}")
             continue
-            
-        # Strip local artifacts prefix if present, as files are at root in sandbox
-        sandbox_path = img_path
-        prefix = settings.local_artifacts_dir.strip("/")
-        if sandbox_path.startswith(f"{prefix}/"):
-            sandbox_path = sandbox_path.replace(f"{prefix}/", "")
-        elif sandbox_path.startswith(f"/{prefix}/"):
-            sandbox_path = sandbox_path.replace(f"/{prefix}/", "")
-            
+
         try:
-            if img_path in cache:
-                img_bytes = cache[img_path]
-            else:
-                logger.info(f"Loading image from sandbox for markdown: {sandbox_path}")
-                img_bytes = await sandbox.files.read(sandbox_path, format="bytes")
-                cache[img_path] = img_bytes
-                cl.user_session.set("image_cache", cache)
-            
+            img_bytes = await load_image_bytes(img_path, sandbox, artifacts)
+
             # Hash-based dedup (secondary guard)
             img_hash = hashlib.md5(img_bytes).hexdigest()
             is_duplicate = img_hash in displayed_hashes
 
             displayed_hashes.add(img_hash)
             displayed_filenames.add(img_basename)
-            cl.user_session.set("displayed_image_hashes", displayed_hashes)
-            cl.user_session.set("displayed_image_filenames", displayed_filenames)
 
             if not is_duplicate:
                 elements.append(cl.Image(
@@ -118,30 +261,70 @@ async def get_images_from_markdown(content: str, sandbox):
                     name=img_path, 
                     display="inline"
                 ))
-            seen_paths.add(img_path)
         except Exception as e:
             logger.warning(f"Failed to load markdown image {img_path}: {e}")
-            
+
+    cl.user_session.set("displayed_image_hashes", displayed_hashes)
+    cl.user_session.set("displayed_image_filenames", displayed_filenames)
     return elements
 
+async def acquire_sandbox(config):
+    """
+    Borrows the session's sandbox for a run, resuming it if it was hibernated while idle.
+    If it had to be replaced, the agents and the user are told that kernel state is lost.
+    """
+    sandbox, kept = await sandbox_manager.acquire(config["configurable"]["thread_id"])
+    config["configurable"]["sandbox"] = sandbox
+    cl.user_session.set("sandbox", sandbox)
+    if not kept:
+        notices = cl.user_session.get("pending_notices", [])
+        notices.append(HumanMessage(content="[System: The sandbox was restarted. Kernel variables and sandbox files from earlier steps are lost; reload the data before continuing.]"))
+        cl.user_session.set("pending_notices", notices)
+        await cl.Message(content="محیط مجازی قبلی منقضی شده بود و یک محیط جدید ایجاد شد. لطفاً در صورت نیاز فایل‌های خود را دوباره آپلود کنید.").send()
+    return sandbox
+
 @cl.on_message
 async def main(message: cl.Message):
     """
     Process incoming messages and run the agent graph.
     """
+    bind_log_session()
     logger.info(f"Received message: {message.content[:50]}...")
-    state = cl.user_session.get("state")
-    sandbox = cl.user_session.get("sandbox")
+    config = cl.user_session.get("config")
 
-    if not state or not sandbox:
+    if not config or not cl.user_session.get("sandbox"):
         await cl.ErrorMessage(content="نشست (Session) به درستی راه‌اندازی نشده است.").send()
         return
 
+    active_trace.set(cl.user_session.get("trace"))
+    active_spans.set(cl.user_session.get("spans"))
+    sandbox = await acquire_sandbox(config)
+    try:
+        await run_turn(message, config, sandbox)
+    finally:
+        await sandbox_manager.release(config["configurable"]["thread_id"])
+
+async def run_turn(message: cl.Message, config, sandbox):
+    """
+    Uploads the message's files to the sandbox and runs the graph on the user prompt.
+    """
     # Reset displayed image hashes, filenames, and cache for the new turn
     cl.user_session.set("displayed_image_hashes", set())
     cl.user_session.set("displayed_image_filenames", set())
     cl.user_session.set("image_cache", {})
 
+    # Only this turn's input is sent; earlier messages and cells come from the checkpoint
+    graph_input = {
+        "messages": cl.user_session.get("pending_notices", []),
+        "cwd": "/home/user",
+        "next": Nodes.SUPERVISOR,
+        "node_visits": {},
+        "sandbox_id": sandbox.sandbox_id,
+        "sampling": {},
+        "schemas": {}
+    }
+    cl.user_session.set("pending_notices", [])
+
     # 1. Handle File Uploads
     if message.elements:
         for element in message.elements:
@@ -151,45 +334,68 @@ async def main(message: cl.Message):
                 
                 await cl.Message(content=f"در حال آپلود `{filename}` به محیط مجازی...").send()
                 
-                # Write to sandbox - read from path as content might be None in some versions
+                # Write to sandbox - read from path as content might be None in some versions.
+                # Tabular files get a typed Parquet copy so the agents do not re-parse the CSV;
+                # one converted before (by any session) is restored from the dataset cache instead.
                 if element.path and os.path.exists(element.path):
-                    with open(element.path, "rb") as f:
-                        content = f.read()
-                    await sandbox.files.write(filename, content)
+                    summary = await upload_dataset(sandbox, filename, path=element.path)
                 elif element.content:
-                    await sandbox.files.write(filename, element.content)
+                    summary = await upload_dataset(sandbox, filename, content=element.content)
                 else:
                     await cl.ErrorMessage(content=f"عدم امکان خواندن محتوای فایل `{filename}`").send()
                     continue
-                
+
+                if summary and summary.get("cached"):
+                    await cl.Message(content=f"این داده قبلاً پردازش شده است؛ نسخه‌ی Parquet (`{summary['parquet']}`) از حافظه‌ی نهان در `{graph_input['cwd']}` قرار گرفت: {summary['rows']} سطر، {summary['columns']} ستون ({summary['restore_seconds']} ثانیه).").send()
+                else:
+                    await cl.Message(content=f"فایل `{filename}` با موفقیت به مسیر `{graph_input['cwd']}` آپلود شد.").send()
+                    if summary:
+                        await cl.Message(content=f"فایل `{filename}` به قالب Parquet (`{summary['parquet']}`) تبدیل شد: {summary['rows']} سطر، {summary['columns']} ستون، {summary['memory_mb']} مگابایت در حافظه ({summary['seconds']} ثانیه).").send()
+                if summary and summary.get("schema"):
+                    graph_input["schemas"][filename] = summary["schema"]
+                policy = sampling_policy(summary)
+                if policy:
+                    graph_input["sampling"][filename] = policy
+                    await cl.Message(content=f"این مجموعه داده بزرگ است؛ مراحل اکتشافی (پاک‌سازی و EDA) روی یک نمونه‌ی {policy['sample_rows']} سطری ({policy['method']}) و آموزش مدل روی کل داده اجرا می‌شود.").send()
+
                 # Notify state
-                state["messages"].append(HumanMessage(content=f"[System: User uploaded file '{filename}']"))
-                await cl.Message(content=f"فایل `{filename}` با موفقیت به مسیر `{state['cwd']}` آپلود شد.").send()
+                graph_input["messages"].append(HumanMessage(content=upload_notice(filename, summary)))
 
     # 2. Process User Prompt
-    state["messages"].append(HumanMessage(content=message.content))
-    
-    config = {
-        "recursion_limit": 1000,
-        "configurable": {"sandbox": sandbox}
-    }
+    graph_input["messages"].append(HumanMessage(content=message.content))
+    record_turn(graph_input)
 
     # 3. Execute Graph and Stream results
+    await stream_graph(graph_input, config, sandbox)
+
+async def stream_graph(graph_input, config, sandbox):
+    """
+    Runs the graph on the session's checkpoint thread and streams node output to the UI.
+    Passing `graph_input=None` continues an interrupted run from its last checkpoint.
+    Each run gets its own budget, which the stop button cancels.
+    UI traffic goes through a per-run UIUpdateBuffer and is flushed when the run ends.
+    """
+    graph = await get_graph()
     active_steps = {} # To track cl.Step/Message instances by node name
     last_worker_node = None # To track which node last called a tool
+    budget = RunBudget()
+    cl.user_session.set("budget", budget)
+    ui = UIUpdateBuffer()
+    artifacts = config["configurable"]["artifacts"]
+    artifacts.start_turn()
 
     logger.info("Starting graph execution...")
     try:
-        async for event in graph.astream(state, config=config):
+        async for event in graph.astream(graph_input, config=attach_budget(config, budget)):
             for node_name, value in event.items():
                 # Create a UI object for the node if it doesn't exist
                 if node_name not in active_steps and node_name != Nodes.TOOLS:
                     if node_name == Nodes.SUPERVISOR:
-                        ui_obj = cl.Step(name=node_name,parent_id=cl.context.current_step.id)
+                        ui_obj = cl.Step(name=node_name, parent_id=cl.context.current_step.id if cl.context.current_step else None)
                     else:
                         ui_obj = cl.Message(content="", author=node_name)
                     active_steps[node_name] = ui_obj
-                    await ui_obj.send()
+                    await ui.send(ui_obj)
                 else:
                     ui_obj = active_steps.get(node_name)
 
@@ -198,22 +404,21 @@ async def main(message: cl.Message):
                     last_worker_node = node_name
                     if "messages" in value:
                         last_msg = value["messages"][-1]
-                        state["messages"].append(last_msg)
                         
                         if last_msg.content:
                             # Accumulate messages
                             if isinstance(ui_obj, cl.Step):
                                 current_output = ui_obj.output if ui_obj.output else ""
                                 ui_obj.output = (current_output + "\n\n" + last_msg.content).strip()
-                                # Scan for and attach images
-                                ui_obj.elements = await get_images_from_markdown(ui_obj.output, sandbox)
-                                await ui_obj.update()
+                                # Scan only the appended text and keep earlier images
+                                ui_obj.elements = list(ui_obj.elements or []) + await get_images_from_markdown(last_msg.content, sandbox, artifacts)
+                                await ui.update(ui_obj)
                             else:
                                 current_content = ui_obj.content if ui_obj.content else ""
                                 ui_obj.content = (current_content + "\n\n" + last_msg.content).strip()
-                                # Scan for and attach images
-                                ui_obj.elements = await get_images_from_markdown(ui_obj.content, sandbox)
-                                await ui_obj.update()
+                                # Scan only the appended text and keep earlier images
+                                ui_obj.elements = list(ui_obj.elements or []) + await get_images_from_markdown(last_msg.content, sandbox, artifacts)
+                                await ui.update(ui_obj)
 
                         # Handle Tool Calls
                         if hasattr(last_msg, 'tool_calls') and last_msg.tool_calls:
@@ -230,7 +435,7 @@ async def main(message: cl.Message):
                                 elif tool_name == "create_markdown" and "content" in tc['args']:
                                     tool_content = tc['args']['content']
                                     # Scan tool arguments for images
-                                    image_elements = await get_images_from_markdown(tool_content, sandbox)
+                                    image_elements = await get_images_from_markdown(tool_content, sandbox, artifacts)
                                 else:
                                     tool_content = f"```json\n{str(tc['args'])}\n```"
                                     image_elements = []
@@ -241,17 +446,14 @@ async def main(message: cl.Message):
                                     tool_step.output = tool_content
                                     if image_elements:
                                         tool_step.elements = image_elements
-                                    await tool_step.send()
+                                    await ui.send(tool_step)
                                 else:
-                                    await cl.Message(content=tool_content, author=f"{node_name} (Tool)", elements=image_elements).send()
+                                    await ui.send(cl.Message(content=tool_content, author=f"{node_name} (Tool)", elements=image_elements))
 
                     if "next" in value and value["next"] != Nodes.FINISH:
                         logger.debug(f"Routing to {value['next']}")
 
                 elif node_name == Nodes.TOOLS:
-                    state["messages"].extend(value["messages"])
-                    state["notebook_cells"].extend(value["notebook_cells"])
-                    
                     # Display tool results
                     for msg in value["messages"]:
                         # Skip markdown and download success messages
@@ -273,102 +475,106 @@ async def main(message: cl.Message):
                         if last_worker_node == Nodes.SUPERVISOR and parent_ui:
                             tool_res_step = cl.Step(name=f"Result: {msg.name}", parent_id=parent_ui.id)
                             tool_res_step.output = formatted_content
-                            await tool_res_step.send()
+                            await ui.send(tool_res_step)
                         else:
-                            await cl.Message(content=formatted_content, author=f"{last_worker_node} (Result)").send()
+                            # Small consecutive results are merged into one message
+                            author = f"{last_worker_node} (Result)"
+                            await ui.send_text(author, formatted_content, lambda content, author=author: cl.Message(content=content, author=author))
 
                     # Check for and display images from Jupyter outputs
                     displayed_hashes = cl.user_session.get("displayed_image_hashes", set())
                     displayed_filenames = cl.user_session.get("displayed_image_filenames", set())
 
-                    for cell in value.get("notebook_cells", []):
-                        if cell.get("cell_type") == "code":
-                            for output in cell.get("outputs", []):
-                                if output.get("type") == "image":
-                                    filename = output.get("filename")  # set by e2b.py for file-based outputs
-
-                                    # Filename-based dedup (primary): skip if already shown via markdown
-                                    if filename and filename in displayed_filenames:
-                                        logger.info(f"Skipping duplicate notebook-cell image (already shown via markdown): {filename}")
-                                        continue
-
-                                    try:
-                                        img_data = output.get("data")
-                                        if isinstance(img_data, str):
-                                            # Handle possible base64 padding or prefixes
-                                            if "," in img_data:
-                                                img_data = img_data.split(",")[1]
-                                            img_bytes = base64.b64decode(img_data)
-                                        else:
-                                            img_bytes = img_data
-                                        
-                                        # Hash-based dedup (secondary guard)
-                                        img_hash = hashlib.md5(img_bytes).hexdigest()
-                                        if img_hash in displayed_hashes:
-                                            logger.info("Skipping duplicate image (Jupyter output, hash match)")
-                                            continue
-                                        
-                                        displayed_hashes.add(img_hash)
-                                        if filename:
-                                            displayed_filenames.add(filename)
-                                        cl.user_session.set("displayed_image_hashes", displayed_hashes)
-                                        cl.user_session.set("displayed_image_filenames", displayed_filenames)
-
-                                        image = cl.Image(
-                                            content=img_bytes, 
-                                            name=filename or "plot.png",
-                                            display="inline"
-                                        )
-                                        await cl.Message(
-                                            content="", 
-                                            elements=[image], 
-                                            author=f"{last_worker_node} (Plot)"
-                                        ).send()
-                                    except Exception as img_err:
-                                        logger.error(f"Failed to display image: {img_err}")
+                    new_images = cell_images(value.get("notebook_cells", []), displayed_hashes, displayed_filenames)
+                    cl.user_session.set("displayed_image_hashes", displayed_hashes)
+                    cl.user_session.set("displayed_image_filenames", displayed_filenames)
+                    for name, img_bytes in new_images:
+                        try:
+                            image = cl.Image(
+                                content=img_bytes, 
+                                name=name,
+                                display="inline"
+                            )
+                            await ui.send(cl.Message(
+                                content="", 
+                                elements=[image], 
+                                author=f"{last_worker_node} (Plot)"
+                            ))
+                        except Exception as img_err:
+                            logger.error(f"Failed to display image: {img_err}")
+
+        # The run's UI updates go out before the downloads
+        await ui.flush()
 
         # Final Cleanup and Artifact Delivery
-        # Find files downloaded by the Reporter
+        # Deliver the files written during this turn, straight from the session's manifest
         important_extensions = ['.csv', '.xlsx', '.json', '.png', '.jpg', '.pdf', '.pkl', '.ipynb']
-        files_to_send = []
-        
-        # Search local artifacts directory for generated files
-        import time
-        if os.path.isdir(settings.local_artifacts_dir):
-            for f in os.listdir(settings.local_artifacts_dir):
-                full_path = os.path.join(settings.local_artifacts_dir, f)
-                if not os.path.isfile(full_path):
-                    continue
-                if not any(f.endswith(ext) for ext in important_extensions):
-                    continue
-                # Basic heuristic: files modified in the last 5 minutes are likely artifacts
-                if time.time() - os.path.getmtime(full_path) < 300:
-                    files_to_send.append(cl.File(path=full_path, name=f))
+        files_to_send = [
+            cl.File(path=path, name=os.path.basename(path))
+            for path in artifacts.turn_artifacts()
+            if any(path.endswith(ext) for ext in important_extensions)
+        ]
         
         if files_to_send:
             await cl.Message(content="### دانلود خروجی‌های نشست ###", elements=files_to_send).send()
 
-        logger.info("Graph execution completed successfully.")
+        logger.info(f"Graph execution completed successfully. Usage: {budget.summary()}")
 
     except Exception as e:
         logger.error(f"Error during graph execution: {e}", exc_info=True)
-        await cl.ErrorMessage(content=f"ÛŒÚ© Ø®Ø·Ø§ Ø±Ø® Ø¯Ø§Ø¯: {str(e)}").send()
+        await ui.send(cl.ErrorMessage(content=f"ÛŒÚ© Ø®Ø·Ø§ Ø±Ø® Ø¯Ø§Ø¯: {str(e)}"))
+    finally:
+        # Also when the stop button cancels the run: send what is queued and stop the flush timer
+        await ui.close()
+        # The span file covers the whole session so far and is rewritten after every run
+        spans = active_spans.get()
+        if spans:
+            spans.export()
+
+@cl.on_stop
+async def stop():
+    """
+    Stops the running analysis: cancels the run budget and interrupts the kernel
+    so that a long-running cell does not keep the sandbox busy.
+    """
+    bind_log_session()
+    budget = cl.user_session.get("budget")
+    if budget:
+        budget.cancel("cancelled by user")
+    sandbox = cl.user_session.get("sandbox")
+    if sandbox:
+        await E2BTools(sandbox).interrupt_kernel()
+    logger.info("Run stopped by user.")
 
 @cl.on_chat_end
 async def end(*args):
     """
     Cleanup sandbox and export notebook on session end.
     """
-    state = cl.user_session.get("state")
-    sandbox = cl.user_session.get("sandbox")
+    bind_log_session()
+    config = cl.user_session.get("config")
 
-    if state and state.get("notebook_cells"):
+    state = {}
+    if config:
         try:
-            filename = save_session_to_ipynb(state, f"{settings.local_artifacts_dir}/chainlit_analysis.ipynb")
+            state, _ = await load_thread(await get_graph(), config["configurable"]["thread_id"])
+        except Exception as e:
+            logger.error(f"Failed to load session state: {e}")
+
+    if state.get("notebook_cells"):
+        try:
+            filename = save_session_to_ipynb(state, config["configurable"]["artifacts"].path("chainlit_analysis.ipynb"))
             await cl.Message(content=f"نشست با موفقیت در فایل `{filename}` ذخیره شد.").send()
         except Exception as e:
             logger.error(f"Failed to export notebook: {e}")
 
-    if sandbox:
-        await sandbox.kill()
-        logger.info("E2B Sandbox closed.")
\ No newline at end of file
+    if config:
+        artifact_gc.release(config["configurable"]["artifacts"])
+
+    if config:
+        await sandbox_manager.close(config["configurable"]["thread_id"])
+        logger.info("E2B Sandbox closed.")
+
+    trace = cl.user_session.get("trace")
+    if isinstance(trace, TraceRecorder):
+        trace.close()
\ No newline at end of file
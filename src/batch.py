@@ -0,0 +1,103 @@
+import warnings
+warnings.filterwarnings("ignore")
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+from ds_agent.core.runner import spawn_job, load_result
+from ds_agent.config import settings
+from ds_agent.utils.logger import logger, setup_logger
+
+SUMMARY_FIELDS = ["id", "status", "duration_s", "llm_calls", "input_tokens", "output_tokens", "total_tokens", "artifacts", "error"]
+
+def load_manifest(path: str) -> List[Dict[str, Any]]:
+    """
+    Reads a JSONL manifest: one {"dataset", "prompt", "id"?, "settings"?} object per line.
+    """
+    jobs = []
+    seen_ids = set()
+    with open(path, encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "dataset" not in entry or "prompt" not in entry:
+                raise ValueError(f"Manifest line {index + 1}: 'dataset' and 'prompt' are required.")
+            job_id = str(entry.get("id") or f"job-{index + 1:04d}")
+            if job_id in seen_ids:
+                raise ValueError(f"Manifest line {index + 1}: duplicate job id '{job_id}'.")
+            seen_ids.add(job_id)
+            jobs.append({
+                "id": job_id,
+                "dataset": os.path.abspath(entry["dataset"]),
+                "prompt": entry["prompt"],
+                "settings": entry.get("settings", {}),
+            })
+    return jobs
+
+def write_summary(results: List[Dict[str, Any]], output_dir: str) -> str:
+    """
+    Writes the per-job summary table as CSV and returns its path.
+    """
+    path = os.path.join(output_dir, "summary.csv")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for result in results:
+            row = dict(result)
+            row["artifacts"] = len(result.get("artifacts", []))
+            writer.writerow(row)
+    return path
+
+async def run_batch(jobs: List[Dict[str, Any]], output_dir: str, workers: int) -> List[Dict[str, Any]]:
+    """
+    Runs the jobs with at most `workers` concurrent job processes (one sandbox each).
+    Jobs that already completed in a previous invocation are skipped, so an
+    interrupted batch can simply be started again with the same arguments.
+    """
+    semaphore = asyncio.Semaphore(workers)
+    executed = []
+
+    async def run_one(job: Dict[str, Any]) -> Dict[str, Any]:
+        job_dir = os.path.join(output_dir, job["id"])
+        previous = load_result(job_dir)
+        if previous and previous.get("status") == "completed":
+            logger.info(f"Skipping job {job['id']} (already completed)")
+            return previous
+
+        async with semaphore:
+            logger.info(f"Starting job {job['id']}: {os.path.basename(job['dataset'])}")
+            result = await spawn_job(job, job_dir)
+            executed.append(result)
+            logger.info(f"Job {job['id']} {result['status']} in {result.get('duration_s', 0)}s")
+            return result
+
+    started = time.time()
+    results = await asyncio.gather(*(run_one(job) for job in jobs))
+    elapsed = time.time() - started
+
+    summary_path = write_summary(results, output_dir)
+    completed = sum(1 for r in executed if r["status"] == "completed")
+    throughput = completed / (elapsed / 3600) if elapsed > 0 else 0.0
+    print(f"\n{'id':<24}{'status':<12}{'duration_s':>12}{'llm_calls':>11}{'tokens':>10}")
+    for r in results:
+        print(f"{r['id']:<24}{r['status']:<12}{r.get('duration_s', 0):>12}{r.get('llm_calls', 0):>11}{r.get('total_tokens', 0):>10}")
+    print(f"\nRan {len(executed)} jobs ({completed} completed) in {elapsed:.1f}s -> {throughput:.1f} jobs/hour")
+    print(f"Summary written to {summary_path}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Data Science Agent over many datasets headlessly.")
+    parser.add_argument("manifest", help="JSONL file with one {dataset, prompt, id?, settings?} job per line.")
+    parser.add_argument("--output", default="./batch_runs", help="Directory for per-job notebooks, artifacts and the summary.")
+    parser.add_argument("--workers", type=int, default=settings.batch_workers, help="Number of jobs to run concurrently.")
+    args = parser.parse_args()
+    setup_logger()
+
+    os.makedirs(args.output, exist_ok=True)
+    asyncio.run(run_batch(load_manifest(args.manifest), args.output, args.workers))
@@ -1,3 +1,4 @@
+from typing import Any, Dict, List, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import SecretStr
 
@@ -36,11 +37,156 @@ class Settings(BaseSettings):
     log_file_path: str = "./logs/app.log"
     log_max_bytes:int = 30 * 1024 * 1024 #30 MB
     log_backup_count:int = 5
+    log_format: str = "text" # "text" or "json"
     sandbox_timeout: int = 3600
     max_retries: int = 3
     node_recursion_limit: int = 50
+    recursion_limit: int = 1000
+
+    # Per-run budgets, enforced cooperatively by the nodes (0 disables a limit)
+    run_max_seconds: int = 3600
+    run_max_tokens: int = 2_000_000
+    run_max_llm_calls: int = 300
+    run_max_sandbox_seconds: int = 1800
+
+    # Sandbox lifecycle in the Chainlit app: idle sandboxes are paused, long-idle ones killed
+    sandbox_idle_seconds: int = 600
+    sandbox_reap_seconds: int = 86400
+    sandbox_max_live: int = 20
+    sandbox_reap_interval: int = 60
+
+    # New sandboxes: an optional E2B template (e.g. with extra packages preinstalled) and a kernel
+    # warm-up that imports the data-science stack and sets plot/display defaults before the first cell.
+    # KERNEL_BOOTSTRAP_FILE replaces the bundled tools/kernel_bootstrap.py.
+    sandbox_template: str = ""
+    kernel_bootstrap_enabled: bool = True
+    kernel_bootstrap_file: str = ""
+    kernel_bootstrap_timeout: int = 180
+
+    # Upload ingestion: CSV/Excel uploads get a typed, compressed Parquet copy in the sandbox.
+    # Downcasting narrows floats only; categoricals for repetitive string columns are opt-in.
+    ingest_enabled: bool = True
+    ingest_downcast: bool = True
+    ingest_categories: bool = False
+    ingest_compression: str = "zstd"
+    ingest_timeout: int = 1800
+
+    # Sampling of large uploads: exploratory stages (cleaner inspection, EDA) work on a sample,
+    # modeling on the full data. Applies when the table exceeds the threshold in memory.
+    sample_enabled: bool = True
+    sample_threshold_mb: int = 200
+    sample_rows: int = 100_000
+    sample_stratify_column: str = ""
+    sample_seed: int = 42
+
+    # Cross-session dataset cache: tabular uploads are keyed by content hash, and one ingested before
+    # (by any session or batch job) is restored from its cached Parquet copy instead of being
+    # uploaded and converted again. Least recently used entries are evicted above the quota (0 disables it).
+    dataset_cache_enabled: bool = True
+    dataset_cache_dir: str = "./data/datasets"
+    dataset_cache_quota_mb: int = 20_000
+
+    # Retrieval of proven code: cells that ran without error are indexed per stage and dataset schema
+    # (SQLite FTS5), and each worker's prompt gets the best matches from other sessions within the token budget.
+    # Snippets are only retrieved for the user who wrote them (cells may hold file names, literals or
+    # credentials), so sessions without a user identity get none, unless sharing across users is enabled.
+    snippet_index_enabled: bool = True
+    snippet_share_across_users: bool = False
+    snippet_index_path: str = "./data/snippets.sqlite"
+    snippet_top_k: int = 3
+    snippet_token_budget: int = 1500
+    snippet_min_chars: int = 80
+
+    # Per-cell telemetry of the sandbox kernel (wall/CPU time, peak RSS); warnings above the thresholds (0 disables)
+    cell_telemetry: bool = True
+    cell_warn_seconds: float = 120
+    cell_warn_peak_rss_mb: int = 4096
+
+    # Execution deadlines (0 disables). A cell past its deadline is interrupted (SIGINT), which keeps
+    # the kernel and its variables; nodes listed as adaptive get twice the time after each timeout.
+    cell_timeout_seconds: int = 600
+    shell_timeout_seconds: int = 300
+    node_cell_timeouts: Dict[str, int] = {"trainer": 1800}
+    cell_timeout_adaptive_nodes: List[str] = ["trainer"]
+    cell_timeout_max_seconds: int = 7200
+
+    # Package installs through run_shell (`pip install`, `apt-get install`): packages already present are
+    # skipped, failed installs are retried, and pip is served from a host wheelhouse (PIP_WHEELHOUSE_DIR,
+    # synced into the sandbox on demand) that collects the wheels of new installs for later sessions.
+    install_manager_enabled: bool = True
+    install_timeout_seconds: int = 900
+    install_retries: int = 2
+    pip_wheelhouse_dir: str = ""
+    pip_wheelhouse_collect: bool = True
+
+    # Trainer's hyperparameter_search tool: every cross-validation fit is a task on the sandbox cores
+    # (-1 = all), with successive halving keeping the best 1/factor of the configurations per rung
+    search_max_trials: int = 200
+    search_halving_factor: int = 3
+    search_n_jobs: int = -1
+    search_seed: int = 42
 
     local_artifacts_dir: str = "public/downloads"
 
+    # Artifact retention: background eviction of old files (0 disables a limit)
+    artifact_session_quota_mb: int = 500
+    artifact_global_quota_mb: int = 10_000
+    artifact_max_age_hours: int = 72
+    artifact_gc_interval: int = 600
+
+    # Chainlit UI update buffer
+    ui_flush_interval: float = 0.25
+    ui_max_pending: int = 50
+    ui_batch_max_chars: int = 2000
+
+    # Durable graph checkpoints (one thread per chat session)
+    checkpoint_db_path: str = "./data/checkpoints.sqlite"
+
+    # Record/replay of LLM and sandbox traffic: "off", "record" or "replay"
+    trace_mode: str = "off"
+    trace_dir: str = "./traces"
+    trace_strict: bool = False
+
+    # Span tracing of nodes, LLM calls and sandbox operations (Chrome trace JSON per session)
+    span_tracing: bool = False
+    span_trace_dir: str = "./spans"
+
+    # Headless batch runner
+    batch_workers: int = 4
+
+    # HTTP job API (src/server.py)
+    api_host: str = "0.0.0.0"
+    api_port: int = 8080
+    api_workers: int = 2
+    api_queue_size: int = 16
+    api_jobs_dir: str = "./api_jobs"
+    api_poll_interval: float = 0.5
+
+_settings: Optional[Settings] = None
+
+def init_settings(**overrides: Any) -> Settings:
+    """
+    Builds the settings from the environment / .env (plus explicit overrides) and
+    installs them as the process-wide instance. Entry points call this at startup;
+    otherwise it happens implicitly on first access to `settings`.
+    """
+    global _settings
+    _settings = Settings(**overrides)
+    return _settings
+
+def get_settings() -> Settings:
+    return _settings if _settings is not None else init_settings()
+
+class _LazySettings:
+    """
+    Stand-in for the Settings singleton that defers reading the environment
+    until an attribute is first accessed, so importing modules stays cheap.
+    """
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_settings(), name)
+
+    def __repr__(self) -> str:
+        return repr(get_settings())
+
 # Create a singleton instance
-settings = Settings()
\ No newline at end of file
+settings = _LazySettings()
\ No newline at end of file
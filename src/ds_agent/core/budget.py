@@ -0,0 +1,108 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, Optional
+
+from ds_agent.config import settings
+from ds_agent.utils.usage import UsageTracker
+
+class BudgetExceeded(Exception):
+    """Raised when a run is cancelled or one of its budgets runs out mid-operation."""
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class RunBudget(UsageTracker):
+    """
+    Limits for a single graph run: wall-clock time, tokens, LLM calls and sandbox execution time.
+    A limit of 0 disables it. Nodes check `exhausted()` cooperatively and route to the reporter;
+    long operations are wrapped in `guard()` so they can be aborted mid-flight.
+    """
+    def __init__(self,
+                 max_seconds: Optional[int] = None,
+                 max_tokens: Optional[int] = None,
+                 max_llm_calls: Optional[int] = None,
+                 max_sandbox_seconds: Optional[int] = None):
+        max_seconds = settings.run_max_seconds if max_seconds is None else max_seconds
+        max_tokens = settings.run_max_tokens if max_tokens is None else max_tokens
+        max_llm_calls = settings.run_max_llm_calls if max_llm_calls is None else max_llm_calls
+        max_sandbox_seconds = settings.run_max_sandbox_seconds if max_sandbox_seconds is None else max_sandbox_seconds
+        super().__init__()
+        self.max_seconds = max_seconds
+        self.max_tokens = max_tokens
+        self.max_llm_calls = max_llm_calls
+        self.max_sandbox_seconds = max_sandbox_seconds
+        self.started_at = time.monotonic()
+        self.sandbox_seconds = 0.0
+        self.cancel_reason: Optional[str] = None
+        self._cancelled = asyncio.Event()
+
+    @property
+    def elapsed_seconds(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining_seconds(self) -> Optional[float]:
+        if not self.max_seconds:
+            return None
+        return max(0.0, self.max_seconds - self.elapsed_seconds)
+
+    def cancel(self, reason: str = "cancelled by user") -> None:
+        self.cancel_reason = reason
+        self._cancelled.set()
+
+    def add_sandbox_time(self, seconds: float) -> None:
+        self.sandbox_seconds += seconds
+
+    def exhausted(self) -> Optional[str]:
+        """
+        Returns the reason the run must stop, or None while it is within budget.
+        """
+        if self.cancel_reason:
+            return self.cancel_reason
+        if self.max_seconds and self.elapsed_seconds >= self.max_seconds:
+            return f"time limit of {self.max_seconds}s reached"
+        if self.max_tokens and self.total_tokens >= self.max_tokens:
+            return f"token limit of {self.max_tokens} reached"
+        if self.max_llm_calls and self.llm_calls >= self.max_llm_calls:
+            return f"LLM call limit of {self.max_llm_calls} reached"
+        if self.max_sandbox_seconds and self.sandbox_seconds >= self.max_sandbox_seconds:
+            return f"sandbox time limit of {self.max_sandbox_seconds}s reached"
+        return None
+
+    async def guard(self, awaitable: Awaitable[Any]) -> Any:
+        """
+        Awaits an operation, aborting it with BudgetExceeded if the run is cancelled
+        or its wall-clock budget expires first.
+        """
+        task = asyncio.ensure_future(awaitable)
+        cancel_wait = asyncio.ensure_future(self._cancelled.wait())
+        try:
+            done, _ = await asyncio.wait({task, cancel_wait}, timeout=self.remaining_seconds(), return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            cancel_wait.cancel()
+
+        if task in done:
+            return task.result()
+        task.cancel()
+        raise BudgetExceeded(self.exhausted() or f"time limit of {self.max_seconds}s reached")
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            **super().summary(),
+            "elapsed_seconds": round(self.elapsed_seconds, 2),
+            "sandbox_seconds": round(self.sandbox_seconds, 2),
+            "stop_reason": self.exhausted(),
+        }
+
+def attach_budget(config: Dict[str, Any], budget: RunBudget) -> Dict[str, Any]:
+    """
+    Returns a copy of a run config that carries the budget to the nodes and
+    registers it as a callback so that it sees every LLM call.
+    """
+    return {
+        **config,
+        "configurable": {**config.get("configurable", {}), "budget": budget},
+        "callbacks": [*(config.get("callbacks") or []), budget],
+    }
@@ -0,0 +1,72 @@
+import os
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from ds_agent.config import settings
+from ds_agent.utils.artifacts import ArtifactStore
+from ds_agent.utils.logger import logger
+
+if TYPE_CHECKING:
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+# Process-wide saver. aiosqlite needs a running event loop, so it is opened lazily.
+_checkpointer: Optional["AsyncSqliteSaver"] = None
+_connection: Optional["aiosqlite.Connection"] = None
+
+async def get_checkpointer() -> "AsyncSqliteSaver":
+    """
+    Returns the shared SQLite checkpointer, creating the database on first use.
+    Every super-step of the graph is persisted, so a thread can be resumed
+    from its last completed node after a crash or restart.
+    """
+    global _checkpointer, _connection
+    if _checkpointer is None:
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+        db_dir = os.path.dirname(settings.checkpoint_db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        _connection = await aiosqlite.connect(settings.checkpoint_db_path)
+        _checkpointer = AsyncSqliteSaver(_connection)
+        await _checkpointer.setup()
+        logger.info(f"Checkpointer initialized at {settings.checkpoint_db_path}")
+    return _checkpointer
+
+async def close_checkpointer() -> None:
+    """
+    Closes the shared SQLite connection (used by the CLI on exit).
+    """
+    global _checkpointer, _connection
+    if _connection is not None:
+        await _connection.close()
+    _checkpointer = None
+    _connection = None
+
+def build_run_config(thread_id: str, sandbox: Any, artifacts: Optional[ArtifactStore] = None, user: str = "") -> Dict[str, Any]:
+    """
+    Builds the RunnableConfig for a graph run on the given checkpoint thread.
+    Artifacts go to a per-thread directory unless a store is given.
+    `user` identifies who runs the session ("" if unknown); snippet retrieval is scoped to it.
+    """
+    return {
+        "recursion_limit": settings.recursion_limit,
+        "configurable": {
+            "thread_id": thread_id,
+            "sandbox": sandbox,
+            "artifacts": artifacts or ArtifactStore.for_session(thread_id),
+            "user_id": user,
+        }
+    }
+
+async def load_thread(graph: Any, thread_id: str) -> Tuple[Dict[str, Any], Tuple[str, ...]]:
+    """
+    Loads the latest checkpoint of a thread.
+
+    Returns:
+        (state values, pending nodes). Pending nodes are non-empty when the
+        previous run was interrupted before reaching the end of the graph.
+    """
+    snapshot = await graph.aget_state({"configurable": {"thread_id": thread_id}})
+    return snapshot.values or {}, tuple(snapshot.next or ())
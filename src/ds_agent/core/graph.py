@@ -1,4 +1,7 @@
+import functools
+from typing import Optional
 from langgraph.graph import StateGraph, START, END
+from langgraph.checkpoint.base import BaseCheckpointSaver
 
 from ds_agent.core.state import AgentState
 from ds_agent.config import Nodes
@@ -6,6 +9,7 @@ from ds_agent.core.nodes.supervisor import supervisor_node
 from ds_agent.core.nodes.worker import cleaner_node, eda_node, feature_engineer_node, trainer_node, storyteller_node
 from ds_agent.core.nodes.tools import tool_node
 from ds_agent.core.nodes.reporter import reporter_node
+from ds_agent.utils.tracing import traced_node
 
 # --- Conditional Logic ---
 
@@ -26,17 +30,23 @@ def tool_router(state: AgentState) -> str:
 
 # --- Graph ---
 
-def create_graph() -> StateGraph:
+@functools.lru_cache(maxsize=8)
+def create_graph(checkpointer: Optional[BaseCheckpointSaver] = None) -> StateGraph:
+    """
+    Builds the agent graph. When a checkpointer is given, every step is persisted
+    per `thread_id` so interrupted sessions can be resumed.
+    Compiled graphs are cached per checkpointer, so repeated calls are free.
+    """
     workflow = StateGraph(AgentState)
     
-    workflow.add_node(Nodes.SUPERVISOR, supervisor_node)
-    workflow.add_node(Nodes.CLEANER, cleaner_node)
-    workflow.add_node(Nodes.EDA, eda_node)
-    workflow.add_node(Nodes.FEATURE_ENGINEER, feature_engineer_node)
-    workflow.add_node(Nodes.TRAINER, trainer_node)
-    workflow.add_node(Nodes.STORYTELLER, storyteller_node)
-    workflow.add_node(Nodes.TOOLS, tool_node)
-    workflow.add_node(Nodes.REPORTER, reporter_node)
+    workflow.add_node(Nodes.SUPERVISOR, traced_node(Nodes.SUPERVISOR, supervisor_node))
+    workflow.add_node(Nodes.CLEANER, traced_node(Nodes.CLEANER, cleaner_node))
+    workflow.add_node(Nodes.EDA, traced_node(Nodes.EDA, eda_node))
+    workflow.add_node(Nodes.FEATURE_ENGINEER, traced_node(Nodes.FEATURE_ENGINEER, feature_engineer_node))
+    workflow.add_node(Nodes.TRAINER, traced_node(Nodes.TRAINER, trainer_node))
+    workflow.add_node(Nodes.STORYTELLER, traced_node(Nodes.STORYTELLER, storyteller_node))
+    workflow.add_node(Nodes.TOOLS, traced_node(Nodes.TOOLS, tool_node))
+    workflow.add_node(Nodes.REPORTER, traced_node(Nodes.REPORTER, reporter_node))
     
     workflow.add_edge(START, Nodes.SUPERVISOR)
     
@@ -99,4 +109,4 @@ def create_graph() -> StateGraph:
     
     workflow.add_edge(Nodes.REPORTER, END)
     
-    return workflow.compile()
\ No newline at end of file
+    return workflow.compile(checkpointer=checkpointer)
\ No newline at end of file
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from ds_agent.core.runner import spawn_job, load_result, JOB_FILE
+from ds_agent.utils.logger import logger
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+@dataclass
+class JobRecord:
+    id: str
+    job_dir: str
+    status: str = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+        }
+
+class JobQueue:
+    """
+    Bounded async job queue. A fixed pool of workers runs jobs through `spawn_job`
+    (one child process and sandbox per job); submissions beyond `max_size`
+    waiting jobs are rejected so that callers can back off.
+    """
+    def __init__(self, jobs_dir: str, workers: int, max_size: int):
+        self.jobs_dir = jobs_dir
+        self.num_workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self.jobs: Dict[str, JobRecord] = {}
+        self._workers: List[asyncio.Task] = []
+
+    def reserve(self) -> JobRecord:
+        """
+        Allocates an id and directory for a job that is about to be submitted.
+        """
+        if self.queue.full():
+            raise QueueFullError("Job queue is full.")
+        job_id = uuid.uuid4().hex[:12]
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        return JobRecord(id=job_id, job_dir=job_dir)
+
+    def submit(self, record: JobRecord, dataset: str, prompt: str, overrides: Optional[Dict[str, Any]] = None) -> JobRecord:
+        job = {"id": record.id, "dataset": dataset, "prompt": prompt, "settings": overrides or {}}
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError("Job queue is full.")
+        # Persist the job right away so that queued jobs survive a restart too
+        with open(os.path.join(record.job_dir, JOB_FILE), "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False, indent=2)
+        self.jobs[record.id] = record
+        logger.info(f"Job {record.id} queued ({self.queue.qsize()} waiting)")
+        return record
+
+    def restore(self) -> None:
+        """
+        Re-registers jobs found on disk after a restart. Finished jobs keep their result;
+        unfinished ones are queued again and resume from their checkpoints.
+        """
+        if not os.path.isdir(self.jobs_dir):
+            return
+        for job_id in sorted(os.listdir(self.jobs_dir)):
+            job_dir = os.path.join(self.jobs_dir, job_id)
+            job_path = os.path.join(job_dir, JOB_FILE)
+            if not os.path.exists(job_path):
+                continue
+            record = JobRecord(id=job_id, job_dir=job_dir, created_at=os.path.getmtime(job_path))
+            result = load_result(job_dir)
+            if result and result.get("status") in ("completed", "failed"):
+                record.status = result["status"]
+                record.result = result
+                self.jobs[job_id] = record
+                continue
+            with open(job_path, encoding="utf-8") as f:
+                job = json.load(f)
+            try:
+                self.queue.put_nowait(job)
+                self.jobs[job_id] = record
+                logger.info(f"Job {job_id} re-queued after restart")
+            except asyncio.QueueFull:
+                logger.warning(f"Job {job_id} could not be re-queued: queue is full")
+
+    def start(self) -> None:
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.num_workers)]
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await self.queue.get()
+            record = self.jobs[job["id"]]
+            record.status = "running"
+            record.started_at = time.time()
+            logger.info(f"Worker {index} running job {record.id}")
+            try:
+                record.result = await spawn_job(job, record.job_dir)
+                record.status = "completed" if record.result.get("status") == "completed" else "failed"
+            except asyncio.CancelledError:
+                record.status = "queued"
+                raise
+            except Exception as e:
+                logger.error(f"Job {record.id} crashed: {e}", exc_info=True)
+                record.result = {"id": record.id, "status": "failed", "error": str(e)}
+                record.status = "failed"
+            finally:
+                record.finished_at = time.time() if record.finished else None
+                self.queue.task_done()
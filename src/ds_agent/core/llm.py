@@ -1,5 +1,4 @@
-# from langchain_openai import ChatOpenAI
-from langchain_nvidia import ChatNVIDIA
+from typing import Optional
 from ds_agent.config import settings
 
 class LLMFactory:
@@ -7,11 +6,14 @@ class LLMFactory:
     Factory for creating LLM instances with structured output and tool support.
     """
     def __init__(self, 
-                 model_name: str = settings.model_name, 
-                 temperature: float = settings.temperature,
+                 model_name: Optional[str] = None, 
+                 temperature: Optional[float] = None,
                  thinking: bool = True, 
                  max_output_tokens: int = 2048,
-                 max_retries: int = settings.max_retries):
+                 max_retries: Optional[int] = None):
+        model_name = settings.model_name if model_name is None else model_name
+        temperature = settings.temperature if temperature is None else temperature
+        max_retries = settings.max_retries if max_retries is None else max_retries
         self.model_name = model_name
         self.temperature = temperature
         self.thinking = thinking
@@ -22,6 +24,9 @@ class LLMFactory:
         """
         Creates and returns a configured ChatNVIDIA instance.
         """
+        # Imported on first use: the provider SDK is slow to import and not needed to start up
+        # from langchain_openai import ChatOpenAI
+        from langchain_nvidia import ChatNVIDIA
         return ChatNVIDIA(
             model=self.model_name,
             temperature=self.temperature,
@@ -5,7 +5,7 @@ from langchain_core.runnables import RunnableConfig
 
 from ds_agent.core.state import AgentState
 from ds_agent.config import Nodes  , settings
-from ds_agent.utils.helpers import get_sandbox
+from ds_agent.utils.helpers import get_sandbox, get_artifacts
 from ds_agent.utils.logger import logger
 from ds_agent.utils.notebook import save_session_to_ipynb
 from ds_agent.tools.e2b import E2BTools
@@ -22,7 +22,8 @@ async def reporter_node(state: AgentState, config: RunnableConfig) -> Dict[str,
     node_visits[Nodes.REPORTER] = node_visits.get(Nodes.REPORTER, 0) + 1
     
     sandbox = get_sandbox(config)
-    e2b_tools = E2BTools(sandbox)
+    artifacts = get_artifacts(config)
+    e2b_tools = E2BTools(sandbox, artifacts=artifacts)
     
     # 1. Download generated files
     # We look for files created/modified during the session (excluding common system files)
@@ -50,9 +51,9 @@ async def reporter_node(state: AgentState, config: RunnableConfig) -> Dict[str,
         downloaded = []
 
     # 2. Export Notebook
-    notebook_path = f"{settings.local_artifacts_dir}/final_analysis.ipynb"
+    notebook_path = artifacts.path("final_analysis.ipynb")
     try:
-        notebook_path = save_session_to_ipynb(state, notebook_path)
+        notebook_path = artifacts.record(save_session_to_ipynb(state, notebook_path))
     except Exception as e:
         logger.error(f"Error exporting notebook: {e}")
         notebook_path = "Error exporting notebook"
@@ -1,13 +1,15 @@
 from typing import Literal, Dict, Any
 from pydantic import BaseModel, Field
 from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
 
 from ds_agent.core.state import AgentState
 from ds_agent.utils.helpers import get_llm
 from ds_agent.utils.logger import logger
 from ds_agent.config import settings, Nodes
 from ds_agent.core.prompts import SUPERVISOR_PROMPT
-from ds_agent.utils.helpers import get_llm, invoke_structured_with_recovery
+from ds_agent.utils.helpers import get_llm, invoke_structured_with_recovery, get_budget, budget_exhausted_update
+from ds_agent.core.budget import BudgetExceeded
 
 # --- Models ---
 class SupervisorDecision(BaseModel):
@@ -15,7 +17,7 @@ class SupervisorDecision(BaseModel):
     instructions: str = Field(description="Specific, detailed instructions for the next agent.")
     next_agent: Literal["cleaner", "eda", "feature_engineer", "trainer", "storyteller", "reporter", "FINISH"]
 
-async def supervisor_node(state: AgentState) -> Dict[str, Any]:
+async def supervisor_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
     """
     Supervisor determines which agent should act next, providing instructions.
     Uses robust recovery to ensure structured output.
@@ -34,17 +36,22 @@ async def supervisor_node(state: AgentState) -> Dict[str, Any]:
             "messages": [SystemMessage(content="سیستم: ناظر به حد مجاز تکرار رسید. پایان دادن به جریان کاری.")]
         }
 
+    budget = get_budget(config)
+    if budget and budget.exhausted():
+        return budget_exhausted_update(budget.exhausted(), node_visits)
+
     llm = get_llm(model_name=settings.supervisor_model_name)
     
     messages = [SystemMessage(content=SUPERVISOR_PROMPT)] + state['messages']
     
     try:
         # Use the recovery helper instead of direct chain invocation
-        response, metadata = await invoke_structured_with_recovery(
+        call = invoke_structured_with_recovery(
             llm=llm,
             prompt_value=messages,
             schema_model=SupervisorDecision
         )
+        response, metadata = await budget.guard(call) if budget else await call
         
         next_agent = response.next_agent
         
@@ -64,6 +71,8 @@ async def supervisor_node(state: AgentState) -> Dict[str, Any]:
             # We append the Supervisor's thought process to the history so it persists
             "messages": [HumanMessage(content=f"**تصمیم ناظر:**\n*استدلال:* {response.reasoning}\n*دستورالعمل‌ها:* {response.instructions}")]
         }
+    except BudgetExceeded as e:
+        return budget_exhausted_update(e.reason, node_visits)
     except Exception as e:
         logger.error(f"Error in Supervisor node: {e}", exc_info=True)
         return {
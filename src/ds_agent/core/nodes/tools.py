@@ -3,9 +3,10 @@ from langchain_core.messages import ToolMessage
 from langchain_core.runnables import RunnableConfig
 
 from ds_agent.core.state import AgentState
-from ds_agent.utils.helpers import get_sandbox
+from ds_agent.utils.helpers import get_sandbox, get_budget, get_artifacts, get_cell_timeout
 from ds_agent.tools.e2b import E2BTools
 from ds_agent.utils.logger import logger
+from ds_agent.utils.snippets import index_cells
 from ds_agent.config import Nodes
 
 async def tool_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
@@ -19,16 +20,19 @@ async def tool_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]
     node_visits[Nodes.TOOLS] = node_visits.get(Nodes.TOOLS, 0) + 1
     
     sandbox = get_sandbox(config)
+    budget = get_budget(config)
         
     new_cells = []
     def update_callback(cell_data):
         new_cells.append(cell_data)
 
-    e2b_tools = E2BTools(sandbox, update_state_callback=update_callback)
+    e2b_tools = E2BTools(sandbox, update_state_callback=update_callback, budget=budget, artifacts=get_artifacts(config),
+                         cell_timeout=get_cell_timeout(state))
     tool_map = {t.name: t for t in e2b_tools.get_tools()}
     
     last_message = state['messages'][-1]
     results = []
+    stop_reason = None
     
     if not hasattr(last_message, 'tool_calls'):
          logger.warning("Tool node called but last message has no tool_calls")
@@ -39,6 +43,12 @@ async def tool_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]
         tool_args = tool_call['args']
         tool_id = tool_call['id']
         
+        # Every tool call still needs a ToolMessage, so skipped calls are answered too
+        stop_reason = stop_reason or (budget.exhausted() if budget else None)
+        if stop_reason:
+            results.append(ToolMessage(tool_call_id=tool_id, name=tool_name, content=f"Status: Skipped\nOutput: Run budget exhausted ({stop_reason})."))
+            continue
+
         logger.info(f"Executing tool: {tool_name}")
         if tool_name in tool_map:
             try:
@@ -57,8 +67,24 @@ async def tool_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]
             
         results.append(ToolMessage(tool_call_id=tool_id, name=tool_name, content=content))
 
-    return {
+    # Cells that ran cleanly become retrievable examples for later sessions
+    configurable = config.get("configurable", {})
+    await index_cells(new_cells, state.get("next", ""), state.get("schemas") or {}, configurable.get("thread_id", ""), configurable.get("user_id", ""))
+
+    update = {
         "messages": results,
         "notebook_cells": new_cells,
         "node_visits": node_visits
     }
+    if e2b_tools.timeouts:
+        node = state.get("next", "")
+        cell_timeouts = state.get("cell_timeouts", {}).copy()
+        cell_timeouts[node] = cell_timeouts.get(node, 0) + e2b_tools.timeouts
+        update["cell_timeouts"] = cell_timeouts
+    if e2b_tools.installed:
+        update["installed_packages"] = e2b_tools.installed
+    stop_reason = stop_reason or (budget.exhausted() if budget else None)
+    if stop_reason:
+        logger.warning(f"Run budget exhausted ({stop_reason}). Routing to Reporter.")
+        update["next"] = Nodes.REPORTER
+    return update
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from pydantic import TypeAdapter, ValidationError
+
+from ds_agent.config import Settings, settings, Nodes
+from ds_agent.utils.logger import logger, set_log_session, setup_logger
+
+# Files kept in each job directory
+JOB_FILE = "job.json"
+RESULT_FILE = "result.json"
+EVENTS_FILE = "events.jsonl"
+THREAD_FILE = "thread_id"
+
+# Settings a job may override (models, budgets, timeouts). Everything else, in particular API keys,
+# paths and the process environment, stays as the server configured it.
+OVERRIDABLE_SETTINGS = frozenset({
+    "model_name", "supervisor_model_name", "cleaner_model_name", "eda_model_name", "feature_engineer_model_name",
+    "trainer_model_name", "storyteller_model_name", "reporter_model_name", "temperature", "max_retries",
+    "node_recursion_limit", "recursion_limit",
+    "run_max_seconds", "run_max_tokens", "run_max_llm_calls", "run_max_sandbox_seconds",
+    "cell_timeout_seconds", "shell_timeout_seconds", "node_cell_timeouts", "cell_timeout_max_seconds",
+    "ingest_timeout", "install_timeout_seconds", "kernel_bootstrap_timeout", "search_max_trials",
+})
+
+def check_overrides(overrides: Any) -> Dict[str, Any]:
+    """
+    Validates a job's settings overrides: a JSON object whose keys are in OVERRIDABLE_SETTINGS
+    and whose values have the setting's type. Raises ValueError otherwise.
+    """
+    if overrides is None:
+        return {}
+    if not isinstance(overrides, dict):
+        raise ValueError("Settings overrides must be a JSON object.")
+    rejected = sorted(str(key) for key in overrides if str(key).lower() not in OVERRIDABLE_SETTINGS)
+    if rejected:
+        raise ValueError(f"Settings that cannot be overridden: {', '.join(rejected)}. Allowed: {', '.join(sorted(OVERRIDABLE_SETTINGS))}.")
+    checked = {}
+    for key, value in overrides.items():
+        name = key.lower()
+        try:
+            TypeAdapter(Settings.model_fields[name].annotation).validate_python(value)
+        except ValidationError as e:
+            raise ValueError(f"Invalid value for '{name}': {e.errors()[0]['msg']}")
+        checked[name] = value
+    return checked
+
+def summarize_event(node_name: str, value: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Converts a graph stream update into a compact, JSON-serializable event.
+    """
+    value = value or {}
+    return {
+        "ts": round(time.time(), 3),
+        "node": node_name,
+        "next": value.get("next"),
+        "messages": [{
+            "type": m.type,
+            "name": getattr(m, "name", None),
+            "content": str(m.content)[:2000],
+            "tool_calls": [tc["name"] for tc in getattr(m, "tool_calls", None) or []],
+        } for m in value.get("messages", [])],
+    }
+
+def load_result(job_dir: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the recorded result of a job, or None if it never finished.
+    """
+    path = os.path.join(job_dir, RESULT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+async def run_job(job_dir: str) -> Dict[str, Any]:
+    """
+    Runs one analysis job headlessly in this process.
+
+    The job description is read from `job_dir/job.json` ({"id", "dataset", "prompt"}).
+    Graph events are appended to `events.jsonl`, the notebook is written to `analysis.ipynb`
+    and the outcome (status, duration, token usage and budget) to `result.json`.
+    If the job was interrupted and its sandbox is still alive, the run continues
+    from the last checkpointed node instead of starting over.
+    """
+    # The graph stack is imported here, in the job process only: batch and API
+    # parents just spawn jobs and start faster without it
+    from langchain_core.messages import HumanMessage
+    from ds_agent.core.graph import create_graph
+    from ds_agent.core.checkpoint import get_checkpointer, close_checkpointer, build_run_config, load_thread
+    from ds_agent.core.budget import RunBudget, attach_budget
+    from ds_agent.utils.artifacts import ArtifactStore
+    from ds_agent.utils.helpers import reattach_sandbox
+    from ds_agent.tools.ingest import upload_dataset, upload_notice, sampling_policy
+    from ds_agent.utils.notebook import save_session_to_ipynb
+    from ds_agent.utils.replay import active_trace, open_trace, record_turn, TraceRecorder
+    from ds_agent.utils.tracing import active_spans, open_span_recorder
+
+    with open(os.path.join(job_dir, JOB_FILE), encoding="utf-8") as f:
+        job = json.load(f)
+
+    set_log_session(job["id"])
+    trace = open_trace(job["id"])
+    active_trace.set(trace)
+    spans = open_span_recorder(job["id"])
+    active_spans.set(spans)
+
+    started = time.time()
+    budget = RunBudget()
+    result = {"id": job["id"], "dataset": job["dataset"], "prompt": job["prompt"], "status": "failed", "error": None}
+    graph = create_graph(checkpointer=await get_checkpointer())
+    sandbox = None
+    keep_sandbox = False
+
+    thread_path = os.path.join(job_dir, THREAD_FILE)
+    thread_id = job["id"]
+    if os.path.exists(thread_path):
+        with open(thread_path) as f:
+            thread_id = f.read().strip()
+
+    try:
+        values, pending = await load_thread(graph, thread_id)
+        sandbox, reattached = await reattach_sandbox(values.get("sandbox_id"))
+        # Sandbox creation and kernel warm-up times (absent for a reattached sandbox)
+        result["bootstrap"] = getattr(sandbox, "bootstrap", None)
+
+        if pending and reattached:
+            logger.info(f"Job {job['id']}: continuing interrupted run at {', '.join(pending)}")
+            graph_input = None
+        else:
+            if values:
+                # Previous attempt cannot be continued; start over on a new thread
+                thread_id = f"{job['id']}-{uuid.uuid4().hex[:8]}"
+            with open(thread_path, "w") as f:
+                f.write(thread_id)
+
+            filename = os.path.basename(job["dataset"])
+            logger.info(f"Job {job['id']}: uploading {filename} to sandbox")
+            result["ingest"] = await upload_dataset(sandbox, filename, path=job["dataset"])
+
+            graph_input = {
+                "messages": [
+                    HumanMessage(content=upload_notice(filename, result["ingest"])),
+                    HumanMessage(content=job["prompt"])
+                ],
+                "cwd": "/home/user",
+                "next": Nodes.SUPERVISOR,
+                "node_visits": {},
+                "sandbox_id": sandbox.sandbox_id
+            }
+            if result["ingest"] and result["ingest"].get("schema"):
+                graph_input["schemas"] = {filename: result["ingest"]["schema"]}
+            policy = sampling_policy(result["ingest"])
+            if policy:
+                graph_input["sampling"] = {filename: policy}
+            record_turn(graph_input)
+
+        # The job process has its own artifacts directory, so no per-thread subdirectory
+        config = attach_budget(build_run_config(thread_id, sandbox, ArtifactStore()), budget)
+
+        with open(os.path.join(job_dir, EVENTS_FILE), "a", encoding="utf-8") as events:
+            async for event in graph.astream(graph_input, config=config):
+                for node_name, value in event.items():
+                    events.write(json.dumps(summarize_event(node_name, value), ensure_ascii=False) + "\n")
+                    events.flush()
+
+        state, _ = await load_thread(graph, thread_id)
+        result["notebook"] = save_session_to_ipynb(state, os.path.join(job_dir, "analysis.ipynb"))
+        result["packages"] = state.get("installed_packages", {})
+        result["status"] = "completed"
+
+    except asyncio.CancelledError:
+        # Interrupted (e.g. Ctrl-C): keep the sandbox alive so the next attempt can resume
+        result["status"] = "interrupted"
+        keep_sandbox = True
+        raise
+    except Exception as e:
+        logger.error(f"Job {job['id']} failed: {e}", exc_info=True)
+        result["error"] = str(e)
+    finally:
+        if sandbox and not keep_sandbox:
+            await sandbox.kill()
+        await close_checkpointer()
+        if isinstance(trace, TraceRecorder):
+            trace.close()
+        if spans:
+            result["spans"] = spans.export(job_dir)
+
+        artifacts_dir = settings.local_artifacts_dir
+        result["artifacts"] = sorted(os.listdir(artifacts_dir)) if os.path.isdir(artifacts_dir) else []
+        result["duration_s"] = round(time.time() - started, 2)
+        result.update(budget.summary())
+        with open(os.path.join(job_dir, RESULT_FILE), "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    return result
+
+async def spawn_job(job: Dict[str, Any], job_dir: str) -> Dict[str, Any]:
+    """
+    Runs a job in a child process so that its settings overrides, artifacts directory,
+    checkpoints and logs are isolated from other concurrently running jobs.
+    Overrides in `job["settings"]` are passed as environment variables (e.g. {"trainer_model_name": ...});
+    only OVERRIDABLE_SETTINGS are accepted.
+    """
+    try:
+        overrides = check_overrides(job.get("settings"))
+    except ValueError as e:
+        logger.error(f"Job {job['id']} rejected: {e}")
+        return {"id": job["id"], "status": "failed", "error": str(e)}
+
+    job_dir = os.path.abspath(job_dir)
+    os.makedirs(job_dir, exist_ok=True)
+    with open(os.path.join(job_dir, JOB_FILE), "w", encoding="utf-8") as f:
+        json.dump(job, f, ensure_ascii=False, indent=2)
+    # A stale result from a previous attempt must not be mistaken for this one
+    if os.path.exists(os.path.join(job_dir, RESULT_FILE)):
+        os.remove(os.path.join(job_dir, RESULT_FILE))
+
+    src_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = os.environ.copy()
+    # pydantic-settings parses dict and list settings from JSON, so they must not be sent as Python reprs
+    env.update({key.upper(): value if isinstance(value, str) else json.dumps(value) for key, value in overrides.items()})
+    env["LOCAL_ARTIFACTS_DIR"] = os.path.join(job_dir, "artifacts")
+    env["CHECKPOINT_DB_PATH"] = os.path.join(job_dir, "checkpoints.sqlite")
+    env["LOG_FILE_PATH"] = os.path.join(job_dir, "job.log")
+    env["PYTHONPATH"] = os.pathsep.join(p for p in [src_dir, env.get("PYTHONPATH")] if p)
+
+    with open(os.path.join(job_dir, "stderr.log"), "ab") as stderr:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "ds_agent.core.runner", job_dir,
+            env=env, stdout=asyncio.subprocess.DEVNULL, stderr=stderr
+        )
+        try:
+            return_code = await process.wait()
+        except asyncio.CancelledError:
+            # Give the child the chance to checkpoint and keep its sandbox for resuming
+            if process.returncode is None:
+                process.send_signal(signal.SIGINT)
+                await process.wait()
+            raise
+
+    result = load_result(job_dir)
+    if result is None:
+        result = {"id": job["id"], "status": "failed", "error": f"Job process exited with code {return_code}"}
+    return result
+
+if __name__ == "__main__":
+    setup_logger()
+    asyncio.run(run_job(sys.argv[1]))
@@ -0,0 +1,222 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+
+from ds_agent.config import settings
+from ds_agent.utils.helpers import create_sandbox, reattach_sandbox
+from ds_agent.utils.logger import logger
+
+if TYPE_CHECKING:
+    from e2b_code_interpreter import AsyncSandbox
+
+@dataclass
+class SandboxLease:
+    session_id: str
+    sandbox_id: Optional[str]
+    sandbox: Any = None
+    busy: int = 0
+    last_active: float = field(default_factory=time.monotonic)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def live(self) -> bool:
+        return self.sandbox is not None
+
+class SandboxManager:
+    """
+    Owns the sandboxes of all chat sessions in this process.
+
+    Sessions borrow their sandbox with `acquire`/`release` around each run. A background
+    task pauses sandboxes idle for `idle_seconds` (memory and files are kept by E2B) and
+    kills paused ones idle for `reap_seconds`. `acquire` resumes a paused sandbox
+    transparently. At most `max_live` sandboxes run at once; the least recently used idle
+    one is paused to make room, and callers wait if every live sandbox is busy.
+    """
+    def __init__(self,
+                 idle_seconds: Optional[int] = None,
+                 reap_seconds: Optional[int] = None,
+                 max_live: Optional[int] = None,
+                 interval: Optional[int] = None):
+        idle_seconds = settings.sandbox_idle_seconds if idle_seconds is None else idle_seconds
+        reap_seconds = settings.sandbox_reap_seconds if reap_seconds is None else reap_seconds
+        max_live = settings.sandbox_max_live if max_live is None else max_live
+        interval = settings.sandbox_reap_interval if interval is None else interval
+        self.idle_seconds = idle_seconds
+        self.reap_seconds = reap_seconds
+        self.max_live = max_live
+        self.interval = interval
+        self.leases: Dict[str, SandboxLease] = {}
+        self._changed = asyncio.Condition()
+        self._starting = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def live_count(self) -> int:
+        return self._starting + sum(1 for lease in self.leases.values() if lease.live)
+
+    async def _start(self, factory) -> Tuple["AsyncSandbox", bool]:
+        """
+        Runs a sandbox factory in a reserved live slot. Network calls happen outside
+        the lock so that sessions do not wait for each other's sandbox start-up.
+        """
+        async with self._changed:
+            evicted = await self._make_room()
+            self._starting += 1
+        try:
+            try:
+                for lease, sandbox in evicted:
+                    await self._pause(lease, sandbox)
+            finally:
+                for lease, _ in evicted:
+                    lease.lock.release()
+            return await factory()
+        finally:
+            async with self._changed:
+                self._starting -= 1
+                self._changed.notify_all()
+
+    async def open(self, session_id: str, sandbox_id: Optional[str] = None) -> Tuple["AsyncSandbox", bool]:
+        """
+        Creates (or reattaches to) the sandbox of a session.
+
+        Returns:
+            (sandbox, reattached) as in `reattach_sandbox`.
+        """
+        async def factory():
+            if sandbox_id:
+                return await reattach_sandbox(sandbox_id)
+            return await create_sandbox(), False
+
+        sandbox, reattached = await self._start(factory)
+        self.leases[session_id] = SandboxLease(session_id, sandbox.sandbox_id, sandbox)
+        return sandbox, reattached
+
+    async def acquire(self, session_id: str) -> Tuple["AsyncSandbox", bool]:
+        """
+        Marks the session's sandbox busy, resuming it first if it was hibernated.
+
+        Returns:
+            (sandbox, kept) where `kept` is False if the sandbox had to be replaced
+            and its kernel state is lost.
+        """
+        lease = self.leases[session_id]
+        # Busy leases are left alone by the reaper, including while they resume
+        lease.busy += 1
+        lease.last_active = time.monotonic()
+        kept = True
+        try:
+            async with lease.lock:
+                if not lease.live:
+                    lease.sandbox, kept = await self._start(lambda: reattach_sandbox(lease.sandbox_id))
+                    lease.sandbox_id = lease.sandbox.sandbox_id
+                    logger.info(f"Session {session_id}: sandbox {'resumed' if kept else 'replaced'} ({lease.sandbox_id})")
+        except BaseException:
+            lease.busy -= 1
+            raise
+        return lease.sandbox, kept
+
+    async def release(self, session_id: str) -> None:
+        async with self._changed:
+            lease = self.leases.get(session_id)
+            if lease:
+                lease.busy = max(0, lease.busy - 1)
+                lease.last_active = time.monotonic()
+            self._changed.notify_all()
+
+    async def close(self, session_id: str) -> None:
+        """
+        Kills the session's sandbox, paused or not, and forgets the session.
+        """
+        async with self._changed:
+            lease = self.leases.pop(session_id, None)
+            self._changed.notify_all()
+        if lease:
+            await self._kill(lease)
+
+    async def _make_room(self) -> List[Tuple[SandboxLease, "AsyncSandbox"]]:
+        """
+        Detaches least recently used idle sandboxes until a new one fits under `max_live`.
+        Must be called with the condition held. Returns the detached (lease, sandbox) pairs with
+        their lease locks held: the caller pauses them after releasing the condition, then
+        releases the locks, so their sessions wait for the pause before resuming.
+        """
+        evicted = []
+        while self.max_live and self.live_count >= self.max_live:
+            idle = [l for l in self.leases.values() if l.live and not l.busy and not l.lock.locked()]
+            if idle:
+                lease = min(idle, key=lambda l: l.last_active)
+                # The lock is free, so this does not wait
+                await lease.lock.acquire()
+                evicted.append((lease, lease.sandbox))
+                lease.sandbox = None
+            else:
+                logger.warning(f"All {self.max_live} live sandboxes are busy; waiting for one to be released.")
+                await self._changed.wait()
+        return evicted
+
+    async def _hibernate(self, lease: SandboxLease) -> None:
+        sandbox, lease.sandbox = lease.sandbox, None
+        await self._pause(lease, sandbox)
+
+    async def _pause(self, lease: SandboxLease, sandbox: "AsyncSandbox") -> None:
+        try:
+            await sandbox.pause()
+            logger.info(f"Session {lease.session_id}: sandbox {lease.sandbox_id} paused after inactivity")
+        except Exception as e:
+            # Without pause support the sandbox is dropped; the next run gets a new one
+            logger.warning(f"Could not pause sandbox {lease.sandbox_id} ({e}); killing it instead.")
+            try:
+                await sandbox.kill()
+            except Exception:
+                pass
+            lease.sandbox_id = None
+
+    async def _kill(self, lease: SandboxLease) -> None:
+        try:
+            if lease.live:
+                await lease.sandbox.kill()
+            elif lease.sandbox_id:
+                from e2b_code_interpreter import AsyncSandbox
+                await AsyncSandbox.kill(lease.sandbox_id, api_key=settings.e2b_api_key.get_secret_value())
+            logger.info(f"Session {lease.session_id}: sandbox {lease.sandbox_id} killed")
+        except Exception as e:
+            logger.warning(f"Failed to kill sandbox {lease.sandbox_id}: {e}")
+        lease.sandbox, lease.sandbox_id = None, None
+
+    async def reap(self) -> None:
+        """
+        One pass: pause idle live sandboxes, kill long-idle paused ones.
+        Each lease is handled under its own lock, so a session that comes back
+        meanwhile waits for the pause to finish and then resumes the sandbox.
+        """
+        now = time.monotonic()
+        for lease in list(self.leases.values()):
+            if lease.busy or lease.lock.locked():
+                continue
+            idle = now - lease.last_active
+            async with lease.lock:
+                if lease.busy:
+                    continue
+                if lease.live and self.idle_seconds and idle > self.idle_seconds:
+                    await self._hibernate(lease)
+                elif not lease.live and lease.sandbox_id and self.reap_seconds and idle > self.reap_seconds:
+                    await self._kill(lease)
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.error(f"Sandbox reaper pass failed: {e}", exc_info=True)
+
+    def start(self) -> None:
+        """
+        Starts the background reaper (needs a running event loop); a no-op if it already runs.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
@@ -13,6 +13,11 @@ class AgentState(TypedDict):
         cwd: str (Current working directory)
         next: str (Next agent to run)
         node_visits: Dict[str, int] (To track recursion limit per node)
+        sandbox_id: str (E2B sandbox paired with this checkpoint thread)
+        sampling: Dict[str, Dict] (Active sampling policy per uploaded dataset, keyed by file name)
+        cell_timeouts: Dict[str, int] (Cells interrupted at their deadline, per node; drives adaptive deadlines)
+        installed_packages: Dict[str, str] (Packages the session installed through run_shell, e.g. "pip:xgboost" -> version)
+        schemas: Dict[str, Dict[str, str]] (Column -> dtype of each ingested upload, keyed by file name; drives snippet retrieval)
     """
     # Use add_messages to append new messages to the history
     messages: Annotated[List[BaseMessage], add_messages]
@@ -24,4 +29,15 @@ class AgentState(TypedDict):
     cwd: str
     next: str
     supervisor_instructions: str
-    node_visits: Dict[str, int]
\ No newline at end of file
+    node_visits: Dict[str, int]
+    sandbox_id: str
+
+    # Merged per upload, so a new dataset does not drop the policy of an earlier one
+    sampling: Annotated[Dict[str, Dict[str, Any]], operator.or_]
+    cell_timeouts: Dict[str, int]
+
+    # Merged per tool call, so the session's full install record survives
+    installed_packages: Annotated[Dict[str, str], operator.or_]
+
+    # Merged per upload, like sampling
+    schemas: Annotated[Dict[str, Dict[str, str]], operator.or_]
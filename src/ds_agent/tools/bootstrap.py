@@ -0,0 +1,64 @@
+import functools
+import json
+import os
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from ds_agent.config import settings
+from ds_agent.utils.logger import logger
+from ds_agent.utils.tracing import span
+
+if TYPE_CHECKING:
+    from e2b_code_interpreter import AsyncSandbox
+
+BOOTSTRAP_NAME = "kernel_bootstrap.py"
+
+@functools.lru_cache(maxsize=4)
+def bootstrap_source(path: str = "") -> str:
+    """
+    The warm-up code: `path` (KERNEL_BOOTSTRAP_FILE) if set, otherwise the bundled kernel_bootstrap.py.
+    """
+    path = path or os.path.join(os.path.dirname(__file__), BOOTSTRAP_NAME)
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+async def warm_kernel(sandbox: "AsyncSandbox") -> Optional[Dict[str, Any]]:
+    """
+    Runs the bootstrap in the sandbox's kernel: imports the data-science stack and sets
+    plotting and display defaults, so that the first agent cell starts on a warm kernel.
+
+    Returns:
+        The warm-up report (`seconds`, and for the bundled bootstrap `imports` and `missing`),
+        or None if it is disabled or failed (cells then import the stack themselves).
+    """
+    if not settings.kernel_bootstrap_enabled:
+        return None
+
+    started = time.perf_counter()
+    try:
+        with span("kernel bootstrap", "sandbox") as s:
+            execution = await sandbox.run_code(bootstrap_source(settings.kernel_bootstrap_file), timeout=settings.kernel_bootstrap_timeout)
+            if execution.error:
+                raise RuntimeError(f"{execution.error.name}: {execution.error.value}")
+            report: Dict[str, Any] = {}
+            lines = "".join(execution.logs.stdout).strip().splitlines()
+            if lines:
+                try:
+                    report = json.loads(lines[-1])
+                except ValueError:
+                    # A custom bootstrap need not print a report
+                    pass
+            report["kernel_seconds"] = report.pop("seconds", None)
+            report["seconds"] = round(time.perf_counter() - started, 2)
+            s.set(seconds=report["seconds"], missing=report.get("missing"))
+    except Exception as e:
+        logger.warning(f"Kernel warm-up failed; the first cells will import the stack themselves: {e}")
+        return None
+
+    slowest = sorted(report.get("imports", {}).items(), key=lambda item: -item[1])[:3]
+    logger.info(
+        f"Kernel warmed up in {report['seconds']}s"
+        + (f" (slowest imports: {', '.join(f'{name} {seconds}s' for name, seconds in slowest)})" if slowest else "")
+        + (f"; not installed: {', '.join(report['missing'])}" if report.get("missing") else "")
+    )
+    return report
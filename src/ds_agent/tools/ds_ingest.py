@@ -0,0 +1,157 @@
+"""
+Dataset ingestion helpers that run INSIDE the sandbox. The application copies this file
+to the sandbox working directory and never imports it itself.
+
+Conversion (a separate process, so its peak memory is released before the agents start):
+
+    python ds_ingest.py data.csv [--no-downcast] [--categories] [--compression zstd] [--sample-rows N --sample-threshold-mb MB]
+
+Loading (in the Jupyter kernel):
+
+    from ds_ingest import load_dataset
+    df_raw = load_dataset("data.parquet", columns=["a", "b"])
+    df_sample = load_dataset("data.parquet", sample=True)   # data.sample.parquet, for large tables
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+
+EXCEL_EXTENSIONS = (".xlsx", ".xls")
+
+# With categories enabled, string columns with at most this share of distinct values are stored as categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.05
+
+def _read_source(path):
+    import pandas as pd
+
+    if path.lower().endswith(EXCEL_EXTENSIONS):
+        return pd.read_excel(path)
+
+    delimiter = "\t" if path.lower().endswith(".tsv") else ","
+    try:
+        import pyarrow.csv as pv
+        # Multi-threaded parser with type inference (numbers, booleans, ISO timestamps)
+        table = pv.read_csv(path, parse_options=pv.ParseOptions(delimiter=delimiter))
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+    except Exception as e:
+        print(f"pyarrow CSV reader failed ({e}); falling back to pandas", file=sys.stderr)
+        return pd.read_csv(path, sep=delimiter, low_memory=False)
+
+def downcast(df, categories=False):
+    """
+    Shrinks dtypes in place where later code keeps working unchanged: floats to float32 where every
+    value survives the round trip. Integers stay int64, since narrow integers silently wrap around
+    in arithmetic. With `categories`, very repetitive strings become categoricals (new labels must then
+    be added with `cat.add_categories` before assigning them); the converted columns are returned.
+    """
+    import pandas as pd
+
+    converted = []
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_float_dtype(series) and series.dtype != "float32":
+            narrow = series.astype("float32")
+            if ((narrow.astype(series.dtype) == series) | series.isna()).all():
+                df[column] = narrow
+        elif categories and (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)) and len(series):
+            unique = series.nunique(dropna=True)
+            if unique and unique / len(series) <= CATEGORY_MAX_UNIQUE_RATIO:
+                df[column] = series.astype("category")
+                converted.append(str(column))
+    return converted
+
+def sample_path(path):
+    return os.path.splitext(path)[0] + ".sample.parquet"
+
+def make_sample(df, rows, stratify=None, seed=42):
+    """
+    Draws about `rows` rows, either uniformly or stratified on a column (each class keeps its share).
+    Returns the sample in the original row order and a description of the method.
+    """
+    if stratify and stratify in df.columns:
+        fraction = rows / len(df)
+        sample = df.groupby(stratify, dropna=False, observed=True).sample(frac=fraction, random_state=seed)
+        method = f"stratified (by '{stratify}')"
+    else:
+        sample = df.sample(n=rows, random_state=seed)
+        method = "uniform random"
+    return sample.sort_index(), method
+
+def convert(source, target=None, downcast_types=True, compression="zstd",
+            sample_rows=0, sample_threshold_mb=0, stratify=None, seed=42, categories=False):
+    """
+    Converts a CSV/TSV/Excel file into a typed, compressed Parquet file and returns a summary.
+    Tables larger than `sample_threshold_mb` in memory (and longer than `sample_rows`) also
+    get a sample file next to the Parquet file.
+    """
+    import pandas as pd
+
+    started = time.perf_counter()
+    target = target or os.path.splitext(source)[0] + ".parquet"
+    df = _read_source(source)
+    categorical = downcast(df, categories) if downcast_types else []
+    df.to_parquet(target, engine="pyarrow", compression=compression, index=False)
+    memory_mb = df.memory_usage(deep=True).sum() / 2**20
+
+    sample = None
+    if sample_rows and len(df) > sample_rows and memory_mb > sample_threshold_mb:
+        df_sample, method = make_sample(df, sample_rows, stratify, seed)
+        df_sample.to_parquet(sample_path(target), engine="pyarrow", compression=compression, index=False)
+        sample = {"parquet": os.path.basename(sample_path(target)), "rows": len(df_sample), "method": method, "seed": seed}
+
+    return {
+        "source": os.path.basename(source),
+        "parquet": os.path.basename(target),
+        "rows": len(df),
+        "columns": len(df.columns),
+        "source_mb": round(os.path.getsize(source) / 2**20, 2),
+        "parquet_mb": round(os.path.getsize(target) / 2**20, 2),
+        "memory_mb": round(memory_mb, 2),
+        "dtypes": {str(dtype): int(count) for dtype, count in df.dtypes.astype(str).value_counts().items()},
+        "schema": {str(column): str(dtype) for column, dtype in df.dtypes.items()},
+        "categorical": categorical,
+        "seconds": round(time.perf_counter() - started, 2),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "sample": sample,
+        "pandas": pd.__version__,
+    }
+
+def load_dataset(path, columns=None, sample=False):
+    """
+    Loads a Parquet dataset through a memory map; only the requested columns are read.
+    With `sample=True` the sample drawn at ingestion is loaded instead (if the table has one).
+    """
+    import pyarrow.parquet as pq
+
+    if sample and os.path.exists(sample_path(path)):
+        path = sample_path(path)
+    table = pq.read_table(path, columns=columns, memory_map=True)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a tabular file to typed Parquet.")
+    parser.add_argument("source")
+    parser.add_argument("--target", default=None)
+    parser.add_argument("--no-downcast", action="store_true")
+    parser.add_argument("--categories", action="store_true")
+    parser.add_argument("--compression", default="zstd")
+    parser.add_argument("--sample-rows", type=int, default=0)
+    parser.add_argument("--sample-threshold-mb", type=float, default=0)
+    parser.add_argument("--stratify", default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    summary = convert(args.source, args.target, downcast_types=not args.no_downcast, compression=args.compression,
+                      sample_rows=args.sample_rows, sample_threshold_mb=args.sample_threshold_mb,
+                      stratify=args.stratify, seed=args.seed, categories=args.categories)
+    # The summary is the last stdout line; the caller parses it
+    print(json.dumps(summary))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Hyperparameter search that runs INSIDE the sandbox kernel. The application copies this file
+to the sandbox working directory and never imports it itself.
+
+    from ds_search import run_search
+    search_results, best_params, best_model = run_search(
+        RandomForestClassifier(random_state=42),
+        {"n_estimators": [100, 300, 600], "max_depth": {"low": 3, "high": 20, "type": "int"}},
+        X_train, y_train, scoring="f1", cv=5, n_trials=30)
+
+Every (configuration, fold) fit is a separate task spread over all cores. With successive
+halving, all configurations start on a small share of the rows and only the best 1/factor
+advance to the next rung, which gets `factor` times more rows; the last rung uses all rows.
+Each finished configuration is printed as it completes; the last stdout line is a JSON summary.
+"""
+import itertools
+import json
+import math
+import random
+import time
+
+RESULT_MARKER = "__ds_search_result__"
+
+def _draw(spec, rng):
+    """A value from a search-space entry: a list of choices, a {low, high[, log][, type]} range, or a fixed value."""
+    if isinstance(spec, (list, tuple)):
+        return rng.choice(list(spec))
+    if isinstance(spec, dict) and "low" in spec and "high" in spec:
+        low, high = spec["low"], spec["high"]
+        integer = spec.get("type") == "int" or (isinstance(low, int) and isinstance(high, int) and spec.get("type") != "float")
+        value = math.exp(rng.uniform(math.log(low), math.log(high))) if spec.get("log") else rng.uniform(low, high)
+        return int(round(value)) if integer else value
+    return spec
+
+def sample_configurations(space, n_trials, seed=42):
+    """
+    The full grid if every entry is a list and the grid has at most `n_trials` points,
+    otherwise `n_trials` distinct random draws.
+    """
+    rng = random.Random(seed)
+    if all(isinstance(v, (list, tuple)) for v in space.values()):
+        size = math.prod(len(v) for v in space.values())
+        if size <= n_trials:
+            return [dict(zip(space, values)) for values in itertools.product(*space.values())]
+    configurations, seen = [], set()
+    for _ in range(n_trials * 20):
+        if len(configurations) == n_trials:
+            break
+        configuration = {name: _draw(spec, rng) for name, spec in space.items()}
+        key = json.dumps(configuration, sort_keys=True, default=str)
+        if key not in seen:
+            seen.add(key)
+            configurations.append(configuration)
+    return configurations
+
+def _take(data, index):
+    return data.iloc[index] if hasattr(data, "iloc") else data[index]
+
+def _fit_and_score(trial, fold, estimator, params, X, y, train, test, scorer):
+    from sklearn.base import clone
+
+    started = time.perf_counter()
+    try:
+        model = clone(estimator).set_params(**params)
+        model.fit(_take(X, train), _take(y, train))
+        return trial, fold, float(scorer(model, _take(X, test), _take(y, test))), time.perf_counter() - started, None
+    except Exception as e:
+        return trial, fold, float("nan"), time.perf_counter() - started, f"{type(e).__name__}: {e}"
+
+def run_search(estimator, space, X, y, scoring=None, cv=5, n_trials=30, halving=True, factor=3,
+               n_jobs=-1, seed=42, max_seconds=None, min_rows=100):
+    """
+    Returns:
+        (results DataFrame, one row per configuration and rung; best params; best model refit on all of X, y)
+    """
+    import numpy as np
+    import pandas as pd
+    from joblib import Parallel, delayed, effective_n_jobs
+    from sklearn.base import clone, is_classifier
+    from sklearn.metrics import check_scoring
+    from sklearn.model_selection import check_cv
+
+    started = time.perf_counter()
+    final = clone(estimator)
+    estimator = clone(estimator)
+    if estimator.get_params().get("n_jobs") not in (None, 1):
+        # Parallelism is across fits; threads inside each fit would oversubscribe the cores
+        estimator.set_params(n_jobs=1)
+    scorer = check_scoring(estimator, scoring=scoring)
+    configurations = sample_configurations(space, n_trials, seed)
+    n_rows = len(X)
+    workers = effective_n_jobs(n_jobs)
+
+    rungs = 1
+    if halving and len(configurations) > 1:
+        rungs = max(1, int(math.log(len(configurations), factor)))
+        # Fewer rungs if the first would get too few rows to rank anything
+        while rungs > 1 and n_rows // factor ** (rungs - 1) < min_rows:
+            rungs -= 1
+
+    order = np.random.RandomState(seed).permutation(n_rows)
+    alive = list(range(len(configurations)))
+    rows, errors = [], {}
+    fits = 0
+    stopped_early = False
+    completed_rung = None
+    print(f"Search: {len(configurations)} configurations, {rungs} rung(s), {workers} parallel workers, {n_rows} rows", flush=True)
+
+    for rung in range(rungs):
+        size = n_rows if rung == rungs - 1 else max(min_rows, n_rows // factor ** (rungs - 1 - rung))
+        subset = np.sort(order[:size])
+        X_rung, y_rung = _take(X, subset), _take(y, subset)
+        splits = list(check_cv(cv, y_rung, classifier=is_classifier(estimator)).split(X_rung, y_rung))
+        scores = {trial: [] for trial in alive}
+        seconds = {trial: 0.0 for trial in alive}
+
+        tasks = (
+            delayed(_fit_and_score)(trial, fold, estimator, configurations[trial], X_rung, y_rung, train, test, scorer)
+            for trial in alive for fold, (train, test) in enumerate(splits)
+        )
+        for trial, fold, score, fit_seconds, error in Parallel(n_jobs=n_jobs, return_as="generator_unordered")(tasks):
+            fits += 1
+            scores[trial].append(score)
+            seconds[trial] += fit_seconds
+            if error and trial not in errors:
+                errors[trial] = error
+            if len(scores[trial]) == len(splits):
+                values = np.array(scores[trial])
+                row = {"rung": rung + 1, "rows": size, "trial": trial, "score": float(np.nanmean(values)) if not np.isnan(values).all() else float("nan"),
+                       "std": float(np.nanstd(values)) if not np.isnan(values).all() else float("nan"), "fit_seconds": round(seconds[trial], 2),
+                       **{f"param_{name}": value for name, value in configurations[trial].items()}}
+                rows.append(row)
+                status = f"failed ({errors[trial]})" if trial in errors else f"{row['score']:.4f} ± {row['std']:.4f}"
+                print(f"[rung {rung + 1}/{rungs}, {size} rows] trial {trial}: {status} {configurations[trial]}", flush=True)
+            if max_seconds and time.perf_counter() - started > max_seconds:
+                stopped_early = True
+                break
+
+        finished = [r for r in rows if r["rung"] == rung + 1 and not math.isnan(r["score"])]
+        if finished:
+            completed_rung = rung + 1
+        if not finished:
+            break
+        if stopped_early:
+            print(f"Time budget of {max_seconds}s reached; stopping the search after rung {rung + 1}.", flush=True)
+            break
+        if rung < rungs - 1:
+            finished.sort(key=lambda r: -r["score"])
+            alive = [r["trial"] for r in finished[:max(1, math.ceil(len(alive) / factor))]]
+
+    if completed_rung is None:
+        raise RuntimeError(f"Every configuration failed, e.g. {next(iter(errors.values()), 'unknown error')}")
+
+    results = pd.DataFrame(rows).sort_values(["rung", "score"], ascending=[False, False]).reset_index(drop=True)
+    best = results[results["rung"] == completed_rung].iloc[0]
+    best_params = configurations[int(best["trial"])]
+    best_model = clone(final).set_params(**best_params).fit(X, y)
+
+    summary = {
+        "best_params": best_params,
+        "best_score": round(float(best["score"]), 6),
+        "best_std": round(float(best["std"]), 6),
+        "scoring": scoring or "default",
+        "estimator": type(final).__name__,
+        "configurations": len(configurations),
+        "fits": fits,
+        "halving": halving,
+        "rungs": rungs,
+        "completed_rung": completed_rung,
+        "rows": n_rows,
+        "workers": workers,
+        "failed": len(errors),
+        "stopped_early": stopped_early,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    print(RESULT_MARKER + json.dumps(summary, default=str), flush=True)
+    return results, best_params, best_model
@@ -1,15 +1,92 @@
+import asyncio
 import base64
 import hashlib
+import json
 import os
+import shlex
+import time
 import uuid
-from typing import List, Optional, Dict, Any, Union, Tuple
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, List, Optional, Dict, Any, Union, Tuple
 from pydantic import BaseModel, Field
 from langchain_core.tools import tool, StructuredTool
-from e2b_code_interpreter import AsyncSandbox
 
 from ds_agent.config import settings
+from ds_agent.core.budget import RunBudget, BudgetExceeded
+from ds_agent.utils.artifacts import ArtifactStore
+from ds_agent.utils.tracing import span
+from ds_agent.tools.installs import InstallManager, parse_install
+from ds_agent.tools import search
+
+if TYPE_CHECKING:
+    from e2b_code_interpreter import AsyncSandbox
 from ds_agent.utils.logger import logger
 
+# Runs in the kernel after each cell: CPU time since the previous probe, peak RSS since the
+# previous probe (VmHWM, reset through /proc/self/clear_refs) and current RSS, as one JSON line.
+# The CPU mark lives in the kernel, so a new or restarted kernel has none: the probe sets it
+# and reports no CPU time for that cell rather than a delta against a lost baseline.
+TELEMETRY_PROBE = """
+def __ds_probe():
+    import json, os
+    memory = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                memory[key] = int(value.split()[0]) / 1024
+    times = os.times()
+    cpu = times.user + times.system
+    previous = globals().get("__ds_cpu_mark")
+    globals()["__ds_cpu_mark"] = cpu
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+    return json.dumps({
+        "cpu_seconds": None if previous is None else round(cpu - previous, 3),
+        "peak_rss_mb": round(memory.get("VmHWM", 0), 1),
+        "rss_mb": round(memory.get("VmRSS", 0), 1),
+    })
+print(__ds_probe())
+"""
+
+# Jupyter server's kernels API inside the sandbox (behind the code interpreter's port 49999)
+JUPYTER_KERNELS_API = "http://localhost:8888/api/kernels"
+
+# Interrupts the busy kernels through the Jupyter API, falling back to SIGINT to the kernel's own
+# process (found by its connection file) if the API refuses; prints the ids of the interrupted kernels.
+KERNEL_INTERRUPT = """
+import json, os, signal, sys, urllib.request
+api = sys.argv[1]
+busy = [k["id"] for k in json.load(urllib.request.urlopen(api, timeout=5)) if k.get("execution_state") == "busy"]
+interrupted = []
+for kernel_id in busy:
+    try:
+        urllib.request.urlopen(urllib.request.Request(f"{api}/{kernel_id}/interrupt", data=b"", method="POST"), timeout=5)
+        interrupted.append(kernel_id)
+        continue
+    except OSError:
+        pass
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                if f"kernel-{kernel_id}.json".encode() not in f.read():
+                    continue
+            os.kill(int(pid), signal.SIGINT)
+            interrupted.append(kernel_id)
+        except OSError:
+            pass
+print(json.dumps(interrupted))
+"""
+
+# How long an interrupted cell gets to wind down and return its partial output
+INTERRUPT_GRACE_SECONDS = 15
+
+# Exit status of coreutils `timeout` when the command ran out of time
+SHELL_TIMEOUT_EXIT_CODE = 124
+
 class RunPythonInput(BaseModel):
     code: str = Field(description="The Python code to execute.")
 
@@ -19,19 +96,157 @@ class RunShellInput(BaseModel):
 class CreateMarkdownInput(BaseModel):
     content: str = Field(description="The markdown content to add to the notebook. Use this for titles, explanations, and summarizing findings in the generated notebook.")
 
+class HyperparameterSearchInput(BaseModel):
+    estimator: str = Field(description="Python expression creating the scikit-learn compatible estimator or pipeline, e.g. \"RandomForestClassifier(random_state=42)\". Its class must already be imported in the kernel.")
+    search_space: Dict[str, Any] = Field(description="Parameter name -> list of candidate values, or a range {\"low\": 0.001, \"high\": 1.0, \"log\": true} (add \"type\": \"int\" for integers). Use `step__param` names for pipelines.")
+    X: str = Field(default="X_train", description="Name of the kernel variable holding the training features.")
+    y: str = Field(default="y_train", description="Name of the kernel variable holding the training target.")
+    scoring: Optional[str] = Field(default=None, description="scikit-learn scoring name (e.g. 'f1', 'roc_auc', 'neg_root_mean_squared_error'); the estimator's default score if omitted.")
+    cv: int = Field(default=5, description="Number of cross-validation folds.")
+    n_trials: int = Field(default=30, description="Number of configurations to try (the whole grid if it is smaller).")
+    halving: bool = Field(default=True, description="Successive halving: start all configurations on a subset of rows and give more rows only to the best ones.")
+
 class DownloadFileInput(BaseModel):
     remote_path: str = Field(description="The absolute path to the file in the sandbox (e.g., '/home/user/cleaned_data.csv').")
     local_filename: Optional[str] = Field(description="The name to save the file as locally. If not provided, the remote filename will be used.", default=None)
 
 class E2BTools:
-    def __init__(self, sandbox: AsyncSandbox, update_state_callback: Optional[callable] = None):
+    def __init__(self, sandbox: "AsyncSandbox", update_state_callback: Optional[callable] = None, budget: Optional[RunBudget] = None,
+                 artifacts: Optional[ArtifactStore] = None, cell_timeout: Optional[float] = None):
         """
         Args:
             sandbox: The active E2B AsyncSandbox instance.
             update_state_callback: A function to call to update the global/agent state.
+            budget: Optional run budget; executions are aborted when it is cancelled or runs out.
+            artifacts: The session's artifact store (defaults to the shared artifacts directory).
+            cell_timeout: Deadline of a `run_python` cell in seconds (0 disables, None uses the settings).
         """
         self.sandbox = sandbox
         self.update_state_callback = update_state_callback
+        self.budget = budget
+        self.artifacts = artifacts or ArtifactStore()
+        self.cell_timeout = settings.cell_timeout_seconds if cell_timeout is None else cell_timeout
+        self.timeouts = 0
+        # Packages installed or found present by `run_shell` installs (e.g. "pip:xgboost" -> "2.0.3")
+        self.installed: Dict[str, str] = {}
+
+    async def interrupt_kernel(self) -> bool:
+        """
+        Interrupts the sandbox's busy Jupyter kernel, stopping the running cell while keeping
+        the kernel (and its variables) alive. Returns whether a kernel was interrupted.
+        """
+        command = f"python -c {shlex.quote(KERNEL_INTERRUPT)} {JUPYTER_KERNELS_API}"
+        try:
+            result = await self.sandbox.commands.run(command, timeout=10)
+            interrupted = json.loads(result.stdout.strip().splitlines()[-1])
+        except Exception as e:
+            logger.warning(f"Failed to interrupt sandbox kernel: {e}")
+            return False
+        if not interrupted:
+            logger.warning("No busy kernel to interrupt in the sandbox.")
+            return False
+        logger.info(f"Interrupted sandbox kernel {', '.join(interrupted)}.")
+        return True
+
+    async def _list_files(self, path: str = "."):
+        with span("sandbox files.list", "sandbox", path=path) as s:
+            entries = await self.sandbox.files.list(path)
+            s.set(files=len(entries))
+            return entries
+
+    async def _read_file(self, path: str) -> bytes:
+        with span("sandbox files.read", "sandbox", path=path) as s:
+            content = await self.sandbox.files.read(path, format="bytes")
+            s.set(bytes=len(content))
+            return content
+
+    async def _execute(self, operation):
+        """
+        Awaits a sandbox operation under the run budget and accounts its wall time.
+        """
+        if self.budget is None:
+            return await operation
+        started = time.monotonic()
+        try:
+            return await self.budget.guard(operation)
+        finally:
+            self.budget.add_sandbox_time(time.monotonic() - started)
+
+    async def _run_cell(self, code: str) -> Tuple[Any, bool]:
+        """
+        Runs a cell under its deadline. A cell past the deadline is interrupted, so the kernel and
+        its variables survive, and gets a grace period to return its partial output. If the kernel
+        does not respond, the output streamed so far stands in for the execution.
+
+        Returns:
+            (execution, timed out)
+        """
+        if not self.cell_timeout:
+            return await self.sandbox.run_code(code, timeout=0), False
+
+        stdout: List[str] = []
+        stderr: List[str] = []
+        task = asyncio.ensure_future(self.sandbox.run_code(
+            code,
+            on_stdout=lambda message: stdout.append(getattr(message, "line", str(message))),
+            on_stderr=lambda message: stderr.append(getattr(message, "line", str(message))),
+            # The SDK must not give up before the interrupt had its chance
+            timeout=self.cell_timeout + 2 * INTERRUPT_GRACE_SECONDS,
+        ))
+        try:
+            done, _ = await asyncio.wait({task}, timeout=self.cell_timeout)
+            if task in done:
+                return task.result(), False
+
+            logger.warning(f"Cell exceeded its {self.cell_timeout}s deadline; interrupting the kernel.")
+            self.timeouts += 1
+            await self.interrupt_kernel()
+            done, _ = await asyncio.wait({task}, timeout=INTERRUPT_GRACE_SECONDS)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+
+        if task in done and not task.exception():
+            return task.result(), True
+        task.cancel()
+        logger.warning("Kernel did not respond to the interrupt in time; returning the streamed output.")
+        return SimpleNamespace(
+            logs=SimpleNamespace(stdout=stdout, stderr=stderr),
+            results=[],
+            error=SimpleNamespace(name="TimeoutError", value=f"Cell exceeded its {self.cell_timeout}s deadline", traceback=""),
+        ), True
+
+    async def _probe_kernel(self) -> Dict[str, Any]:
+        """
+        Reads the kernel's resource usage since the previous probe (empty if the probe fails).
+        """
+        try:
+            execution = await self._execute(self.sandbox.run_code(TELEMETRY_PROBE))
+            return json.loads(execution.logs.stdout[-1])
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            logger.warning(f"Kernel telemetry probe failed: {e}")
+            return {}
+
+    def _telemetry_summary(self, telemetry: Dict[str, Any]) -> List[str]:
+        """
+        One line of cell telemetry for the agent, plus warnings for the configured thresholds.
+        """
+        parts = [f"wall {telemetry['wall_seconds']}s"]
+        if telemetry.get("cpu_seconds") is not None:
+            parts.append(f"CPU {telemetry['cpu_seconds']}s")
+        if telemetry.get("peak_rss_mb"):
+            parts.append(f"peak RSS {telemetry['peak_rss_mb']} MB (now {telemetry['rss_mb']} MB)")
+        lines = [f"Telemetry: {', '.join(parts)}"]
+
+        if settings.cell_warn_seconds and telemetry["wall_seconds"] > settings.cell_warn_seconds:
+            lines.append(f"Warning: this cell ran longer than {settings.cell_warn_seconds}s. Consider working on a sample "
+                         f"(`load_dataset(..., sample=True)`), vectorizing loops or reducing the search space.")
+        if settings.cell_warn_peak_rss_mb and telemetry.get("peak_rss_mb", 0) > settings.cell_warn_peak_rss_mb:
+            lines.append(f"Warning: kernel memory peaked above {settings.cell_warn_peak_rss_mb} MB. Consider downcasting dtypes, "
+                         f"loading only needed columns (`load_dataset(..., columns=[...])`) and deleting unused frames (`del df; gc.collect()`).")
+        return lines
 
     async def run_python(self, code: str) -> Union[str, Dict[str, Any]]:
         """
@@ -47,11 +262,18 @@ class E2BTools:
         try:
             # Get initial file list to track new creations or modifications
             try:
-                initial_files = {f.name: f.modified_time for f in await self.sandbox.files.list(".")}
+                initial_files = {f.name: f.modified_time for f in await self._list_files(".")}
             except:
                 initial_files = {}
 
-            execution = await self.sandbox.run_code(code)
+            with span("sandbox run_code", "sandbox", code_chars=len(code)) as s:
+                started = time.perf_counter()
+                execution, timed_out = await self._execute(self._run_cell(code))
+                telemetry = {"wall_seconds": round(time.perf_counter() - started, 3)}
+                s.set(results=len(execution.results), error=execution.error.name if execution.error else None, timed_out=timed_out)
+            # A kernel that ignored the interrupt is still busy; a probe would queue behind the cell
+            if settings.cell_telemetry and not (timed_out and getattr(execution.error, "name", None) == "TimeoutError"):
+                telemetry.update(await self._probe_kernel())
 
             # Process logs first so `logs` is defined before we append to it
             outputs, logs = self._process_logs(execution.logs)
@@ -61,18 +283,15 @@ class E2BTools:
             file_image_outputs: List[Dict[str, Any]] = []
             image_exts = ('.png', '.jpg', '.jpeg', '.svg')
             try:
-                final_files = await self.sandbox.files.list(".")
+                final_files = await self._list_files(".")
                 for f in final_files:
                     is_new = f.name not in initial_files
                     is_updated = not is_new and f.modified_time > initial_files[f.name]
                     if (is_new or is_updated) and f.name.lower().endswith(image_exts):
                         logger.info(f"Detected {'new' if is_new else 'updated'} image file: {f.name}. Downloading...")
                         # Read once — use the same bytes for both local save and cell output
-                        file_bytes = await self.sandbox.files.read(f.name, format="bytes")
-                        os.makedirs(settings.local_artifacts_dir, exist_ok=True)
-                        local_path = os.path.join(settings.local_artifacts_dir, f.name)
-                        with open(local_path, "wb") as fp:
-                            fp.write(file_bytes)
+                        file_bytes = await self._read_file(f.name)
+                        self.artifacts.save(f.name, file_bytes)
                         file_image_outputs.append({
                             "type": "image",
                             "data": file_bytes,       # raw bytes — NOT base64
@@ -106,18 +325,38 @@ class E2BTools:
                 'source': code,
                 'outputs': outputs,
                 'execution_count': None,
+                'telemetry': telemetry,
             }
 
             if self.update_state_callback:
                 self.update_state_callback(cell_data)
 
-            response_text = self._format_response(logs, [], execution.error)
+            if timed_out:
+                kernel_state = ("did not respond to the interrupt and may still be busy"
+                                if getattr(execution.error, "name", None) == "TimeoutError"
+                                else "and the variables defined before this cell are preserved")
+                response_text = (
+                    f"Status: Timeout\nOutput: The cell did not finish within {self.cell_timeout}s and was interrupted. "
+                    f"The kernel {kernel_state}. Reduce the work (sample the data, fewer iterations, "
+                    f"a smaller search space) or split it into smaller cells.\n"
+                    f"Partial output:\n{chr(10).join(logs)}"
+                )
+            else:
+                response_text = self._format_response(logs, [], execution.error)
+            if settings.cell_telemetry:
+                summary = self._telemetry_summary(telemetry)
+                if len(summary) > 1:
+                    logger.warning(f"Expensive cell: {summary[0]}")
+                response_text = "\n".join([response_text, *summary])
 
             images = [o for o in outputs if o.get('type') == 'image']
             if images:
                 return {"text": response_text, "images": images}
             return response_text
 
+        except BudgetExceeded as e:
+            await self.interrupt_kernel()
+            return f"Status: Error\nOutput: Execution cancelled - {e.reason}"
         except Exception as e:
             return f"Status: Error\nOutput: System Error - {str(e)}"
 
@@ -191,17 +430,72 @@ class E2BTools:
             return f"Status: Error\nOutput: {chr(10).join(logs)}"
         return f"Status: Success\nOutput: {chr(10).join(logs)}\nArtifacts: {artifacts}"
 
+    async def _run_command(self, command: str, timeout: int) -> Any:
+        """
+        Runs a shell command under `timeout` seconds (0 disables) and the run budget.
+        Raises like the SDK on a non-zero exit status (124 if the deadline stopped it).
+        """
+        with span("sandbox commands.run", "sandbox", command=command[:200]) as s:
+            if timeout:
+                # coreutils `timeout` stops the command itself; the SDK would only stop waiting for it
+                wrapped = f"timeout -k 10 {timeout} bash -c {shlex.quote(command)}"
+                result = await self._execute(self.sandbox.commands.run(wrapped, timeout=timeout + 30))
+            else:
+                result = await self._execute(self.sandbox.commands.run(command, timeout=0))
+            s.set(exit_code=result.exit_code)
+        return result
+
     async def run_shell(self, command: str) -> str:
+        if settings.install_manager_enabled:
+            installs = parse_install(command)
+            if installs:
+                manager = InstallManager(self)
+                try:
+                    return await manager.run(installs)
+                except BudgetExceeded as e:
+                    return f"Status: Error\nOutput: Command cancelled - {e.reason}"
+                finally:
+                    self.installed.update(manager.installed)
+
+        timeout = settings.shell_timeout_seconds
         try:
-            # Increased timeout for long-running shell commands
-            result = await self.sandbox.commands.run(command, timeout=300) 
+            result = await self._run_command(command, timeout)
             output = f"stdout: {result.stdout}\nstderr: {result.stderr}"
             if result.error:
                  output += f"\nError: {result.error}"
             return f"Status: Success\nOutput: {output}"
+        except BudgetExceeded as e:
+            return f"Status: Error\nOutput: Command cancelled - {e.reason}"
         except Exception as e:
+            # The SDK raises on non-zero exit status; 124 means `timeout` stopped the command
+            if timeout and getattr(e, "exit_code", None) == SHELL_TIMEOUT_EXIT_CODE:
+                return (f"Status: Timeout\nOutput: The command did not finish within {timeout}s and was stopped.\n"
+                        f"stdout: {getattr(e, 'stdout', '')}\nstderr: {getattr(e, 'stderr', '')}")
             return f"Status: Error\nOutput: System Error - {str(e)}"
 
+    async def hyperparameter_search(self, estimator: str, search_space: Dict[str, Any], X: str = "X_train", y: str = "y_train",
+                                    scoring: Optional[str] = None, cv: int = 5, n_trials: int = 30, halving: bool = True) -> Union[str, Dict[str, Any]]:
+        """
+        Runs a cross-validated hyperparameter search in the kernel with every fit on its own core
+        (ds_search.py). The search is recorded as a notebook cell, followed by a markdown cell with the result.
+        """
+        try:
+            await self._execute(self.sandbox.files.write(f"{search.SANDBOX_HOME}/{search.HELPER_NAME}", search.helper_source()))
+        except BudgetExceeded as e:
+            return f"Status: Error\nOutput: Search cancelled - {e.reason}"
+        except Exception as e:
+            return f"Status: Error\nOutput: Could not copy the search helper to the sandbox - {str(e)}"
+
+        # Leave the search time to refit the best model and report before the cell deadline
+        max_seconds = int(self.cell_timeout * 0.8) if self.cell_timeout else None
+        output = await self.run_python(search.search_code(estimator, search_space, X, y, scoring, cv, n_trials, halving, max_seconds))
+        summary = search.parse_summary(output["text"] if isinstance(output, dict) else output)
+        if summary:
+            logger.info(f"Hyperparameter search: best {summary['scoring']} {summary['best_score']} with {summary['best_params']} "
+                        f"({summary['fits']} fits on {summary['workers']} workers in {summary['seconds']}s)")
+            await self.create_markdown(search.summary_markdown(summary))
+        return output
+
     async def download_file(self, remote_path: str, local_filename: Optional[str] = None) -> str:
         """
         Downloads a file from the sandbox to the local filesystem.
@@ -210,18 +504,11 @@ class E2BTools:
             if not local_filename:
                 local_filename = remote_path.split('/')[-1]
             
-            # Ensure local artifacts directory exists
-            os.makedirs(settings.local_artifacts_dir, exist_ok=True)
-            
-            # Use settings.local_artifacts_dir as the base directory
-            local_filepath = os.path.join(settings.local_artifacts_dir, local_filename)
-
             # Use sandbox.files.read with format="bytes" for reliable binary retrieval in SDK v2
-            content = await self.sandbox.files.read(remote_path, format="bytes")
+            content = await self._read_file(remote_path)
             
             # Always write as binary to prevent corruption of images/pickles
-            with open(local_filepath, 'wb') as f:
-                f.write(content)
+            local_filepath = self.artifacts.save(local_filename, content)
                 
             return f"Status: Success\nFile downloaded successfully to: {os.path.abspath(local_filepath)}"
         except Exception as e:
@@ -240,7 +527,7 @@ class E2BTools:
             self.update_state_callback(cell_data)
         return "Status: Success\nMarkdown cell added to the notebook."
 
-    def get_tools(self, include_download: bool = True) -> List[StructuredTool]:
+    def get_tools(self, include_download: bool = True, include_search: bool = True) -> List[StructuredTool]:
             tools = [
                 StructuredTool.from_function(
                     coroutine=self.run_python,
@@ -257,11 +544,21 @@ class E2BTools:
                 StructuredTool.from_function(
                     coroutine=self.run_shell,
                     name="run_shell",
-                    description="Executes a shell command (e.g., pip install, ls, unzip). Use this for system operations.",
+                    description="Executes a shell command (e.g., pip install, ls, unzip). Use this for system operations. Plain `pip install`/`apt-get install` commands skip packages that are already installed.",
                     args_schema=RunShellInput
                 )
             ]
 
+            if include_search:
+                tools.append(
+                    StructuredTool.from_function(
+                        coroutine=self.hyperparameter_search,
+                        name="hyperparameter_search",
+                        description="Tunes a model: cross-validated search over a parameter space with all sandbox cores in parallel and successive halving. Streams per-configuration scores and leaves `search_results` (DataFrame), `best_params` and `best_model` (refit on all training data) in the kernel. Prefer this over hand-written GridSearchCV/RandomizedSearchCV loops.",
+                        args_schema=HyperparameterSearchInput
+                    )
+                )
+
             if include_download:
                 tools.append(
                     StructuredTool.from_function(
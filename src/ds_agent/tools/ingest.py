@@ -0,0 +1,208 @@
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import shlex
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from ds_agent.config import settings, Nodes
+from ds_agent.utils.datasets import DatasetCache, file_digest, PARQUET_FILE, SAMPLE_FILE
+from ds_agent.utils.logger import logger
+from ds_agent.utils.tracing import span
+
+if TYPE_CHECKING:
+    from e2b_code_interpreter import AsyncSandbox
+
+SANDBOX_HOME = "/home/user"
+HELPER_NAME = "ds_ingest.py"
+INGESTIBLE_EXTENSIONS = (".csv", ".tsv", ".xlsx", ".xls")
+
+# Stages that explore the data and may work on a sample; all others use the full table
+SAMPLED_STAGES = (Nodes.CLEANER, Nodes.EDA)
+
+@functools.lru_cache(maxsize=1)
+def helper_source() -> str:
+    with open(os.path.join(os.path.dirname(__file__), HELPER_NAME), encoding="utf-8") as f:
+        return f.read()
+
+async def ingest_dataset(sandbox: "AsyncSandbox", filename: str) -> Optional[Dict[str, Any]]:
+    """
+    Converts an uploaded CSV/Excel file into a typed Parquet copy next to it in the sandbox.
+    The conversion runs as its own process there, so its memory is freed before the agents start.
+
+    Returns:
+        The conversion summary, or None if the file is not tabular or conversion failed
+        (the agents then read the original file).
+    """
+    if not settings.ingest_enabled or not filename.lower().endswith(INGESTIBLE_EXTENSIONS):
+        return None
+
+    source = f"{SANDBOX_HOME}/{filename}"
+    command = f"python {SANDBOX_HOME}/{HELPER_NAME} {shlex.quote(source)} --compression {shlex.quote(settings.ingest_compression)}"
+    if not settings.ingest_downcast:
+        command += " --no-downcast"
+    if settings.ingest_categories:
+        command += " --categories"
+    if settings.sample_enabled:
+        command += f" --sample-rows {settings.sample_rows} --sample-threshold-mb {settings.sample_threshold_mb} --seed {settings.sample_seed}"
+        if settings.sample_stratify_column:
+            command += f" --stratify {shlex.quote(settings.sample_stratify_column)}"
+
+    try:
+        with span("ingest dataset", "sandbox", file=filename) as s:
+            await sandbox.files.write(f"{SANDBOX_HOME}/{HELPER_NAME}", helper_source())
+            result = await sandbox.commands.run(command, timeout=settings.ingest_timeout)
+            summary = json.loads(result.stdout.strip().splitlines()[-1])
+            s.set(rows=summary["rows"], seconds=summary["seconds"], peak_rss_mb=summary["peak_rss_mb"])
+    except Exception as e:
+        logger.warning(f"Ingestion of {filename} failed; agents will read the original file: {e}")
+        return None
+
+    logger.info(
+        f"Ingested {filename} -> {summary['parquet']}: {summary['rows']} rows x {summary['columns']} columns, "
+        f"{summary['source_mb']} MB -> {summary['parquet_mb']} MB on disk, {summary['memory_mb']} MB in memory, "
+        f"{summary['seconds']}s (peak RSS {summary['peak_rss_mb']} MB)"
+    )
+    if summary.get("sample"):
+        logger.info(f"Sampled {filename}: {summary['sample']['rows']} of {summary['rows']} rows ({summary['sample']['method']})")
+    return summary
+
+async def upload_dataset(sandbox: "AsyncSandbox", filename: str, path: Optional[str] = None, content: Optional[bytes] = None) -> Optional[Dict[str, Any]]:
+    """
+    Sends an upload (a local file or its bytes) to the sandbox and ingests it. Tabular uploads are
+    hashed first: one ingested before by any session gets the cached Parquet copy instead of the raw
+    file (`summary["cached"]` is then True), and new conversions are added to the cache.
+
+    Returns:
+        The ingestion summary, or None if the file is not tabular or conversion failed.
+    """
+    digest = None
+    if settings.dataset_cache_enabled and settings.ingest_enabled and filename.lower().endswith(INGESTIBLE_EXTENSIONS):
+        digest = await asyncio.to_thread(file_digest, path) if path else hashlib.sha256(content).hexdigest()
+        summary = await restore_dataset(sandbox, filename, digest)
+        if summary:
+            return summary
+
+    if path:
+        with open(path, "rb") as f:
+            await sandbox.files.write(filename, f)
+    else:
+        await sandbox.files.write(filename, content)
+    summary = await ingest_dataset(sandbox, filename)
+    if summary and digest:
+        await cache_dataset(sandbox, digest, summary)
+    return summary
+
+async def restore_dataset(sandbox: "AsyncSandbox", filename: str, digest: str) -> Optional[Dict[str, Any]]:
+    """
+    Writes the cached Parquet copy (and sample) of an upload with this content hash to the sandbox,
+    named after `filename`. The raw file is not sent.
+
+    Returns:
+        The cached summary renamed to this upload, or None on a cache miss or failure.
+    """
+    hit = DatasetCache().get(digest)
+    if not hit:
+        return None
+    cached, entry = hit
+    stem = os.path.splitext(filename)[0]
+    summary = {**cached, "source": filename, "parquet": f"{stem}.parquet", "cached": True}
+    if cached.get("sample"):
+        summary["sample"] = {**cached["sample"], "parquet": f"{stem}.sample.parquet"}
+
+    started = time.perf_counter()
+    try:
+        with span("restore dataset", "sandbox", file=filename) as s:
+            await sandbox.files.write(f"{SANDBOX_HOME}/{HELPER_NAME}", helper_source())
+            with open(os.path.join(entry, PARQUET_FILE), "rb") as f:
+                await sandbox.files.write(f"{SANDBOX_HOME}/{summary['parquet']}", f)
+            if summary.get("sample"):
+                with open(os.path.join(entry, SAMPLE_FILE), "rb") as f:
+                    await sandbox.files.write(f"{SANDBOX_HOME}/{summary['sample']['parquet']}", f)
+            summary["restore_seconds"] = round(time.perf_counter() - started, 2)
+            s.set(seconds=summary["restore_seconds"], parquet_mb=summary["parquet_mb"])
+    except Exception as e:
+        logger.warning(f"Restoring the cached copy of {filename} failed; uploading it instead: {e}")
+        return None
+
+    logger.info(
+        f"Restored {filename} from the dataset cache ({digest[:12]}): {summary['parquet_mb']} MB Parquet instead of "
+        f"{summary['source_mb']} MB upload and {summary['seconds']}s conversion, in {summary['restore_seconds']}s"
+    )
+    return summary
+
+async def cache_dataset(sandbox: "AsyncSandbox", digest: str, summary: Dict[str, Any]) -> None:
+    """
+    Copies a fresh conversion's Parquet file (and sample) back from the sandbox into the dataset cache.
+    """
+    try:
+        with span("cache dataset", "sandbox", file=summary["source"]):
+            parquet = await sandbox.files.read(f"{SANDBOX_HOME}/{summary['parquet']}", format="bytes")
+            sample = None
+            if summary.get("sample"):
+                sample = bytes(await sandbox.files.read(f"{SANDBOX_HOME}/{summary['sample']['parquet']}", format="bytes"))
+            await asyncio.to_thread(DatasetCache().put, digest, summary, bytes(parquet), sample)
+    except Exception as e:
+        logger.warning(f"Could not add {summary['source']} to the dataset cache: {e}")
+
+def sampling_policy(summary: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    The state entry describing how a sampled dataset is used, or None if it was not sampled.
+    """
+    if not summary or not summary.get("sample"):
+        return None
+    sample = summary["sample"]
+    return {
+        "dataset": summary["parquet"],
+        "rows": summary["rows"],
+        "sample": sample["parquet"],
+        "sample_rows": sample["rows"],
+        "method": sample["method"],
+        "seed": sample["seed"],
+        "sampled_stages": list(SAMPLED_STAGES),
+    }
+
+def sampling_instructions(sampling: Dict[str, Dict[str, Any]], stage: str) -> str:
+    """
+    Prompt section that tells a worker which datasets are sampled and whether it should use the sample.
+    """
+    if not sampling:
+        return ""
+    lines = []
+    for policy in sampling.values():
+        described = f"`{policy['dataset']}` ({policy['rows']} rows) has a {policy['method']} sample of {policy['sample_rows']} rows"
+        if stage in SAMPLED_STAGES:
+            lines.append(f"- {described}: load it with `df_sample = load_dataset('{policy['dataset']}', sample=True)`.")
+        else:
+            lines.append(f"- {described}, used for exploration only.")
+
+    if stage == Nodes.CLEANER:
+        lines.append("- Inspect (info, describe, value counts, plots) on `df_sample`. Write the cleaning steps as one function and apply it to the FULL `df_raw` to build `df_cleaned`, and to `df_sample` to build `df_cleaned_sample`.")
+    elif stage in SAMPLED_STAGES:
+        lines.append("- Compute statistics and plots on `df_cleaned_sample` (the cleaned sample), not on `df_cleaned`. Mention in your findings that they are based on the sample.")
+    else:
+        lines.append("- Use the FULL data (`df_cleaned` and the frames derived from it) for features, training and final outputs. Never train on the sample.")
+    return "\n".join(lines)
+
+def upload_notice(filename: str, summary: Optional[Dict[str, Any]]) -> str:
+    """
+    The system message that tells the agents about an uploaded file (and its Parquet copy).
+    """
+    if not summary:
+        return f"[System: User uploaded file '{filename}']"
+    return (
+        f"[System: User uploaded file '{filename}'. A typed Parquet copy was created: '{summary['parquet']}' "
+        f"({summary['rows']} rows x {summary['columns']} columns, {summary['memory_mb']} MB in memory). "
+        f"Load it with `from ds_ingest import load_dataset; df_raw = load_dataset('{summary['parquet']}')`"
+        + (". The raw file was not copied to the sandbox (the same data was converted before), so always use the Parquet copy."
+           if summary.get("cached") else f" instead of re-reading '{filename}'.")
+        + (f" These columns are stored as pandas categoricals: {', '.join(repr(c) for c in summary['categorical'])}; "
+           f"add new labels with `.cat.add_categories` before assigning or filling them, or convert with `.astype(str)`."
+           if summary.get("categorical") else "")
+        + (f" It is large, so a {summary['sample']['method']} sample of {summary['sample']['rows']} rows was saved as "
+           f"'{summary['sample']['parquet']}' for exploratory stages (`load_dataset('{summary['parquet']}', sample=True)`)."
+           if summary.get("sample") else "")
+        + "]"
+    )
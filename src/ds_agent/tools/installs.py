@@ -0,0 +1,404 @@
+import asyncio
+import json
+import os
+import re
+import shlex
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+from ds_agent.config import settings
+from ds_agent.core.budget import BudgetExceeded
+from ds_agent.utils.logger import logger
+from ds_agent.utils.tracing import span
+
+if TYPE_CHECKING:
+    from ds_agent.tools.e2b import E2BTools
+
+SANDBOX_WHEELHOUSE = "/home/user/.wheelhouse"
+
+# Unquoted shell operators the parser does not model (besides `&&`); such commands run unchanged
+SHELL_OPERATOR = re.compile(r"^[();<>|&]+$")
+PIP_REQUIREMENT = re.compile(r"^([A-Za-z0-9][A-Za-z0-9._-]*)(\[[^\]]*\])?((?:[<>=!~]=?|===)[^\s]+)?$")
+APT_PACKAGE = re.compile(r"^([a-z0-9][a-z0-9.+-]+)(=[A-Za-z0-9.:~+-]+)?$")
+
+# Flags that do not change what gets installed; any other flag (-r, -e, --index-url, ...) runs unchanged
+PIP_FLAGS = {"-q", "-qq", "--quiet", "-U", "--upgrade", "--user", "--no-cache-dir", "--no-input",
+             "--no-warn-script-location", "--disable-pip-version-check", "--break-system-packages"}
+APT_FLAGS = {"-y", "--yes", "-q", "-qq", "--quiet", "--no-install-recommends"}
+
+# Exit status of coreutils `timeout`; a timed-out install is not retried
+TIMEOUT_EXIT_CODE = 124
+
+# Failures a retry cannot fix (network errors and mirror hiccups are retried)
+PERMANENT_ERRORS = ("Unable to locate package", "has no installation candidate", "ResolutionImpossible")
+
+# Checks pip requirements against the installed distributions; prints {requirement: version or null}
+PIP_CHECK = """
+import json, sys
+from importlib.metadata import version, PackageNotFoundError
+try:
+    from packaging.requirements import Requirement
+except ImportError:
+    from pip._vendor.packaging.requirements import Requirement
+found = {}
+for spec in json.loads(sys.argv[1]):
+    requirement = Requirement(spec)
+    try:
+        installed = version(requirement.name)
+    except PackageNotFoundError:
+        installed = None
+    if installed and requirement.specifier and not requirement.specifier.contains(installed, prereleases=True):
+        installed = None
+    found[spec] = installed
+print(json.dumps(found))
+"""
+
+def normalize(name: str) -> str:
+    """PEP 503 project name: lowercase, runs of -_. as one dash."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+@dataclass
+class InstallRequest:
+    manager: str                # "pip" or "apt"
+    packages: List[str]         # requirements as written
+    flags: List[str] = field(default_factory=list)
+    sudo: bool = False
+    update: bool = False        # apt: refresh the package lists first
+
+    @property
+    def upgrade(self) -> bool:
+        return "-U" in self.flags or "--upgrade" in self.flags
+
+    def key(self, package: str) -> str:
+        """Record key of a package: `pip:<normalized name>` or `apt:<name>`."""
+        pattern = PIP_REQUIREMENT if self.manager == "pip" else APT_PACKAGE
+        name = pattern.match(package).group(1)
+        return f"{self.manager}:{normalize(name) if self.manager == 'pip' else name}"
+
+    def pinned(self, package: str) -> bool:
+        pattern = PIP_REQUIREMENT if self.manager == "pip" else APT_PACKAGE
+        return bool(pattern.match(package).group(pattern.groups))
+
+def _parse_pip(tokens: List[str]) -> Optional[InstallRequest]:
+    if tokens[:2] in (["pip", "install"], ["pip3", "install"]):
+        args = tokens[2:]
+    elif len(tokens) > 3 and re.fullmatch(r"python3?(\.\d+)?", tokens[0]) and tokens[1:4] == ["-m", "pip", "install"]:
+        args = tokens[4:]
+    else:
+        return None
+    flags, packages = [], []
+    for arg in args:
+        if arg.startswith("-"):
+            if arg not in PIP_FLAGS:
+                return None
+            flags.append(arg)
+        elif PIP_REQUIREMENT.match(arg):
+            packages.append(arg)
+        else:
+            # Paths, URLs, archives
+            return None
+    return InstallRequest("pip", packages, flags) if packages else None
+
+def _parse_apt(tokens: List[str]) -> Optional[InstallRequest]:
+    if not tokens or tokens[0] not in ("apt-get", "apt"):
+        return None
+    flags = [t for t in tokens[1:] if t.startswith("-")]
+    words = [t for t in tokens[1:] if not t.startswith("-")]
+    if any(flag not in APT_FLAGS for flag in flags) or not words:
+        return None
+    if words == ["update"]:
+        return InstallRequest("apt", [], update=True)
+    if words[0] != "install" or len(words) < 2 or not all(APT_PACKAGE.match(w) for w in words[1:]):
+        return None
+    return InstallRequest("apt", words[1:], [f for f in flags if f == "--no-install-recommends"])
+
+def parse_install(command: str) -> Optional[List[InstallRequest]]:
+    """
+    Recognizes `pip install ...` / `python -m pip install ...` / `apt-get [update &&] install ...`
+    commands, alone or chained with `&&`.
+
+    Returns:
+        The installs in order, or None if the command is anything else (it then runs unchanged).
+    """
+    if "$" in command or "`" in command or "\n" in command:
+        return None
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    try:
+        words = list(lexer)
+    except ValueError:
+        return None
+    parts: List[List[str]] = [[]]
+    for word in words:
+        if word == "&&":
+            parts.append([])
+        elif SHELL_OPERATOR.match(word):
+            return None
+        else:
+            parts[-1].append(word)
+
+    requests: List[InstallRequest] = []
+    update = False
+    for tokens in parts:
+        sudo = bool(tokens) and tokens[0] == "sudo"
+        tokens = tokens[1:] if sudo else tokens
+        if tokens and tokens[0].startswith("!"):
+            # Notebook-style `!pip install`
+            tokens[0] = tokens[0][1:]
+        request = (_parse_pip(tokens) or _parse_apt(tokens)) if tokens else None
+        if request is None:
+            return None
+        if request.manager == "apt" and not request.packages:
+            update = True
+            continue
+        request.sudo = sudo
+        if request.manager == "apt":
+            request.update, update = update, False
+        requests.append(request)
+    # A trailing `apt-get update` on its own is not an install
+    return requests if requests and not update else None
+
+@dataclass
+class SandboxInstalls:
+    """
+    What is known about one sandbox's packages. Kept on the sandbox object (`sandbox.install_state`),
+    so it lasts as long as the sandbox and is never shared with another one.
+    """
+    known: Dict[str, str] = field(default_factory=dict)    # packages installed or found present, so repeated installs skip the check
+    wheels: Set[str] = field(default_factory=set)           # wheelhouse files already copied into the sandbox
+
+def sandbox_installs(sandbox: Any) -> SandboxInstalls:
+    state = getattr(sandbox, "install_state", None)
+    if state is None:
+        state = sandbox.install_state = SandboxInstalls()
+    return state
+
+def _tail(text: str, lines: int = 15) -> str:
+    return "\n".join((text or "").strip().splitlines()[-lines:])
+
+class InstallManager:
+    """
+    Runs the pip/apt installs requested through `run_shell`:
+    packages already present in the sandbox are skipped, pip wheels are served from a local
+    wheelhouse (PIP_WHEELHOUSE_DIR) copied into the sandbox on demand, newly built wheels are
+    collected back into it for later sessions, and failed installs are retried.
+    Every package the session asked for is recorded in `installed` (key -> version).
+    """
+    def __init__(self, tools: "E2BTools"):
+        self.tools = tools
+        self.state = sandbox_installs(tools.sandbox)
+        self.known = self.state.known
+        self.installed: Dict[str, str] = {}
+
+    async def run(self, requests: List[InstallRequest]) -> str:
+        lines = []
+        for request in requests:
+            with span("install", "sandbox", manager=request.manager, packages=" ".join(request.packages)) as s:
+                ok, text = await (self._pip(request) if request.manager == "pip" else self._apt(request))
+                s.set(ok=ok)
+            lines.append(text)
+            if not ok:
+                return "Status: Error\nOutput: " + "\n".join(lines)
+        return "Status: Success\nOutput: " + "\n".join(lines)
+
+    async def _command(self, command: str) -> Tuple[bool, str]:
+        """
+        Runs an install command with retries.
+
+        Returns:
+            (succeeded, output tail or error)
+        """
+        error = ""
+        for attempt in range(1 + settings.install_retries):
+            if attempt:
+                logger.warning(f"Install failed (attempt {attempt}); retrying: {command}")
+                await asyncio.sleep(5 * attempt)
+            try:
+                result = await self.tools._run_command(command, settings.install_timeout_seconds)
+                return True, _tail(result.stdout)
+            except BudgetExceeded:
+                raise
+            except Exception as e:
+                error = _tail(getattr(e, "stderr", "") or getattr(e, "stdout", "")) or str(e)
+                if getattr(e, "exit_code", None) == TIMEOUT_EXIT_CODE:
+                    return False, f"Timed out after {settings.install_timeout_seconds}s.\n{error}"
+                if any(marker in error for marker in PERMANENT_ERRORS):
+                    break
+        return False, error
+
+    def _record(self, request: InstallRequest, versions: Dict[str, Optional[str]]) -> None:
+        for package, version in versions.items():
+            if version:
+                self.known[request.key(package)] = version
+                self.installed[request.key(package)] = version
+
+    # --- pip ---
+
+    async def _pip_present(self, request: InstallRequest, packages: List[str]) -> Dict[str, Optional[str]]:
+        if request.upgrade:
+            return {p: None for p in packages}
+        # Unpinned packages installed earlier in this sandbox need no check
+        found = {p: self.known[request.key(p)] for p in packages if not request.pinned(p) and request.key(p) in self.known}
+        unknown = [p for p in packages if p not in found]
+        if unknown:
+            command = f"python -c {shlex.quote(PIP_CHECK)} {shlex.quote(json.dumps(unknown))}"
+            try:
+                result = await self.tools._run_command(command, settings.shell_timeout_seconds)
+                found.update(json.loads(result.stdout.strip().splitlines()[-1]))
+            except BudgetExceeded:
+                raise
+            except Exception as e:
+                logger.warning(f"Could not check installed packages: {e}")
+        return {p: found.get(p) for p in packages}
+
+    async def _sync_wheels(self, packages: List[str]) -> Dict[str, str]:
+        """
+        Copies the wheelhouse wheels of `packages` into the sandbox.
+
+        Returns:
+            requirement -> wheel file, for the packages the wheelhouse has
+        """
+        directory = settings.pip_wheelhouse_dir
+        if not directory or not os.path.isdir(directory):
+            return {}
+        wanted = {normalize(PIP_REQUIREMENT.match(p).group(1)): p for p in packages}
+        synced = self.state.wheels
+        local = {}
+        for filename in sorted(os.listdir(directory)):
+            name = normalize(filename.split("-", 1)[0])
+            if not filename.endswith(".whl") or name not in wanted:
+                continue
+            if filename not in synced:
+                with open(os.path.join(directory, filename), "rb") as f:
+                    await self.tools._execute(self.tools.sandbox.files.write(f"{SANDBOX_WHEELHOUSE}/{filename}", f.read()))
+                synced.add(filename)
+            local[wanted[name]] = filename
+        return local
+
+    async def _collect_wheels(self, packages: List[str]) -> None:
+        """
+        Builds wheels of freshly installed packages (from pip's cache) and copies new ones into the wheelhouse.
+        """
+        directory = settings.pip_wheelhouse_dir
+        if not directory or not settings.pip_wheelhouse_collect or not packages:
+            return
+        try:
+            specs = " ".join(shlex.quote(p) for p in packages)
+            await self.tools._run_command(f"pip wheel --no-deps -q -w {SANDBOX_WHEELHOUSE} {specs}", settings.install_timeout_seconds)
+            os.makedirs(directory, exist_ok=True)
+            synced = self.state.wheels
+            added = []
+            for entry in await self.tools._execute(self.tools.sandbox.files.list(SANDBOX_WHEELHOUSE)):
+                synced.add(entry.name)
+                target = os.path.join(directory, entry.name)
+                if entry.name.endswith(".whl") and not os.path.exists(target):
+                    data = await self.tools._read_file(f"{SANDBOX_WHEELHOUSE}/{entry.name}")
+                    with open(target, "wb") as f:
+                        f.write(data)
+                    added.append(entry.name)
+            if added:
+                logger.info(f"Added to the wheelhouse: {', '.join(added)}")
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            logger.warning(f"Could not collect wheels of {', '.join(packages)}: {e}")
+
+    async def _pip(self, request: InstallRequest) -> Tuple[bool, str]:
+        present = await self._pip_present(request, request.packages)
+        self._record(request, present)
+        missing = [p for p in request.packages if not present[p]]
+        text = []
+        skipped = [f"{p} ({present[p]})" for p in request.packages if present[p]]
+        if skipped:
+            text.append(f"Already installed, skipped: {', '.join(skipped)}")
+        if not missing:
+            logger.info(f"pip install skipped, already installed: {', '.join(request.packages)}")
+            return True, "\n".join(text)
+
+        local = await self._sync_wheels(missing)
+        base = ("sudo " if request.sudo else "") + "pip install " + " ".join(request.flags + ["--progress-bar", "off"])
+        if settings.pip_wheelhouse_dir:
+            base += f" --find-links {SANDBOX_WHEELHOUSE}"
+        packages = " ".join(shlex.quote(p) for p in missing)
+
+        ok = False
+        if local and len(local) == len(missing):
+            # Everything requested is in the wheelhouse; try without the network first
+            ok, output = await self._offline(f"{base} --no-index {packages}")
+        if not ok:
+            ok, output = await self._command(f"{base} {packages}")
+        if not ok:
+            text.append(f"pip install {' '.join(missing)} failed:\n{output}")
+            return False, "\n".join(text)
+
+        installed = await self._pip_present(InstallRequest("pip", missing), missing)
+        self._record(request, installed)
+        text.append("Installed: " + ", ".join(f"{p} ({installed[p] or '?'})" for p in missing)
+                    + (f"; from the wheelhouse: {', '.join(local.values())}" if local else ""))
+        logger.info(f"pip {text[-1]}")
+        if output:
+            text.append(output)
+        await self._collect_wheels([p for p in missing if p not in local])
+        return True, "\n".join(text)
+
+    async def _offline(self, command: str) -> Tuple[bool, str]:
+        try:
+            result = await self.tools._run_command(command, settings.install_timeout_seconds)
+            return True, _tail(result.stdout)
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            logger.info(f"Offline install from the wheelhouse failed, using the index: {e}")
+            return False, ""
+
+    # --- apt ---
+
+    async def _apt_present(self, packages: List[str]) -> Dict[str, Optional[str]]:
+        names = {APT_PACKAGE.match(p).group(1): p for p in packages}
+        command = "dpkg-query -W -f='${Package} ${Version} ${db:Status-Status}\\n' " + " ".join(names) + " 2>/dev/null; true"
+        found = {p: None for p in packages}
+        try:
+            result = await self.tools._run_command(command, settings.shell_timeout_seconds)
+            for line in result.stdout.splitlines():
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "installed" and parts[0] in names:
+                    package = names[parts[0]]
+                    if not APT_PACKAGE.match(package).group(2) or package.endswith(f"={parts[1]}"):
+                        found[package] = parts[1]
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            logger.warning(f"Could not check installed system packages: {e}")
+        return found
+
+    async def _apt(self, request: InstallRequest) -> Tuple[bool, str]:
+        present = await self._apt_present(request.packages)
+        self._record(request, present)
+        missing = [p for p in request.packages if not present[p]]
+        text = []
+        skipped = [f"{p} ({present[p]})" for p in request.packages if present[p]]
+        if skipped:
+            text.append(f"Already installed, skipped: {', '.join(skipped)}")
+        if not missing:
+            logger.info(f"apt install skipped, already installed: {', '.join(request.packages)}")
+            return True, "\n".join(text)
+
+        # The sandbox user is not root; apt always needs sudo
+        install = "sudo DEBIAN_FRONTEND=noninteractive apt-get install -y -q " + " ".join(request.flags + [shlex.quote(p) for p in missing])
+        update = "sudo apt-get update -q"
+        if request.update:
+            await self._command(update)
+        ok, output = await self._command(install)
+        if not ok and not request.update and ("Unable to locate package" in output or "no installation candidate" in output):
+            # Stale or empty package lists
+            await self._command(update)
+            ok, output = await self._command(install)
+        if not ok:
+            text.append(f"apt-get install {' '.join(missing)} failed:\n{output}")
+            return False, "\n".join(text)
+
+        installed = await self._apt_present(missing)
+        self._record(request, installed)
+        text.append("Installed: " + ", ".join(f"{p} ({installed[p] or '?'})" for p in missing))
+        logger.info(f"apt {text[-1]}")
+        return True, "\n".join(text)
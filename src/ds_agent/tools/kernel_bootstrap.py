@@ -0,0 +1,52 @@
+"""
+Kernel warm-up that runs INSIDE the sandbox: executed once in the Jupyter kernel of every new
+sandbox, so the agents' first cell does not pay for importing the data-science stack.
+The application sends this file as code and never imports it itself.
+
+Imports that are not installed are skipped. The last stdout line is a JSON report
+(seconds per import, missing modules); the caller parses it.
+"""
+import json as _ds_json
+import time as _ds_time
+import warnings
+
+_ds_started = _ds_time.perf_counter()
+_ds_report = {"imports": {}, "missing": []}
+
+def _ds_import(statement, module):
+    start = _ds_time.perf_counter()
+    try:
+        exec(statement, globals())
+        _ds_report["imports"][module] = round(_ds_time.perf_counter() - start, 3)
+    except ImportError:
+        _ds_report["missing"].append(module)
+
+for _ds_statement, _ds_module in [
+    ("import numpy as np", "numpy"),
+    ("import pandas as pd", "pandas"),
+    ("import pyarrow.parquet", "pyarrow"),
+    ("import matplotlib", "matplotlib"),
+    ("import matplotlib.pyplot as plt", "matplotlib.pyplot"),
+    ("import seaborn as sns", "seaborn"),
+    ("import scipy.stats", "scipy"),
+    ("import sklearn.model_selection, sklearn.preprocessing, sklearn.metrics, sklearn.linear_model, sklearn.ensemble", "sklearn"),
+]:
+    _ds_import(_ds_statement, _ds_module)
+
+# Display defaults: readable frames in the text output the agents read
+if "pandas" in _ds_report["imports"]:
+    pd.set_option("display.max_columns", 50)
+    pd.set_option("display.width", 200)
+    pd.set_option("display.max_colwidth", 80)
+
+# Plot defaults: saved figures are sharp but small enough to send to the UI
+if "matplotlib" in _ds_report["imports"]:
+    matplotlib.rcParams.update({"figure.dpi": 100, "savefig.dpi": 120, "savefig.bbox": "tight", "figure.figsize": (10, 6)})
+
+# Library deprecation notices only cost the agents tokens
+warnings.filterwarnings("ignore", category=FutureWarning)
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+_ds_report["seconds"] = round(_ds_time.perf_counter() - _ds_started, 3)
+print(_ds_json.dumps(_ds_report))
+del _ds_import, _ds_statement, _ds_module, _ds_started, _ds_report, _ds_json, _ds_time
@@ -0,0 +1,67 @@
+import functools
+import json
+import os
+from typing import Any, Dict, Optional
+
+from ds_agent.config import settings
+
+SANDBOX_HOME = "/home/user"
+HELPER_NAME = "ds_search.py"
+RESULT_MARKER = "__ds_search_result__"
+
+@functools.lru_cache(maxsize=1)
+def helper_source() -> str:
+    with open(os.path.join(os.path.dirname(__file__), HELPER_NAME), encoding="utf-8") as f:
+        return f.read()
+
+def search_code(estimator: str, search_space: Dict[str, Any], X: str, y: str, scoring: Optional[str],
+                cv: int, n_trials: int, halving: bool, max_seconds: Optional[int]) -> str:
+    """
+    The notebook cell that runs the search in the kernel and binds `search_results`, `best_params` and `best_model`.
+    """
+    n_trials = max(1, min(n_trials, settings.search_max_trials))
+    return (
+        "from ds_search import run_search\n\n"
+        "search_results, best_params, best_model = run_search(\n"
+        f"    {estimator},\n"
+        f"    {search_space!r},\n"
+        f"    {X}, {y}, scoring={scoring!r}, cv={cv}, n_trials={n_trials}, halving={halving},\n"
+        f"    factor={settings.search_halving_factor}, n_jobs={settings.search_n_jobs}, seed={settings.search_seed}, max_seconds={max_seconds},\n"
+        ")\n"
+        "search_results.head(10)"
+    )
+
+def parse_summary(output: str) -> Optional[Dict[str, Any]]:
+    """The summary line `run_search` prints last, or None if the search failed."""
+    for line in reversed(output.splitlines()):
+        line = line.strip().removeprefix("stdout: ")
+        if line.startswith(RESULT_MARKER):
+            try:
+                return json.loads(line[len(RESULT_MARKER):])
+            except ValueError:
+                return None
+    return None
+
+def summary_markdown(summary: Dict[str, Any]) -> str:
+    """Notebook markdown cell with the best configuration and how the search went."""
+    params = "\n".join(f"| `{name}` | `{value}` |" for name, value in summary["best_params"].items())
+    notes = []
+    if summary.get("stopped_early"):
+        notes.append("- جستجو به دلیل محدودیت زمانی زودتر متوقف شد.")
+    if summary.get("failed"):
+        notes.append(f"- {summary['failed']} پیکربندی با خطا مواجه شد.")
+    if summary["rungs"] > 1:
+        stages = f"در {summary['rungs']} مرحله (successive halving)"
+    elif summary.get("halving"):
+        # Too few configurations or rows for a second rung
+        stages = "در یک مرحله (successive halving به دلیل تعداد کم پیکربندی‌ها یا سطرها اجرا نشد)"
+    else:
+        stages = "بدون successive halving (همه روی کل داده)"
+    return (
+        f"### نتیجه جستجوی ابرپارامتر ({summary['estimator']})\n\n"
+        f"- بهترین امتیاز ({summary['scoring']}): **{summary['best_score']:.4f}** ± {summary['best_std']:.4f}\n"
+        f"- {summary['configurations']} پیکربندی، {summary['fits']} برازش {stages} "
+        f"روی {summary['workers']} هسته، در {summary['seconds']} ثانیه\n"
+        + ("\n".join(notes) + "\n" if notes else "")
+        + f"\n| پارامتر | مقدار |\n|---|---|\n{params}\n"
+    )
@@ -0,0 +1,195 @@
+import asyncio
+import os
+import time
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from ds_agent.config import settings
+from ds_agent.utils.logger import logger
+
+class ArtifactStore:
+    """
+    Local artifact directory of one session, plus an in-memory manifest of the
+    files written during the current turn. Delivery reads the manifest, so it
+    never has to scan the directory or look at other sessions' files.
+    """
+    def __init__(self, directory: Optional[str] = None):
+        directory = settings.local_artifacts_dir if directory is None else directory
+        self.dir = directory
+        self._turn: Dict[str, str] = {}
+
+    @classmethod
+    def for_session(cls, session_id: str) -> "ArtifactStore":
+        return cls(os.path.join(settings.local_artifacts_dir, session_id))
+
+    def path(self, name: str) -> str:
+        """
+        Returns the local path for an artifact name, creating the directory if needed.
+        """
+        os.makedirs(self.dir, exist_ok=True)
+        return os.path.join(self.dir, os.path.basename(name))
+
+    def record(self, path: str) -> str:
+        """
+        Adds an already written file to the current turn's manifest.
+        """
+        self._turn[os.path.basename(path)] = path
+        return path
+
+    def save(self, name: str, data: bytes) -> str:
+        path = self.path(name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return self.record(path)
+
+    def start_turn(self) -> None:
+        self._turn.clear()
+
+    def turn_artifacts(self) -> List[str]:
+        """
+        Paths of the files written during the current turn, in creation order.
+        """
+        return list(self._turn.values())
+
+class ArtifactCollector:
+    """
+    Retention for the local artifacts directory. Each pass evicts files older than
+    `max_age_hours`, then least recently used files until every session directory
+    fits its quota and the whole directory fits the global quota.
+    Sessions registered with `protect()` are skipped by the age and global passes,
+    and the files of their current turn are never evicted.
+    """
+    def __init__(self,
+                 root: Optional[str] = None,
+                 session_quota_mb: Optional[int] = None,
+                 global_quota_mb: Optional[int] = None,
+                 max_age_hours: Optional[int] = None,
+                 interval: Optional[int] = None):
+        root = settings.local_artifacts_dir if root is None else root
+        session_quota_mb = settings.artifact_session_quota_mb if session_quota_mb is None else session_quota_mb
+        global_quota_mb = settings.artifact_global_quota_mb if global_quota_mb is None else global_quota_mb
+        max_age_hours = settings.artifact_max_age_hours if max_age_hours is None else max_age_hours
+        interval = settings.artifact_gc_interval if interval is None else interval
+        self.root = root
+        self.session_quota = session_quota_mb * 1024 * 1024
+        self.global_quota = global_quota_mb * 1024 * 1024
+        self.max_age = max_age_hours * 3600
+        self.interval = interval
+        self.active: Dict[str, ArtifactStore] = {}
+        self.stats = {"passes": 0, "evicted_files": 0, "reclaimed_bytes": 0, "total_bytes": 0}
+        self._task: Optional[asyncio.Task] = None
+
+    def protect(self, store: ArtifactStore) -> None:
+        self.active[os.path.abspath(store.dir)] = store
+
+    def release(self, store: ArtifactStore) -> None:
+        self.active.pop(os.path.abspath(store.dir), None)
+
+    def _scan(self) -> List[Tuple[str, str, int, float]]:
+        """
+        Returns (session dir, path, size, last used) for every artifact file.
+        """
+        root = os.path.abspath(self.root)
+        files = []
+        for dirpath, _, filenames in os.walk(root):
+            rel = os.path.relpath(dirpath, root)
+            session_dir = root if rel == "." else os.path.join(root, rel.split(os.sep)[0])
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((session_dir, path, st.st_size, max(st.st_atime, st.st_mtime)))
+        return files
+
+    def snapshot(self) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+        """
+        The protected session directories and their current turn's files. Sessions register and
+        write artifacts on the event loop, so this is taken there and handed to the threaded pass.
+        """
+        active = frozenset(self.active)
+        turn_files = frozenset(os.path.abspath(p) for store in self.active.values() for p in store.turn_artifacts())
+        return active, turn_files
+
+    def collect(self, active: Optional[FrozenSet[str]] = None, turn_files: Optional[FrozenSet[str]] = None) -> Dict[str, int]:
+        """
+        Runs one eviction pass and returns what it reclaimed. Without a snapshot, one is taken now.
+        """
+        if active is None or turn_files is None:
+            active, turn_files = self.snapshot()
+        files = sorted(self._scan(), key=lambda f: f[3])
+        evicted: set = set()
+        reclaimed = 0
+
+        def evict(entry) -> None:
+            nonlocal reclaimed
+            try:
+                os.remove(entry[1])
+            except OSError as e:
+                logger.warning(f"Failed to evict artifact {entry[1]}: {e}")
+                return
+            evicted.add(entry[1])
+            reclaimed += entry[2]
+
+        now = time.time()
+        if self.max_age:
+            for entry in files:
+                if entry[0] not in active and now - entry[3] > self.max_age:
+                    evict(entry)
+
+        if self.session_quota:
+            usage: Dict[str, int] = {}
+            for entry in files:
+                if entry[1] not in evicted:
+                    usage[entry[0]] = usage.get(entry[0], 0) + entry[2]
+            for entry in files:
+                if (entry[1] not in evicted and usage[entry[0]] > self.session_quota
+                        and entry[1] not in turn_files):
+                    evict(entry)
+                    usage[entry[0]] -= entry[2]
+
+        total = sum(entry[2] for entry in files if entry[1] not in evicted)
+        if self.global_quota and total > self.global_quota:
+            for entry in files:
+                if total <= self.global_quota:
+                    break
+                if entry[1] not in evicted and entry[0] not in active:
+                    evict(entry)
+                    total -= entry[2]
+
+        # Drop directories of finished sessions that are now empty
+        for session_dir in {entry[0] for entry in files}:
+            if session_dir != os.path.abspath(self.root) and session_dir not in active:
+                try:
+                    os.rmdir(session_dir)
+                except OSError:
+                    pass
+
+        self.stats["passes"] += 1
+        self.stats["evicted_files"] += len(evicted)
+        self.stats["reclaimed_bytes"] += reclaimed
+        self.stats["total_bytes"] = total
+        if evicted:
+            logger.info(f"Artifact GC evicted {len(evicted)} files ({reclaimed / 1024 / 1024:.1f} MB); {total / 1024 / 1024:.1f} MB in use")
+        return {"evicted_files": len(evicted), "reclaimed_bytes": reclaimed, "total_bytes": total}
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.collect, *self.snapshot())
+            except Exception as e:
+                logger.error(f"Artifact GC pass failed: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """
+        Starts the background task (needs a running event loop); a no-op if it already runs.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
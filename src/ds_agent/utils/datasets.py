@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from ds_agent.config import settings
+from ds_agent.utils.logger import logger
+
+SUMMARY_FILE = "summary.json"
+PARQUET_FILE = "data.parquet"
+SAMPLE_FILE = "data.sample.parquet"
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    SHA-256 of a file, read in chunks so large uploads are never held in memory.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def options_fingerprint() -> str:
+    """
+    The ingestion settings that shape the Parquet copy and sample; entries made with other settings are not reused.
+    """
+    options = [settings.ingest_downcast, settings.ingest_categories, settings.ingest_compression, settings.sample_enabled, settings.sample_rows,
+               settings.sample_threshold_mb, settings.sample_stratify_column, settings.sample_seed]
+    return hashlib.sha256(json.dumps(options).encode()).hexdigest()[:8]
+
+class DatasetCache:
+    """
+    Host-side cache of ingested datasets, shared by all sessions and batch jobs. An entry holds
+    the Parquet copy, the sample (if any) and the ingestion summary of one upload, keyed by the
+    upload's content hash, so a dataset seen before is restored without re-sending or re-converting it.
+    Least recently used entries are evicted above `quota_mb` (0 disables the limit).
+    """
+    def __init__(self, directory: Optional[str] = None, quota_mb: Optional[int] = None):
+        self.dir = settings.dataset_cache_dir if directory is None else directory
+        self.quota = (settings.dataset_cache_quota_mb if quota_mb is None else quota_mb) * 1024 * 1024
+
+    def _entry(self, digest: str) -> str:
+        return os.path.join(self.dir, f"{digest}-{options_fingerprint()}")
+
+    def get(self, digest: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """
+        Returns (summary, entry directory) for a cached upload, or None.
+        """
+        entry = self._entry(digest)
+        try:
+            with open(os.path.join(entry, SUMMARY_FILE), encoding="utf-8") as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.isfile(os.path.join(entry, PARQUET_FILE)):
+            return None
+        # The directory's mtime is its last use for LRU eviction
+        os.utime(entry)
+        return summary, entry
+
+    def put(self, digest: str, summary: Dict[str, Any], parquet: bytes, sample: Optional[bytes] = None) -> str:
+        """
+        Stores an entry. It is written to a temporary directory and renamed, so concurrent readers never see half of it.
+        """
+        entry = self._entry(digest)
+        staging = os.path.join(self.dir, f".{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        try:
+            with open(os.path.join(staging, PARQUET_FILE), "wb") as f:
+                f.write(parquet)
+            if sample is not None:
+                with open(os.path.join(staging, SAMPLE_FILE), "wb") as f:
+                    f.write(sample)
+            with open(os.path.join(staging, SUMMARY_FILE), "w", encoding="utf-8") as f:
+                json.dump(summary, f)
+            os.rename(staging, entry)
+        except OSError:
+            # Another process cached the same upload first
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.isdir(entry):
+                raise
+        self.evict()
+        return entry
+
+    def evict(self) -> int:
+        """
+        Removes least recently used entries until the cache fits its quota; returns the bytes reclaimed.
+        """
+        if not self.quota or not os.path.isdir(self.dir):
+            return 0
+        entries = []
+        for name in os.listdir(self.dir):
+            path = os.path.join(self.dir, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                entries.append((os.stat(path).st_mtime, path, size))
+            except OSError:
+                continue
+        total = sum(entry[2] for entry in entries)
+        reclaimed = 0
+        for _, path, size in sorted(entries):
+            if total <= self.quota:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            reclaimed += size
+        if reclaimed:
+            logger.info(f"Dataset cache evicted {reclaimed / 1024 / 1024:.1f} MB; {total / 1024 / 1024:.1f} MB in use")
+        return reclaimed
@@ -1,27 +1,45 @@
-from typing import Dict, Any, List, Optional, Type, Union, Tuple
+import time
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Type, Union, Tuple
 from pydantic import BaseModel, ValidationError
 from langchain_core.messages import SystemMessage, BaseMessage
 from langchain_core.runnables import RunnableConfig
-from e2b_code_interpreter import AsyncSandbox
 
 from ds_agent.core.state import AgentState
 from ds_agent.tools.e2b import E2BTools
+from ds_agent.tools.ingest import sampling_instructions
+from ds_agent.tools.bootstrap import warm_kernel
 from ds_agent.config import settings , Nodes
 from ds_agent.utils.logger import logger 
 from ds_agent.core.llm import LLMFactory
+from ds_agent.core.budget import RunBudget, BudgetExceeded
+from ds_agent.utils.artifacts import ArtifactStore
+from ds_agent.utils.tracing import span, usage_attrs
+from ds_agent.utils.snippets import retrieve_snippets, snippet_instructions
+
+if TYPE_CHECKING:
+    from e2b_code_interpreter import AsyncSandbox
+from ds_agent.utils.replay import active_trace, TraceRecorder, TracePlayer, RecordingLLM, ReplayLLM, RecordingSandbox, ReplaySandbox
 
 def get_llm(model_name: Optional[str] = None):
     """
     Creates a configured LLM instance using the LLMFactory.
     Returns the RAW LLM (without retry wrapper) to allow binding tools/structured output.
+    When a session trace is active, the LLM is recorded or replaced by its recording.
     """
     if model_name is None:
         model_name = settings.model_name
+
+    trace = active_trace.get()
+    if isinstance(trace, TracePlayer):
+        return ReplayLLM(trace)
         
     llm_factory = LLMFactory(model_name=model_name)
-    return llm_factory.create()
+    llm = llm_factory.create()
+    if isinstance(trace, TraceRecorder):
+        return RecordingLLM(llm, trace)
+    return llm
 
-def get_sandbox(config: RunnableConfig) -> AsyncSandbox:
+def get_sandbox(config: RunnableConfig) -> "AsyncSandbox":
     """
     Retrieves the sandbox session from the configuration.
     """
@@ -30,7 +48,99 @@ def get_sandbox(config: RunnableConfig) -> AsyncSandbox:
         raise ValueError("Sandbox not found in config. Ensure 'sandbox' is passed in 'configurable'.")
     return sandbox
 
-async def run_worker(state: AgentState, system_prompt: str, sender_name: str, model_name: Optional[str] = None, include_download: bool = False) -> Dict[str, Any]:
+def get_cell_timeout(state: AgentState) -> float:
+    """
+    Execution deadline for cells of the agent whose tool calls are being run (`state["next"]`).
+    Adaptive nodes get twice the time after each of their cells that timed out, up to the maximum.
+    """
+    node = state.get("next", "")
+    timeout = settings.node_cell_timeouts.get(node, settings.cell_timeout_seconds)
+    if timeout and node in settings.cell_timeout_adaptive_nodes:
+        timeouts = state.get("cell_timeouts", {}).get(node, 0)
+        timeout = min(timeout * 2 ** timeouts, max(timeout, settings.cell_timeout_max_seconds))
+    return timeout
+
+def get_artifacts(config: Optional[RunnableConfig]) -> ArtifactStore:
+    """
+    Retrieves the session's artifact store from the configuration. Falls back to
+    the shared artifacts directory when the run has none.
+    """
+    artifacts = (config or {}).get("configurable", {}).get("artifacts")
+    return artifacts if artifacts is not None else ArtifactStore()
+
+def get_budget(config: Optional[RunnableConfig]) -> Optional[RunBudget]:
+    """
+    Retrieves the run budget from the configuration, if one is attached.
+    """
+    if not config:
+        return None
+    return config.get("configurable", {}).get("budget")
+
+def budget_exhausted_update(reason: str, node_visits: Dict[str, int]) -> Dict[str, Any]:
+    """
+    State update that ends the run gracefully by routing to the Reporter.
+    """
+    logger.warning(f"Run budget exhausted ({reason}). Routing to Reporter.")
+    return {
+        "next": Nodes.REPORTER,
+        "node_visits": node_visits,
+        "messages": [SystemMessage(content=f"سیستم: بودجه اجرا به پایان رسید ({reason}). پایان دادن به جریان کاری.")]
+    }
+
+def _wrap_sandbox(sandbox: "AsyncSandbox") -> "AsyncSandbox":
+    trace = active_trace.get()
+    if isinstance(trace, TraceRecorder):
+        return RecordingSandbox(sandbox, trace)
+    return sandbox
+
+async def create_sandbox() -> "AsyncSandbox":
+    """
+    Creates a fresh E2B sandbox (from SANDBOX_TEMPLATE if set) with the configured timeout
+    and warms up its kernel. The creation and warm-up times are kept in `sandbox.bootstrap`.
+    In replay mode, an offline sandbox serving the recorded results is returned instead.
+    """
+    trace = active_trace.get()
+    if isinstance(trace, TracePlayer):
+        return ReplaySandbox(trace)
+    from e2b_code_interpreter import AsyncSandbox
+
+    started = time.perf_counter()
+    with span("sandbox create", "sandbox", template=settings.sandbox_template or None):
+        sandbox = await AsyncSandbox.create(
+            template=settings.sandbox_template or None,
+            api_key=settings.e2b_api_key.get_secret_value(),
+            timeout=settings.sandbox_timeout
+        )
+    create_seconds = round(time.perf_counter() - started, 2)
+    # Warmed before wrapping: the bootstrap is not part of a recorded session
+    sandbox.bootstrap = {"create_seconds": create_seconds, "warmup": await warm_kernel(sandbox)}
+    logger.info(f"Sandbox {sandbox.sandbox_id} created in {create_seconds}s")
+    return _wrap_sandbox(sandbox)
+
+async def reattach_sandbox(sandbox_id: Optional[str]) -> Tuple["AsyncSandbox", bool]:
+    """
+    Reconnects to the sandbox recorded in a checkpoint (resuming it if paused).
+    Falls back to a fresh sandbox when it no longer exists.
+
+    Returns:
+        (sandbox, reattached) where `reattached` is False if a new sandbox was created
+        and the kernel state of the checkpointed session is therefore lost.
+    """
+    if sandbox_id and not isinstance(active_trace.get(), TracePlayer):
+        try:
+            from e2b_code_interpreter import AsyncSandbox
+            sandbox = await AsyncSandbox.connect(
+                sandbox_id,
+                api_key=settings.e2b_api_key.get_secret_value(),
+                timeout=settings.sandbox_timeout
+            )
+            logger.info(f"Reattached to sandbox {sandbox_id}")
+            return _wrap_sandbox(sandbox), True
+        except Exception as e:
+            logger.warning(f"Could not reattach sandbox {sandbox_id}: {e}. Creating a new one.")
+    return await create_sandbox(), False
+
+async def run_worker(state: AgentState, system_prompt: str, sender_name: str, model_name: Optional[str] = None, include_download: bool = False, include_search: bool = False, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
     """
     Generic worker execution logic.
     
@@ -40,6 +150,8 @@ async def run_worker(state: AgentState, system_prompt: str, sender_name: str, mo
         sender_name: The name of the worker (used for tracking).
         model_name: Optional model name to use for this worker.
         include_download: Whether to allow the worker to download files (default: False).
+        include_search: Whether to offer the hyperparameter search tool (default: False).
+        config: The run configuration (carries the optional run budget).
         
     Returns:
         Dict update for the state.
@@ -58,10 +170,14 @@ async def run_worker(state: AgentState, system_prompt: str, sender_name: str, mo
             "messages": [SystemMessage(content=f"سیستم: عامل '{sender_name}' به حد مجاز تکرار رسید. پایان دادن به جریان کاری.")]
         }
 
+    budget = get_budget(config)
+    if budget and budget.exhausted():
+        return budget_exhausted_update(budget.exhausted(), node_visits)
+
     llm = get_llm(model_name=model_name)
     
     # We instantiate tools with None just to get definitions for binding
-    tool_defs = E2BTools(None).get_tools(include_download=include_download)
+    tool_defs = E2BTools(None).get_tools(include_download=include_download, include_search=include_search)
     llm_with_tools = llm.bind_tools(tool_defs)
     
     # Apply retries AFTER binding tools
@@ -72,13 +188,30 @@ async def run_worker(state: AgentState, system_prompt: str, sender_name: str, mo
     instructions = state.get("supervisor_instructions", "")
     if instructions:
         system_prompt = f"{system_prompt}\n\n### MANAGER INSTRUCTIONS ###\n{instructions}"
+
+    # Large datasets: exploratory stages get the sample, the others are told to keep the full data
+    sampling = sampling_instructions(state.get("sampling") or {}, sender_name)
+    if sampling:
+        system_prompt = f"{system_prompt}\n\n### SAMPLING POLICY ###\n{sampling}"
+
+    # Code that worked at this stage in the user's other sessions, ranked by schema and the manager's instructions
+    configurable = (config or {}).get("configurable", {})
+    snippets = snippet_instructions(await retrieve_snippets(sender_name, state.get("schemas") or {}, instructions,
+                                                            configurable.get("thread_id", ""), configurable.get("user_id", "")))
+    if snippets:
+        system_prompt = f"{system_prompt}\n\n### PROVEN SNIPPETS ###\n{snippets}"
     
     # Prepend the specialized system prompt to the message history
     current_messages = [SystemMessage(content=system_prompt)] + state['messages']
     
     try:
-        response = await llm_with_tools.ainvoke(current_messages)
+        with span(f"llm {sender_name}", "llm", model=model_name, messages=len(current_messages)) as s:
+            call = llm_with_tools.ainvoke(current_messages)
+            response = await budget.guard(call) if budget else await call
+            s.set(tool_calls=len(getattr(response, "tool_calls", None) or []), **usage_attrs(response))
         return {"messages": [response], "sender": sender_name, "node_visits": node_visits}
+    except BudgetExceeded as e:
+        return budget_exhausted_update(e.reason, node_visits)
     except Exception as e:
         logger.error(f"Error in node {sender_name}: {e}", exc_info=True)
         # Return a system message describing the error so the agent/supervisor is aware
@@ -107,7 +240,8 @@ async def invoke_structured_with_recovery(
         # 1. Primary Attempt: Standard tool/function calling mechanism
         logger.info(f"Attempting structured output for {schema_model.__name__}...")
         chain = llm.with_structured_output(schema_model)
-        out = await chain.ainvoke(prompt_value)
+        with span(f"llm structured {schema_model.__name__}", "llm"):
+            out = await chain.ainvoke(prompt_value)
         
         if out is None:
             raise ValueError("LLM returned None for structured output")
@@ -137,7 +271,9 @@ async def invoke_structured_with_recovery(
         """
         
         try:
-            raw_msg = await llm.ainvoke(fix_prompt)
+            with span("llm fix_prompt", "llm") as s:
+                raw_msg = await llm.ainvoke(fix_prompt)
+                s.set(**usage_attrs(raw_msg))
             raw = raw_msg.content if hasattr(raw_msg, "content") else str(raw_msg)
             
             # Clean common markdown wrappers
@@ -160,7 +296,9 @@ async def invoke_structured_with_recovery(
             
             final_prompt = f"{fallback_prompt}\n\nCONTEXT:\n{prompt_text}"
             
-            raw2_msg = await llm.ainvoke(final_prompt)
+            with span("llm fallback", "llm") as s:
+                raw2_msg = await llm.ainvoke(final_prompt)
+                s.set(**usage_attrs(raw2_msg))
             raw2 = raw2_msg.content if hasattr(raw2_msg, "content") else str(raw2_msg)
             raw2_cleaned = raw2.replace('```json', '').replace('```', '').strip()
             
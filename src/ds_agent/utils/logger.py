@@ -1,41 +1,90 @@
+import atexit
+import copy
+import json
 import logging
+import queue
 import sys
 import os
-from logging.handlers import RotatingFileHandler
+from contextvars import ContextVar
+from typing import Optional
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from ds_agent.config import settings
 
+# Session tag of the current task. Set once per Chainlit hook / job, read by every log record.
+log_session: ContextVar[str] = ContextVar("log_session", default="system")
+
+def set_log_session(session_id: str) -> None:
+    """
+    Tags all log records emitted from the current task (and the tasks it spawns) with `session_id`.
+    """
+    log_session.set(session_id)
+
 # Global record factory to ensure 'session_id' always exists on log records
-# This affects ALL loggers in the current process.
+# This affects ALL loggers in the current process, so it only does a contextvar lookup.
 old_factory = logging.getLogRecordFactory()
 
 def record_factory(*args, **kwargs):
     record = old_factory(*args, **kwargs)
-    
-    # Default value
-    record.session_id = "system"
-    
-    try:
-        import chainlit as cl
-        # Try to get session info from Chainlit context
-        # Use get_context() as it's the safest way to check if we are in a task
-        from chainlit.context import get_context
-        ctx = get_context()
-        if ctx and hasattr(ctx, "session") and ctx.session:
-            session = ctx.session
-            session_id = session.id[:8] if session.id else "no-id"
-            user_id = "anon"
-            if session.user and hasattr(session.user, "identifier") and session.user.identifier:
-                user_id = session.user.identifier
-            record.session_id = f"{user_id}:{session_id}"
-    except Exception:
-        # This handles cases where we are outside a Chainlit task context
-        pass
-        
+    record.session_id = log_session.get()
     return record
 
 logging.setLogRecordFactory(record_factory)
 
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, for log shippers.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "session": getattr(record, "session_id", "system"),
+            "logger": record.name,
+            "location": f"{record.filename}:{record.lineno}",
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class SessionQueueHandler(QueueHandler):
+    """
+    Queues records for the listener thread with the message merged but the traceback kept
+    apart in `exc_text`, so the output formatters place it (the JSON one in "exception").
+    The stock `prepare` appends it to the message and drops it.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        # Tracebacks hold frames alive; the text is all the formatters need
+        record.exc_info = None
+        return record
+
+class AppOnlyFilter(logging.Filter):
+    """
+    Lets only the application's own records through (the log file does not take library logs).
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.name == "ds_agent" or record.name.startswith("ds_agent.")
+
+# The application logger. Output handlers are attached by `setup_logger()`, which
+# entry points call once at startup (nothing is configured at import time).
+logger = logging.getLogger("ds_agent")
+_listener: Optional[QueueListener] = None
+
 def setup_logger():
+    """
+    Configures logging for the process; repeated calls are no-ops.
+    """
+    global _listener
+    if _listener is not None:
+        return logger
+
     # 1. Get Config
     log_level_str = settings.log_level
     log_file = settings.log_file_path
@@ -45,47 +94,48 @@ def setup_logger():
 
     # 2. Formatter
     # The [%(session_id)s] part depends on the record_factory above.
-    fmt_string = "%(asctime)s - %(levelname)-8s - [%(session_id)s] - %(filename)s:%(lineno)d - %(message)s"
-    formatter = logging.Formatter(fmt=fmt_string, datefmt="%Y-%m-%d %H:%M:%S")
+    if settings.log_format == "json":
+        formatter = JsonFormatter()
+    else:
+        fmt_string = "%(asctime)s - %(levelname)-8s - [%(session_id)s] - %(filename)s:%(lineno)d - %(message)s"
+        formatter = logging.Formatter(fmt=fmt_string, datefmt="%Y-%m-%d %H:%M:%S")
 
-    # 3. Configure the Root Logger
-    # This is a broad stroke to ensure all logs (even from libs) use our format if they hit the root.
+    # 3. Output handlers. They run on the listener thread, never on the event loop.
     root_logger = logging.getLogger()
     root_logger.setLevel(log_level)
-    
-    # Update or add handlers to root
-    if not root_logger.handlers:
-        console = logging.StreamHandler(sys.stdout)
-        root_logger.addHandler(console)
-    
-    for handler in root_logger.handlers:
-        handler.setFormatter(formatter)
-
-    # 4. Create/Get the named Logger for the application
-    logger = logging.getLogger("ds_agent")
-    logger.setLevel(log_level)
-    logger.propagate = True # Allow it to propagate to root so root's handlers handle it
 
-    # Ensure no duplicate handlers on the named logger if we use propagation
-    if logger.hasHandlers():
-        logger.handlers.clear()
+    handlers = [h for h in root_logger.handlers if not isinstance(h, QueueHandler)] or [logging.StreamHandler(sys.stdout)]
+    for handler in handlers:
+        handler.setFormatter(formatter)
 
-    # 5. Add File Handler specifically for our app (optional, root could handle this too)
     log_dir = os.path.dirname(log_file)
     if log_dir and not os.path.exists(log_dir):
         os.makedirs(log_dir)
 
     file_handler = RotatingFileHandler(
-        log_file, 
-        maxBytes=max_bytes, 
+        log_file,
+        maxBytes=max_bytes,
         backupCount=backup_count,
         encoding='utf-8'
     )
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-    
-    return logger
+    file_handler.addFilter(AppOnlyFilter())
+    handlers.append(file_handler)
+
+    # 4. Every record (ours and the libraries') goes through the root logger into a queue
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root_logger.handlers = [SessionQueueHandler(log_queue)]
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    # 5. The named Logger for the application
+    logger.setLevel(log_level)
+    logger.propagate = True # Allow it to propagate to root so the queue handler takes it
 
-# Initialize the singleton logger
-logger = setup_logger()
-logger.info("Logging system fully initialized with global session tracking.")
+    # Ensure no duplicate handlers on the named logger if we use propagation
+    if logger.hasHandlers():
+        logger.handlers.clear()
+
+    logger.info("Logging system fully initialized with queue-based output and session tracking.")
+    return logger
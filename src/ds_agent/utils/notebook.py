@@ -1,16 +1,34 @@
 import os
-import nbformat
 import base64 as b64
+from typing import TYPE_CHECKING
 
-from ds_agent.core.state import AgentState
+if TYPE_CHECKING:
+    from ds_agent.core.state import AgentState
 
-def save_session_to_ipynb(state: AgentState, filename: str = 'analysis.ipynb') -> str:
+def _sampling_markdown(sampling: dict) -> str:
+    lines = ["### سیاست نمونه‌برداری", ""]
+    for filename, policy in sampling.items():
+        lines.append(
+            f"- `{filename}` ({policy['rows']} سطر): نمونه‌ی {policy['method']} با {policy['sample_rows']} سطر "
+            f"در `{policy['sample']}` (seed={policy['seed']}). مراحل {', '.join(policy['sampled_stages'])} روی نمونه "
+            f"و مراحل مدل‌سازی و خروجی‌های نهایی روی کل داده اجرا شده‌اند."
+        )
+    return "\n".join(lines)
+
+def save_session_to_ipynb(state: "AgentState", filename: str = 'analysis.ipynb') -> str:
     """
     Exports the current agent state to a standard Jupyter Notebook (.ipynb) file.
     """
+    import nbformat
     nb = nbformat.v4.new_notebook()
     cells = []
 
+    # Analyses of large datasets are partly based on a sample; say so up front
+    sampling = state.get('sampling') or {}
+    if sampling:
+        nb.metadata["ds_agent"] = {"sampling": sampling}
+        cells.append(nbformat.v4.new_markdown_cell(source=_sampling_markdown(sampling)))
+
     # Iterate through the tracked notebook cells
     for cell_data in state.get('notebook_cells', []):
         cell_type = cell_data.get('cell_type')
@@ -67,6 +85,8 @@ def save_session_to_ipynb(state: AgentState, filename: str = 'analysis.ipynb') -
 
             nb_cell = nbformat.v4.new_code_cell(source=source, execution_count=execution_count)
             nb_cell.outputs = outputs
+            if cell_data.get('telemetry'):
+                nb_cell.metadata["ds_agent"] = {"telemetry": cell_data['telemetry']}
             cells.append(nb_cell)
 
     nb.cells = cells
@@ -0,0 +1,342 @@
+import base64
+import contextvars
+import gzip
+import hashlib
+import json
+import os
+import re
+from collections import defaultdict, deque
+from datetime import datetime
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Type, Union
+
+from pydantic import BaseModel
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+from ds_agent.config import settings
+from ds_agent.utils.logger import logger
+
+if TYPE_CHECKING:
+    from e2b_code_interpreter import Execution
+
+# Trace of the session running in the current task (TraceRecorder, TracePlayer or None).
+# Set once per turn by the entry point; graph nodes inherit it through the task context.
+active_trace: contextvars.ContextVar[Optional[Union["TraceRecorder", "TracePlayer"]]] = contextvars.ContextVar("active_trace", default=None)
+
+# Cell wall times in tool results are measured on the host and never repeat exactly on replay
+_WALL_TIME = re.compile(r"(Telemetry: wall )[0-9.]+s")
+
+_RESULT_FIELDS = ("text", "html", "markdown", "svg", "png", "jpeg", "pdf", "latex", "json", "javascript", "is_main_result")
+
+class TraceMismatchError(RuntimeError):
+    """Raised in strict replay when the run diverges from the recorded trace."""
+
+class ReplayedError(RuntimeError):
+    """Re-raised on replay for a call that failed while recording."""
+
+def request_fingerprint(value: Any) -> str:
+    """
+    Short, id-independent hash of an LLM request or sandbox call used to detect divergence on replay.
+    """
+    if isinstance(value, list):
+        value = [(m.type, m.content, getattr(m, "tool_calls", None)) if isinstance(m, BaseMessage) else m for m in value]
+    encoded = _WALL_TIME.sub(r"\1?s", json.dumps(value, default=str, sort_keys=True))
+    return hashlib.sha1(encoded.encode()).hexdigest()[:12]
+
+# --- Serialization ---
+
+def _encode_response(response: Any) -> Dict[str, Any]:
+    if isinstance(response, BaseMessage):
+        return {"message": messages_to_dict([response])[0]}
+    if isinstance(response, BaseModel):
+        return {"model": response.model_dump(mode="json")}
+    return {"value": response}
+
+def _decode_response(payload: Dict[str, Any], schema: Optional[Type[BaseModel]] = None) -> Any:
+    if "message" in payload:
+        return messages_from_dict([payload["message"]])[0]
+    if "model" in payload:
+        return schema.model_validate(payload["model"]) if schema else payload["model"]
+    return payload.get("value")
+
+def _encode_execution(execution: "Execution") -> Dict[str, Any]:
+    return {
+        "stdout": list(execution.logs.stdout),
+        "stderr": list(execution.logs.stderr),
+        "results": [{k: getattr(r, k) for k in _RESULT_FIELDS if getattr(r, k, None)} for r in execution.results],
+        "error": {"name": execution.error.name, "value": execution.error.value, "traceback": execution.error.traceback} if execution.error else None,
+    }
+
+def _decode_execution(payload: Dict[str, Any]) -> "Execution":
+    from e2b_code_interpreter import Execution, ExecutionError, Logs, Result
+    return Execution(
+        results=[Result(**r) for r in payload["results"]],
+        logs=Logs(stdout=payload["stdout"], stderr=payload["stderr"]),
+        error=ExecutionError(**payload["error"]) if payload["error"] else None,
+    )
+
+def _encode_entries(entries: List[Any]) -> List[Dict[str, Any]]:
+    return [{
+        "name": e.name,
+        "path": getattr(e, "path", e.name),
+        "type": getattr(getattr(e, "type", None), "value", None),
+        "size": getattr(e, "size", 0),
+        "modified_time": e.modified_time.isoformat() if getattr(e, "modified_time", None) else None,
+    } for e in entries]
+
+def _encode_content(content: Any) -> str:
+    data = content if isinstance(content, (bytes, bytearray)) else str(content).encode()
+    return base64.b64encode(data).decode("ascii")
+
+def _encode_command(result: Any) -> Dict[str, Any]:
+    return {"stdout": result.stdout, "stderr": result.stderr, "exit_code": result.exit_code, "error": result.error}
+
+def _decode_entries(payload: List[Dict[str, Any]]) -> List[SimpleNamespace]:
+    return [SimpleNamespace(
+        name=e["name"],
+        path=e["path"],
+        type=e["type"],
+        size=e["size"],
+        is_dir=e["type"] == "dir",
+        modified_time=datetime.fromisoformat(e["modified_time"]) if e["modified_time"] else None,
+    ) for e in payload]
+
+async def _recorded(trace: "TraceRecorder", kind: str, op: str, key: Any, request: str, call: Any, encode: Any) -> Any:
+    """
+    Awaits a live call and records its encoded result, or its error so that failures replay too.
+    """
+    try:
+        result = await call
+    except Exception as e:
+        trace.record(kind, op, key, request, {"error": f"{type(e).__name__}: {e}"})
+        raise
+    trace.record(kind, op, key, request, {"ok": encode(result)})
+    return result
+
+def _replayed(payload: Dict[str, Any]) -> Any:
+    if "error" in payload:
+        raise ReplayedError(payload["error"])
+    return payload["ok"]
+
+# --- Trace files ---
+
+# Graph input fields besides the messages that are recorded with each turn
+TURN_FIELDS = ("sampling", "schemas")
+
+class TraceRecorder:
+    """
+    Appends LLM calls, sandbox operations and turn inputs of one session to a gzipped JSONL trace.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        trace_dir = os.path.dirname(path)
+        if trace_dir:
+            os.makedirs(trace_dir, exist_ok=True)
+        self._fp = gzip.open(path, "at", encoding="utf-8")
+        logger.info(f"Recording session trace to {path}")
+
+    def record(self, kind: str, op: str, key: Any, request: str, response: Any) -> None:
+        line = {"kind": kind, "op": op, "key": key, "req": request, "res": response}
+        self._fp.write(json.dumps(line, separators=(",", ":"), default=str) + "\n")
+        self._fp.flush()
+
+    def close(self) -> None:
+        self._fp.close()
+
+class TracePlayer:
+    """
+    Serves recorded responses in order. Entries are queued per (kind, op, key) so that
+    calls of different kinds may interleave differently than at record time.
+    """
+    def __init__(self, path: str, strict: bool = False):
+        self.path = path
+        self.strict = strict
+        self._queues: Dict[Tuple[str, str, str], deque] = defaultdict(deque)
+        self._last: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self.turns: List[Dict[str, Any]] = []
+
+        with gzip.open(path, "rt", encoding="utf-8") as fp:
+            for line in fp:
+                entry = json.loads(line)
+                if entry["kind"] == "turn":
+                    # Older traces recorded a turn as its messages only
+                    turn = entry["res"] if isinstance(entry["res"], dict) else {"messages": entry["res"]}
+                    self.turns.append({**turn, "messages": messages_from_dict(turn["messages"])})
+                else:
+                    self._queues[(entry["kind"], entry["op"], str(entry["key"]))].append(entry)
+        logger.info(f"Loaded session trace from {path} ({len(self.turns)} turns)")
+
+    def next(self, kind: str, op: str, key: Any, request: str) -> Any:
+        queue_key = (kind, op, str(key))
+        queue = self._queues.get(queue_key)
+        if queue:
+            entry = queue.popleft()
+            self._last[queue_key] = entry
+        elif queue_key in self._last and kind == "sandbox":
+            # Repeated reads/lists of the same path after the recorded ones were consumed
+            entry = self._last[queue_key]
+        else:
+            raise TraceMismatchError(f"Trace exhausted for {kind}:{op} ({key})")
+
+        if entry["req"] != request:
+            message = f"Replay diverged at {kind}:{op} ({key}): recorded request {entry['req']}, got {request}"
+            if self.strict:
+                raise TraceMismatchError(message)
+            logger.warning(message)
+        return entry["res"]
+
+def record_turn(graph_input: Dict[str, Any]) -> None:
+    """
+    Records the input of a turn (its messages and the `TURN_FIELDS` that shape the prompts)
+    so a replay can drive the session without the user.
+    """
+    trace = active_trace.get()
+    if isinstance(trace, TraceRecorder):
+        turn = {"messages": messages_to_dict(graph_input["messages"])}
+        turn.update({field: graph_input[field] for field in TURN_FIELDS if graph_input.get(field)})
+        trace.record("turn", "input", "", "", turn)
+
+def open_trace(session_id: str) -> Optional[Union[TraceRecorder, TracePlayer]]:
+    """
+    Opens the trace for a session according to `settings.trace_mode` ("off", "record" or "replay").
+    In replay mode a session without a recording runs live (returns None).
+    """
+    path = os.path.join(settings.trace_dir, f"{session_id}.jsonl.gz")
+    if settings.trace_mode == "record":
+        return TraceRecorder(path)
+    if settings.trace_mode == "replay":
+        if not os.path.isfile(path):
+            logger.warning(f"TRACE_MODE=replay but no trace was recorded for session {session_id} ({path}); running live.")
+            return None
+        return TracePlayer(path, strict=settings.trace_strict)
+    return None
+
+# --- LLM wrappers ---
+
+class RecordingLLM:
+    """
+    Proxy around a chat model (or a tool/structured binding of it) that records every `ainvoke`.
+    """
+    def __init__(self, inner: Any, trace: TraceRecorder, op: str = "invoke"):
+        self.inner = inner
+        self.trace = trace
+        self.op = op
+
+    def bind_tools(self, tools: List[Any], **kwargs) -> "RecordingLLM":
+        return RecordingLLM(self.inner.bind_tools(tools, **kwargs), self.trace, "tools")
+
+    def with_retry(self, **kwargs) -> "RecordingLLM":
+        return RecordingLLM(self.inner.with_retry(**kwargs), self.trace, self.op)
+
+    def with_structured_output(self, schema: Type[BaseModel], **kwargs) -> "RecordingLLM":
+        return RecordingLLM(self.inner.with_structured_output(schema, **kwargs), self.trace, f"structured:{schema.__name__}")
+
+    async def ainvoke(self, input: Any, config: Optional[Dict[str, Any]] = None, **kwargs) -> Any:
+        call = self.inner.ainvoke(input, config, **kwargs)
+        return await _recorded(self.trace, "llm", self.op, "", request_fingerprint(input), call, _encode_response)
+
+class ReplayLLM:
+    """
+    Stand-in chat model that returns the recorded responses of a trace.
+    """
+    def __init__(self, trace: TracePlayer, op: str = "invoke", schema: Optional[Type[BaseModel]] = None):
+        self.trace = trace
+        self.op = op
+        self.schema = schema
+
+    def bind_tools(self, tools: List[Any], **kwargs) -> "ReplayLLM":
+        return ReplayLLM(self.trace, "tools")
+
+    def with_retry(self, **kwargs) -> "ReplayLLM":
+        return self
+
+    def with_structured_output(self, schema: Type[BaseModel], **kwargs) -> "ReplayLLM":
+        return ReplayLLM(self.trace, f"structured:{schema.__name__}", schema)
+
+    async def ainvoke(self, input: Any, config: Optional[Dict[str, Any]] = None, **kwargs) -> Any:
+        payload = _replayed(self.trace.next("llm", self.op, "", request_fingerprint(input)))
+        return _decode_response(payload, self.schema)
+
+# --- Sandbox wrappers ---
+
+class _RecordingFiles:
+    def __init__(self, inner: Any, trace: TraceRecorder):
+        self.inner = inner
+        self.trace = trace
+
+    async def list(self, path: str, *args, **kwargs) -> List[Any]:
+        call = self.inner.list(path, *args, **kwargs)
+        return await _recorded(self.trace, "sandbox", "files.list", path, "", call, _encode_entries)
+
+    async def read(self, path: str, format: str = "text", **kwargs) -> Any:
+        call = self.inner.read(path, format=format, **kwargs)
+        return await _recorded(self.trace, "sandbox", "files.read", path, format, call, _encode_content)
+
+    async def write(self, path: str, data: Any, **kwargs) -> Any:
+        call = self.inner.write(path, data, **kwargs)
+        return await _recorded(self.trace, "sandbox", "files.write", path, "", call, lambda info: None)
+
+class _RecordingCommands:
+    def __init__(self, inner: Any, trace: TraceRecorder):
+        self.inner = inner
+        self.trace = trace
+
+    async def run(self, cmd: str, **kwargs) -> Any:
+        call = self.inner.run(cmd, **kwargs)
+        return await _recorded(self.trace, "sandbox", "commands.run", "", request_fingerprint(cmd), call, _encode_command)
+
+class RecordingSandbox:
+    """
+    Proxy around an AsyncSandbox that records `run_code`, `files.*` and `commands.run` results.
+    Everything else is delegated to the live sandbox.
+    """
+    def __init__(self, inner: Any, trace: TraceRecorder):
+        self.inner = inner
+        self.trace = trace
+        self.files = _RecordingFiles(inner.files, trace)
+        self.commands = _RecordingCommands(inner.commands, trace)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.inner, name)
+
+    async def run_code(self, code: str, **kwargs) -> "Execution":
+        call = self.inner.run_code(code, **kwargs)
+        return await _recorded(self.trace, "sandbox", "run_code", "", request_fingerprint(code), call, _encode_execution)
+
+class _ReplayFiles:
+    def __init__(self, trace: TracePlayer):
+        self.trace = trace
+
+    async def list(self, path: str, *args, **kwargs) -> List[SimpleNamespace]:
+        return _decode_entries(_replayed(self.trace.next("sandbox", "files.list", path, "")))
+
+    async def read(self, path: str, format: str = "text", **kwargs) -> Any:
+        data = base64.b64decode(_replayed(self.trace.next("sandbox", "files.read", path, format)))
+        return data if format == "bytes" else data.decode("utf-8", errors="replace")
+
+    async def write(self, path: str, data: Any, **kwargs) -> None:
+        # Writes have no observable result, so uploads may differ from the recording
+        return None
+
+class _ReplayCommands:
+    def __init__(self, trace: TracePlayer):
+        self.trace = trace
+
+    async def run(self, cmd: str, **kwargs) -> SimpleNamespace:
+        return SimpleNamespace(**_replayed(self.trace.next("sandbox", "commands.run", "", request_fingerprint(cmd))))
+
+class ReplaySandbox:
+    """
+    Offline stand-in for AsyncSandbox that serves the recorded sandbox results of a trace.
+    """
+    def __init__(self, trace: TracePlayer, sandbox_id: str = "replay"):
+        self.trace = trace
+        self.sandbox_id = sandbox_id
+        self.files = _ReplayFiles(trace)
+        self.commands = _ReplayCommands(trace)
+
+    async def run_code(self, code: str, **kwargs) -> "Execution":
+        return _decode_execution(_replayed(self.trace.next("sandbox", "run_code", "", request_fingerprint(code))))
+
+    async def kill(self) -> None:
+        pass
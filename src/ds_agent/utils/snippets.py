@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+from ds_agent.config import settings
+from ds_agent.utils.logger import logger
+
+# Rough size of a token in characters, for the prompt budget
+CHARS_PER_TOKEN = 4
+
+# Query terms taken from the column names and instructions; more only dilute the ranking
+MAX_QUERY_TERMS = 40
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snippets (
+    id INTEGER PRIMARY KEY,
+    digest TEXT UNIQUE,
+    stage TEXT,
+    signature TEXT,
+    session TEXT,
+    owner TEXT DEFAULT '',
+    created REAL,
+    code TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS snippets_fts USING fts5(code, columns);
+"""
+
+def schema_signature(schemas: Dict[str, Dict[str, str]]) -> str:
+    """
+    Signature of the session's datasets: equal for uploads with the same columns and dtypes, whatever the file names.
+    """
+    fields = sorted({f"{column}:{dtype}" for schema in schemas.values() for column, dtype in schema.items()})
+    return hashlib.sha256("\n".join(fields).encode()).hexdigest()[:16] if fields else ""
+
+def _terms(text: str) -> List[str]:
+    """Word terms of `text` (identifiers are split on underscores too), without duplicates."""
+    words = re.findall(r"[^\W_]{3,}", text.lower())
+    return list(dict.fromkeys(words))
+
+def successful_code(cell: Dict[str, Any]) -> bool:
+    """A code cell that ran without error and is long enough to be worth reusing."""
+    return (cell.get("cell_type") == "code"
+            and len(cell.get("source", "").strip()) >= settings.snippet_min_chars
+            and not any(output.get("type") == "error" for output in cell.get("outputs", [])))
+
+class SnippetIndex:
+    """
+    Local full-text index (SQLite FTS5, BM25 ranking) of code cells that ran without error,
+    tagged with the stage that wrote them, the schema signature of the session's data and the
+    user who ran the session. Workers get the best matches from the same user's other sessions
+    as examples, so they rewrite and debug less of the code that has already worked.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = settings.snippet_index_path if path is None else path
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.executescript(SCHEMA)
+        # Indexes created before snippets were scoped to users
+        if "owner" not in {row[1] for row in conn.execute("PRAGMA table_info(snippets)")}:
+            conn.execute("ALTER TABLE snippets ADD COLUMN owner TEXT DEFAULT ''")
+        return conn
+
+    def add(self, cells: List[Dict[str, Any]], stage: str, schemas: Dict[str, Dict[str, str]], session: str, owner: str = "") -> int:
+        """
+        Indexes the successful code cells of a stage; cells already in the index are skipped.
+        Returns the number of new snippets.
+        """
+        signature = schema_signature(schemas)
+        columns = " ".join(column for schema in schemas.values() for column in schema)
+        added = 0
+        with closing(self._connect()) as conn, conn:
+            for cell in cells:
+                if not successful_code(cell):
+                    continue
+                code = cell["source"].strip()
+                digest = hashlib.sha256(f"{stage}\n{code}".encode()).hexdigest()
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO snippets (digest, stage, signature, session, owner, created, code) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (digest, stage, signature, session, owner, time.time(), code),
+                )
+                if cursor.rowcount:
+                    conn.execute("INSERT INTO snippets_fts (rowid, code, columns) VALUES (?, ?, ?)", (cursor.lastrowid, code, columns))
+                    added += 1
+        return added
+
+    def search(self, stage: str, schemas: Dict[str, Dict[str, str]], text: str = "", session: str = "", owner: str = "",
+               top_k: Optional[int] = None, token_budget: Optional[int] = None) -> List[str]:
+        """
+        Snippets of `stage` from `owner`'s other sessions (any user's if SNIPPET_SHARE_ACROSS_USERS is set),
+        ranked first by an identical schema signature, then by BM25 relevance to the column names and `text`;
+        as many of the top `top_k` as fit `token_budget`.
+        """
+        shared = settings.snippet_share_across_users
+        top_k = settings.snippet_top_k if top_k is None else top_k
+        budget = (settings.snippet_token_budget if token_budget is None else token_budget) * CHARS_PER_TOKEN
+        terms = _terms(" ".join(column for schema in schemas.values() for column in schema) + " " + text)[:MAX_QUERY_TERMS]
+        if not terms or not (owner or shared) or not os.path.exists(self.path):
+            return []
+
+        query = " OR ".join(f'"{term}"' for term in terms)
+        with closing(self._connect()) as conn, conn:
+            rows = conn.execute(
+                "SELECT s.code FROM snippets_fts JOIN snippets s ON s.id = snippets_fts.rowid "
+                "WHERE snippets_fts MATCH ? AND s.stage = ? AND s.session != ? AND (? OR s.owner = ?) "
+                "ORDER BY (s.signature = ?) DESC, bm25(snippets_fts) LIMIT ?",
+                (query, stage, session, shared, owner, schema_signature(schemas), top_k),
+            ).fetchall()
+
+        snippets, used = [], 0
+        for (code,) in rows:
+            if used + len(code) > budget:
+                continue
+            snippets.append(code)
+            used += len(code)
+        return snippets
+
+def snippet_instructions(snippets: List[str]) -> str:
+    """
+    Prompt section with the retrieved snippets.
+    """
+    if not snippets:
+        return ""
+    blocks = "\n\n".join(f"```python\n{code}\n```" for code in snippets)
+    return (
+        "Code that ran without errors at this stage in earlier sessions on similar data. Reuse the parts that fit "
+        "as a starting point; the column names, file names and variables may differ, so check them against this dataset.\n\n"
+        + blocks
+    )
+
+async def index_cells(cells: List[Dict[str, Any]], stage: str, schemas: Dict[str, Dict[str, str]], session: str, owner: str) -> None:
+    """
+    Adds a tool call's successful cells to the index without blocking the event loop; failures are only logged.
+    """
+    if not settings.snippet_index_enabled or not session or not any(successful_code(cell) for cell in cells):
+        return
+    try:
+        added = await asyncio.to_thread(SnippetIndex().add, cells, stage, schemas, session, owner)
+        if added:
+            logger.debug(f"Indexed {added} snippet(s) of {stage}")
+    except Exception as e:
+        logger.warning(f"Snippet indexing failed: {e}")
+
+async def retrieve_snippets(stage: str, schemas: Dict[str, Dict[str, str]], text: str, session: str, owner: str) -> List[str]:
+    """
+    The snippets for a worker's prompt (see `SnippetIndex.search`); empty if disabled or on failure.
+    """
+    if not settings.snippet_index_enabled:
+        return []
+    try:
+        return await asyncio.to_thread(SnippetIndex().search, stage, schemas, text, session, owner)
+    except Exception as e:
+        logger.warning(f"Snippet retrieval failed: {e}")
+        return []
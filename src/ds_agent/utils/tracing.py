@@ -0,0 +1,142 @@
+import asyncio
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from ds_agent.config import settings
+from ds_agent.utils.logger import logger
+
+class Span:
+    """A timed operation; attributes set on it end up in the trace viewer's args panel."""
+    __slots__ = ("name", "category", "attrs", "span_id", "parent_id", "start", "tid")
+
+    def __init__(self, name: str, category: str, attrs: Dict[str, Any], span_id: int, parent_id: Optional[int], tid: int):
+        self.name = name
+        self.category = category
+        self.attrs = attrs
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.tid = tid
+        self.start = time.perf_counter()
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+class _NoopSpan:
+    def set(self, **attrs: Any) -> None:
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class SpanRecorder:
+    """
+    Collects the spans of one session and exports them in Chrome trace format
+    (open the file in chrome://tracing or https://ui.perfetto.dev).
+    Each asyncio task gets its own track, so spans nest by time within a track;
+    `parent_id` in the span args links children that run in other tasks.
+    """
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.events: List[Dict[str, Any]] = []
+        self._origin = time.perf_counter()
+        self._ids = itertools.count(1)
+        self._tids: Dict[int, int] = {}
+
+    def _tid(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = id(task) if task else threading.get_ident()
+        return self._tids.setdefault(key, len(self._tids) + 1)
+
+    def begin(self, name: str, category: str, attrs: Dict[str, Any], parent: Optional[Span]) -> Span:
+        return Span(name, category, attrs, next(self._ids), parent.span_id if parent else None, self._tid())
+
+    def finish(self, span: Span) -> None:
+        end = time.perf_counter()
+        self.events.append({
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",
+            "ts": round((span.start - self._origin) * 1e6, 1),
+            "dur": round((end - span.start) * 1e6, 1),
+            "pid": 1,
+            "tid": span.tid,
+            "args": {"span_id": span.span_id, "parent_id": span.parent_id, **span.attrs},
+        })
+
+    def export(self, directory: Optional[str] = None) -> str:
+        """
+        Writes all spans recorded so far to `<directory>/<session_id>.json` and returns the path.
+        """
+        directory = settings.span_trace_dir if directory is None else directory
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.session_id}.json")
+        trace = {
+            "traceEvents": [
+                {"name": "process_name", "ph": "M", "pid": 1, "args": {"name": f"session {self.session_id}"}},
+                *self.events,
+            ],
+            "displayTimeUnit": "ms",
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(trace, f, ensure_ascii=False, default=str)
+        logger.info(f"Span trace exported to {path} ({len(self.events)} spans)")
+        return path
+
+# The session's recorder (None when span tracing is off) and the innermost open span
+active_spans: ContextVar[Optional[SpanRecorder]] = ContextVar("active_spans", default=None)
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def open_span_recorder(session_id: str) -> Optional[SpanRecorder]:
+    """
+    Returns a span recorder for the session if span tracing is enabled.
+    """
+    return SpanRecorder(session_id) if settings.span_tracing else None
+
+@contextmanager
+def span(name: str, category: str = "app", **attrs: Any) -> Iterator[Any]:
+    """
+    Records the enclosed block as a span of the active recorder. A no-op (and nearly free)
+    when tracing is off. Exceptions are recorded in the span's `error` attribute.
+    """
+    recorder = active_spans.get()
+    if recorder is None:
+        yield NOOP_SPAN
+        return
+
+    current = recorder.begin(name, category, attrs, current_span.get())
+    token = current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        current_span.reset(token)
+        recorder.finish(current)
+
+def traced_node(name: str, func: Callable) -> Callable:
+    """
+    Wraps a graph node so that each execution is a span. The signature is preserved,
+    so LangGraph still passes `config` to nodes that accept it.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with span(name, "node"):
+            return await func(*args, **kwargs)
+    return wrapper
+
+def usage_attrs(message: Any) -> Dict[str, Any]:
+    """
+    Token counts of an LLM response, for span attributes.
+    """
+    usage = getattr(message, "usage_metadata", None) or {}
+    return {k: usage[k] for k in ("input_tokens", "output_tokens", "total_tokens") if k in usage}
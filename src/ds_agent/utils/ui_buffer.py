@@ -0,0 +1,88 @@
+import asyncio
+from typing import Any, Callable, List, Optional, Tuple
+
+from ds_agent.config import settings
+from ds_agent.utils.logger import logger
+
+class UIUpdateBuffer:
+    """
+    Coalesces the UI traffic of one chat session.
+
+    `send` and `update` calls are queued and flushed together at most every
+    `interval` seconds. An update for an object that is already waiting in the
+    queue is dropped, since the queued operation sends its latest state anyway.
+    Small consecutive text messages with the same key are merged into one message.
+    Once `max_pending` operations are waiting (e.g. a slow client), the producer
+    blocks on a flush, which applies backpressure to the graph stream.
+    """
+    def __init__(self,
+                 interval: Optional[float] = None,
+                 max_pending: Optional[int] = None,
+                 batch_chars: Optional[int] = None):
+        interval = settings.ui_flush_interval if interval is None else interval
+        max_pending = settings.ui_max_pending if max_pending is None else max_pending
+        batch_chars = settings.ui_batch_max_chars if batch_chars is None else batch_chars
+        self.interval = interval
+        self.max_pending = max_pending
+        self.batch_chars = batch_chars
+        self._ops: List[Tuple[str, Any]] = []
+        self._queued: set = set()
+        self._batch_key: Optional[str] = None
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+
+    async def send(self, obj: Any) -> None:
+        await self._enqueue("send", obj)
+
+    async def update(self, obj: Any) -> None:
+        if id(obj) in self._queued:
+            return
+        await self._enqueue("update", obj)
+
+    async def send_text(self, key: str, content: str, factory: Callable[[str], Any]) -> None:
+        """
+        Sends a text message built by `factory(content)`, or appends the text to the
+        previous queued message when it has the same key and the result stays small.
+        """
+        last = self._ops[-1] if self._ops else None
+        if (last and last[0] == "send" and self._batch_key == key
+                and len(last[1].content) + len(content) <= self.batch_chars):
+            last[1].content += "\n\n" + content
+            return
+        await self._enqueue("send", factory(content))
+        self._batch_key = key if len(content) < self.batch_chars else None
+
+    async def _enqueue(self, kind: str, obj: Any) -> None:
+        self._ops.append((kind, obj))
+        self._queued.add(id(obj))
+        self._batch_key = None
+        if len(self._ops) >= self.max_pending:
+            await self.flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.interval)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Sends every queued operation, in order.
+        """
+        async with self._lock:
+            ops, self._ops = self._ops, []
+            self._queued.clear()
+            self._batch_key = None
+            for kind, obj in ops:
+                try:
+                    await (obj.send() if kind == "send" else obj.update())
+                except Exception as e:
+                    logger.warning(f"UI {kind} failed: {e}")
+
+    async def close(self) -> None:
+        """
+        Final flush; guarantees nothing queued is left unsent.
+        """
+        await self.flush()
+        if self._timer and not self._timer.done():
+            self._timer.cancel()
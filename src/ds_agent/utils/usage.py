@@ -0,0 +1,41 @@
+from typing import Any, Dict
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+class UsageTracker(BaseCallbackHandler):
+    """
+    Callback handler that accumulates LLM calls and token usage of a run.
+    Passed in `config["callbacks"]`, it sees every chat model call made inside the graph.
+    """
+    run_inline = True
+
+    def __init__(self):
+        super().__init__()
+        self.llm_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        self.llm_calls += 1
+        for generations in response.generations:
+            for generation in generations:
+                if isinstance(generation, ChatGeneration) and isinstance(generation.message, AIMessage):
+                    usage = generation.message.usage_metadata or {}
+                    self.input_tokens += usage.get("input_tokens", 0)
+                    self.output_tokens += usage.get("output_tokens", 0)
+
+    def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+        self.llm_calls += 1
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            "llm_calls": self.llm_calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "total_tokens": self.total_tokens,
+        }
@@ -1,132 +1,233 @@
 import warnings
 warnings.filterwarnings("ignore")
 
+import argparse
 import asyncio
+import getpass
 import os
+import uuid
+from typing import Optional
 from langchain_core.messages import HumanMessage
-from e2b_code_interpreter import AsyncSandbox
 
 from ds_agent.core.graph import create_graph
+from ds_agent.core.checkpoint import get_checkpointer, close_checkpointer, build_run_config, load_thread
+from ds_agent.core.budget import RunBudget, attach_budget
+from langgraph.checkpoint.memory import InMemorySaver
+
+from ds_agent.utils.helpers import create_sandbox, reattach_sandbox
+from ds_agent.utils.replay import active_trace, open_trace, record_turn, TracePlayer, TraceRecorder
+from ds_agent.utils.tracing import active_spans, open_span_recorder
 from ds_agent.utils.notebook import save_session_to_ipynb
+from ds_agent.utils.artifacts import ArtifactStore
+from ds_agent.tools.ingest import upload_dataset, upload_notice, sampling_policy
 from ds_agent.config import settings, Nodes
-from ds_agent.utils.logger import logger
+from ds_agent.utils.logger import logger, setup_logger
+
+async def stream_graph(graph, graph_input, config):
+    """
+    Runs the graph on the session's checkpoint thread and prints node output.
+    Passing `graph_input=None` continues an interrupted run from its last checkpoint.
+    Each call gets a fresh run budget.
+    """
+    budget = RunBudget()
+    async for event in graph.astream(graph_input, config=attach_budget(config, budget)):
+        for key, value in event.items():
+            # Handle worker, supervisor and reporter nodes
+            if key in [Nodes.CLEANER, Nodes.EDA, Nodes.SUPERVISOR, Nodes.REPORTER]:
+                if "messages" in value:
+                    last_msg = value["messages"][-1]
+                    
+                    # Show thinking if there's content
+                    if last_msg.content:
+                        print(f"\n--- Agent Thinking ({key}) ---\n{last_msg.content}\n")
+                    
+                    # Show tool calls if any
+                    if hasattr(last_msg, 'tool_calls') and last_msg.tool_calls:
+                        print("--- Tool Calls Requested ---")
+                        for tc in last_msg.tool_calls:
+                            print(f"Tool: {tc['name']}")
+                            print(f"Arguments: {tc['args']}")
+                        print("---------------------------\n")
+                
+                if "next" in value and value["next"] != Nodes.FINISH:
+                    print(f"--- Supervisor Routing: Next is {value['next']} ---")
+
+            elif key == Nodes.TOOLS:
+                logger.info("Tool execution cycle completed")
+                
+                print("--- Tool Execution Results ---")
+                for msg in value["messages"]:
+                    # Truncate long outputs for display
+                    content = msg.content
+                    if len(content) > 500:
+                        content = content[:500] + "..."
+                    print(f"Tool '{msg.name}' result:\n{content}\n")
+                print("------------------------------\n")
 
-async def main():
+async def main(thread_id: Optional[str] = None, kill_sandbox: bool = False):
     logger.info("Initializing Data Science Agent...")
-    graph = create_graph()
+    graph = create_graph(checkpointer=await get_checkpointer())
     
-    # Initial state
-    state = {
-        "messages": [],
-        "notebook_cells": [],
-        "cwd": "/home/user",
-        "next": Nodes.SUPERVISOR,
-        "node_visits": {}
-    }
+    resuming = thread_id is not None
+    thread_id = thread_id or uuid.uuid4().hex
+    values, pending = await load_thread(graph, thread_id) if resuming else ({}, ())
+
+    # Optional record/replay of LLM and sandbox traffic for this session
+    trace = open_trace(thread_id)
+    active_trace.set(trace)
+    spans = open_span_recorder(thread_id)
+    active_spans.set(spans)
     
     print("\nAgent ready. Type 'exit' or 'quit' to stop.")
+    print(f"Session ID: {thread_id} (resume later with --resume {thread_id})")
     print("Commands: /upload <path> to upload a file.\n")
     
+    sandbox = None
+    pending_notices = []
+    pending_sampling = {}
+    pending_schemas = {}
     try:
-        # Use E2B AsyncSandbox as a context manager for guaranteed cleanup
-        async with await AsyncSandbox.create(
-            api_key=settings.e2b_api_key.get_secret_value(),
-            timeout=settings.sandbox_timeout
-        ) as sandbox:
-            logger.info(f"E2B AsyncSandbox initialized and active (Timeout: {settings.sandbox_timeout}s).")
+        sandbox, reattached = await reattach_sandbox(values.get("sandbox_id"))
+        logger.info(f"E2B AsyncSandbox {'reattached' if reattached else 'initialized'} and active (Timeout: {settings.sandbox_timeout}s).")
+        config = build_run_config(thread_id, sandbox, user=getpass.getuser())
 
-            while True:
-                try:
-                    # 1. Get optional file path
-                    file_input = input("File path to upload (optional, press Enter to skip): ").strip()
-                    if file_input.lower() in ["exit", "quit"]:
-                        break
-                    
-                    if file_input:
-                        if not os.path.exists(file_input):
-                            print(f"Error: Local file '{file_input}' not found.")
+        if values and not reattached:
+            # Kernel variables and sandbox files are gone; tell the agents on the next turn.
+            print("System: The previous sandbox expired; a new one was created. Re-upload your files if needed.")
+            pending_notices.append(HumanMessage(content="[System: The sandbox was restarted. Kernel variables and sandbox files from earlier steps are lost; reload the data before continuing.]"))
+        elif pending:
+            print(f"System: Continuing interrupted run at: {', '.join(pending)}")
+            await stream_graph(graph, None, config)
+
+        while True:
+            try:
+                # 1. Get optional file path
+                file_input = input("File path to upload (optional, press Enter to skip): ").strip()
+                if file_input.lower() in ["exit", "quit"]:
+                    break
+                
+                if file_input:
+                    if not os.path.exists(file_input):
+                        print(f"Error: Local file '{file_input}' not found.")
+                    else:
+                        filename = os.path.basename(file_input)
+                        print(f"Uploading {filename} to sandbox...")
+                        # Tabular files get a typed Parquet copy, restored from the dataset cache if converted before
+                        summary = await upload_dataset(sandbox, filename, path=file_input)
+                        if summary and summary.get("cached"):
+                            print(f"System: Restored {summary['parquet']} from the dataset cache ({summary['rows']} rows x {summary['columns']} columns, {summary['restore_seconds']}s).")
                         else:
-                            filename = os.path.basename(file_input)
-                            print(f"Uploading {filename} to sandbox...")
-                            with open(file_input, "rb") as f:
-                                await sandbox.files.write(filename, f)
                             print(f"System: Successfully uploaded {filename}.")
-                            state["messages"].append(HumanMessage(content=f"[System: User uploaded file '{filename}']"))
-
-                    # 2. Get user prompt
-                    user_input = input("User prompt: ").strip()
-                    if not user_input:
-                        continue
-                    if user_input.lower() in ["exit", "quit"]:
-                        break
-                    
-                    # Process user message
-                    state["messages"].append(HumanMessage(content=user_input))
-                    
-                    config = {
-                        "recursion_limit": 1000,
-                        "configurable": {"sandbox": sandbox}
-                    }
-                    
-                    async for event in graph.astream(state, config=config):
-                        for key, value in event.items():
-                            # Handle worker, supervisor and reporter nodes
-                            if key in [Nodes.CLEANER, Nodes.EDA, Nodes.SUPERVISOR, Nodes.REPORTER]:
-                                if "messages" in value:
-                                    last_msg = value["messages"][-1]
-                                    state["messages"].append(last_msg)
-                                    
-                                    # Show thinking if there's content
-                                    if last_msg.content:
-                                        print(f"\n--- Agent Thinking ({key}) ---\n{last_msg.content}\n")
-                                    
-                                    # Show tool calls if any
-                                    if hasattr(last_msg, 'tool_calls') and last_msg.tool_calls:
-                                        print("--- Tool Calls Requested ---")
-                                        for tc in last_msg.tool_calls:
-                                            print(f"Tool: {tc['name']}")
-                                            print(f"Arguments: {tc['args']}")
-                                        print("---------------------------\n")
-                                
-                                if "next" in value:
-                                    state["next"] = value["next"]
-                                    if value["next"] != Nodes.FINISH:
-                                        print(f"--- Supervisor Routing: Next is {value['next']} ---")
+                            if summary:
+                                print(f"System: Converted to {summary['parquet']} ({summary['rows']} rows x {summary['columns']} columns, {summary['seconds']}s).")
+                        if summary and summary.get("schema"):
+                            pending_schemas[filename] = summary["schema"]
+                        policy = sampling_policy(summary)
+                        if policy:
+                            pending_sampling[filename] = policy
+                            print(f"System: Large dataset; exploratory stages use a {policy['method']} sample of {policy['sample_rows']} rows.")
+                        pending_notices.append(HumanMessage(content=upload_notice(filename, summary)))
 
-                            elif key == Nodes.TOOLS:
-                                logger.info("Tool execution cycle completed")
-                                # Update local state
-                                state["messages"].extend(value["messages"])
-                                state["notebook_cells"].extend(value["notebook_cells"])
-                                
-                                print("--- Tool Execution Results ---")
-                                for msg in value["messages"]:
-                                    # Truncate long outputs for display
-                                    content = msg.content
-                                    if len(content) > 500:
-                                        content = content[:500] + "..."
-                                    print(f"Tool '{msg.name}' result:\n{content}\n")
-                                print("------------------------------\n")
-                    
-                except KeyboardInterrupt:
-                    break
-                except Exception as e:
-                    logger.error(f"An error occurred during turn: {e}", exc_info=True)
+                # 2. Get user prompt
+                user_input = input("User prompt: ").strip()
+                if not user_input:
+                    continue
+                if user_input.lower() in ["exit", "quit"]:
                     break
+                
+                # Only this turn's input is sent; earlier messages and cells come from the checkpoint
+                graph_input = {
+                    "messages": pending_notices + [HumanMessage(content=user_input)],
+                    "cwd": "/home/user",
+                    "next": Nodes.SUPERVISOR,
+                    "node_visits": {},
+                    "sandbox_id": sandbox.sandbox_id,
+                    "sampling": pending_sampling,
+                    "schemas": pending_schemas
+                }
+                pending_notices = []
+                pending_sampling = {}
+                pending_schemas = {}
+                record_turn(graph_input)
+                await stream_graph(graph, graph_input, config)
+                
+            except KeyboardInterrupt:
+                break
+            except Exception as e:
+                logger.error(f"An error occurred during turn: {e}", exc_info=True)
+                break
 
     except Exception as e:
         logger.error(f"Failed to initialize sandbox or main loop crashed: {e}")
     finally:
+        state = {}
+        try:
+            state, _ = await load_thread(graph, thread_id)
+        except Exception as e:
+            logger.error(f"Failed to load session state: {e}")
+
         # Export logic
-        if state["notebook_cells"]:
+        if state.get("notebook_cells"):
             logger.info("Exporting session to notebook...")
             try:
-                filename = save_session_to_ipynb(state, f"{settings.local_artifacts_dir}/analysis.ipynb")
+                filename = save_session_to_ipynb(state, ArtifactStore.for_session(thread_id).path("analysis.ipynb"))
                 print(f"\nNotebook exported to {filename}")
             except Exception as e:
                 logger.error(f"Failed to save notebook: {e}")
         
+        if sandbox and kill_sandbox:
+            await sandbox.kill()
+            logger.info("E2B Sandbox closed.")
+        elif sandbox:
+            # A paused sandbox keeps its memory and files, so --resume continues with the same kernel state,
+            # also after a failed turn
+            try:
+                await sandbox.pause()
+                logger.info(f"E2B Sandbox paused; resume with --resume {thread_id}.")
+            except Exception as e:
+                logger.warning(f"Could not pause sandbox ({e}); killing it instead.")
+                await sandbox.kill()
+        await close_checkpointer()
+        if isinstance(trace, TraceRecorder):
+            trace.close()
+        if spans:
+            spans.export()
         logger.info("Data Science Agent session finished.")
 
+async def replay(trace_path: str):
+    """
+    Re-runs a recorded session offline: every turn input, LLM response and sandbox
+    result comes from the trace, so the run exercises only the local orchestration.
+    """
+    trace = TracePlayer(trace_path, strict=settings.trace_strict)
+    active_trace.set(trace)
+    spans = open_span_recorder(f"replay-{os.path.basename(trace_path).split('.')[0]}")
+    active_spans.set(spans)
+    graph = create_graph(checkpointer=InMemorySaver())
+    sandbox = await create_sandbox()
+    config = build_run_config(uuid.uuid4().hex, sandbox)
+
+    for turn in trace.turns:
+        graph_input = {
+            "cwd": "/home/user",
+            "next": Nodes.SUPERVISOR,
+            "node_visits": {},
+            "sandbox_id": sandbox.sandbox_id,
+            **turn
+        }
+        await stream_graph(graph, graph_input, config)
+    logger.info(f"Replayed {len(trace.turns)} turns from {trace_path}")
+    if spans:
+        spans.export()
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Interactive Data Science Agent CLI")
+    parser.add_argument("--resume", metavar="SESSION_ID", default=None, help="Resume a checkpointed session.")
+    parser.add_argument("--replay", metavar="TRACE", default=None, help="Replay a recorded session trace offline.")
+    parser.add_argument("--kill-sandbox", action="store_true", help="Kill the sandbox on exit instead of pausing it for --resume.")
+    args = parser.parse_args()
+    setup_logger()
+    if args.replay:
+        asyncio.run(replay(args.replay))
+    else:
+        asyncio.run(main(thread_id=args.resume, kill_sandbox=args.kill_sandbox))
\ No newline at end of file
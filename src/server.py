@@ -0,0 +1,128 @@
+import warnings
+warnings.filterwarnings("ignore")
+
+import asyncio
+import json
+import os
+import shutil
+from contextlib import asynccontextmanager
+
+import uvicorn
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+
+from ds_agent.core.jobs import JobQueue, QueueFullError
+from ds_agent.core.runner import EVENTS_FILE, check_overrides
+from ds_agent.config import settings
+from ds_agent.utils.logger import logger, setup_logger
+
+job_queue = JobQueue(settings.api_jobs_dir, workers=settings.api_workers, max_size=settings.api_queue_size)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logger()
+    job_queue.restore()
+    job_queue.start()
+    logger.info(f"Job API started ({settings.api_workers} workers, queue size {settings.api_queue_size}).")
+    yield
+    await job_queue.stop()
+
+app = FastAPI(title="Data Science Agent Job API", lifespan=lifespan)
+
+def get_record(job_id: str):
+    record = job_queue.jobs.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return record
+
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...), prompt: str = Form(...), overrides: str = Form("{}")):
+    """
+    Submits an analysis: a dataset upload plus the user prompt.
+    Optional `overrides` is a JSON object of settings (e.g. {"trainer_model_name": "..."});
+    only model names, budgets and timeouts may be overridden.
+    """
+    try:
+        overrides_dict = check_overrides(json.loads(overrides))
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="'overrides' must be a JSON object.")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        record = job_queue.reserve()
+    except QueueFullError:
+        return JSONResponse(status_code=429, content={"detail": "Job queue is full. Retry later."}, headers={"Retry-After": "30"})
+
+    # Stream the upload to disk in chunks instead of holding it in memory
+    input_dir = os.path.join(record.job_dir, "input")
+    os.makedirs(input_dir, exist_ok=True)
+    dataset_path = os.path.abspath(os.path.join(input_dir, os.path.basename(file.filename or "dataset")))
+    with open(dataset_path, "wb") as f:
+        while chunk := await file.read(1024 * 1024):
+            f.write(chunk)
+
+    try:
+        job_queue.submit(record, dataset_path, prompt, overrides_dict)
+    except QueueFullError:
+        shutil.rmtree(record.job_dir, ignore_errors=True)
+        return JSONResponse(status_code=429, content={"detail": "Job queue is full. Retry later."}, headers={"Retry-After": "30"})
+
+    return {"id": record.id, "status": record.status}
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    return get_record(job_id).to_dict()
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Streams the job's graph events as Server-Sent Events until the job finishes.
+    """
+    record = get_record(job_id)
+    events_path = os.path.join(record.job_dir, EVENTS_FILE)
+
+    async def stream():
+        position = 0
+        while True:
+            finished = record.finished
+            if os.path.exists(events_path):
+                with open(events_path, "rb") as f:
+                    f.seek(position)
+                    for line in f:
+                        # The job may be halfway through writing the last line; it is sent on a later poll
+                        if not line.endswith(b"\n"):
+                            break
+                        position += len(line)
+                        yield f"data: {line.decode('utf-8').strip()}\n\n"
+            if finished:
+                yield f"event: end\ndata: {json.dumps({'status': record.status})}\n\n"
+                return
+            await asyncio.sleep(settings.api_poll_interval)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+@app.get("/jobs/{job_id}/notebook")
+async def job_notebook(job_id: str):
+    record = get_record(job_id)
+    path = os.path.join(record.job_dir, "analysis.ipynb")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Notebook not available yet.")
+    return FileResponse(path, filename=f"{job_id}.ipynb")
+
+@app.get("/jobs/{job_id}/artifacts")
+async def job_artifacts(job_id: str):
+    record = get_record(job_id)
+    artifacts_dir = os.path.join(record.job_dir, "artifacts")
+    return {"artifacts": sorted(os.listdir(artifacts_dir)) if os.path.isdir(artifacts_dir) else []}
+
+@app.get("/jobs/{job_id}/artifacts/{name}")
+async def job_artifact(job_id: str, name: str):
+    record = get_record(job_id)
+    path = os.path.join(record.job_dir, "artifacts", os.path.basename(name))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"Artifact '{name}' not found.")
+    return FileResponse(path, filename=os.path.basename(name))
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=settings.api_host, port=settings.api_port)